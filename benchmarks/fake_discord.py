@@ -0,0 +1,570 @@
+from __future__ import annotations
+
+import asyncio
+import attr
+import collections
+import datetime
+import hikari
+import itertools
+import logging
+import random
+import time
+
+from typing import Any, Optional, Sequence
+
+import lightbulb
+
+from utils.instrumentation import instrumentation
+
+MESSAGES_PER_PAGE = 100
+MAX_RATE_LIMIT_SECONDS = 300
+FIRST_SNOWFLAKE = 1_100_000_000_000_000_000
+
+rest_logger = logging.getLogger("hikari.rest")
+
+# shared by every world in the process, the plugin's state is module level and keyed by these ids
+snowflake_ids = (hikari.Snowflake(i) for i in itertools.count(FIRST_SNOWFLAKE))
+
+def now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def resolve_id(obj: Any) -> hikari.Snowflake:
+    return hikari.Snowflake(obj.id if hasattr(obj, "id") else obj)
+
+def overwrites_by_id(overwrites: Any) -> dict[hikari.Snowflake, hikari.PermissionOverwrite]:
+    if overwrites is hikari.UNDEFINED or overwrites is None:
+        return {}
+    return {overwrite.id: overwrite for overwrite in overwrites}
+
+@attr.define
+class LatencyModel:
+    base_seconds: float = 0.05
+    jitter_seconds: float = 0.02
+
+    async def wait(self) -> None:
+        delay = self.base_seconds + random.uniform(0, self.jitter_seconds)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class RateLimitBucket:
+    def __init__(self, limit: int, period: float) -> None:
+        self.limit = limit
+        self.period = period
+        self._hits: collections.deque[float] = collections.deque()
+
+    def reserve(self) -> float:
+        current = time.monotonic()
+        while self._hits and self._hits[0] <= current - self.period:
+            self._hits.popleft()
+        wait = 0.0
+        if len(self._hits) >= self.limit:
+            wait = self._hits[len(self._hits) - self.limit] + self.period - current
+        if wait <= MAX_RATE_LIMIT_SECONDS:
+            self._hits.append(current + wait)
+        return wait
+
+# (limit, period in seconds) per route and major parameter, roughly what discord enforces
+DEFAULT_RATE_LIMITS: dict[str, tuple[int, float]] = {
+    "global": (50, 1),
+    "rename_channel": (2, 600),
+    "create_message": (5, 5),
+    "execute_webhook": (5, 2),
+    "edit_webhook_message": (5, 2),
+    "edit_member": (10, 10),
+}
+
+class FakeCache:
+    def __init__(self) -> None:
+        self.guilds: dict[hikari.Snowflake, hikari.GatewayGuild] = {}
+        self.channels: dict[hikari.Snowflake, hikari.PermissibleGuildChannel] = {}
+        self.threads: dict[hikari.Snowflake, hikari.GuildThreadChannel] = {}
+        self.roles: dict[hikari.Snowflake, hikari.Role] = {}
+        self.members: dict[hikari.Snowflake, dict[hikari.Snowflake, hikari.Member]] = {}
+
+    def get_guild(self, guild: Any) -> Optional[hikari.GatewayGuild]:
+        return self.guilds.get(resolve_id(guild))
+
+    def get_available_guild(self, guild: Any) -> Optional[hikari.GatewayGuild]:
+        return self.get_guild(guild)
+
+    def get_guilds_view(self) -> dict[hikari.Snowflake, hikari.GatewayGuild]:
+        return dict(self.guilds)
+
+    def get_guild_channel(self, channel: Any) -> Optional[hikari.PermissibleGuildChannel]:
+        return self.channels.get(resolve_id(channel))
+
+    def get_guild_channels_view_for_guild(self, guild: Any) -> dict[hikari.Snowflake, hikari.PermissibleGuildChannel]:
+        guild_id = resolve_id(guild)
+        return {channel_id: channel for channel_id, channel in self.channels.items() if channel.guild_id == guild_id}
+
+    def get_thread(self, thread: Any) -> Optional[hikari.GuildThreadChannel]:
+        return self.threads.get(resolve_id(thread))
+
+    def get_threads_view_for_guild(self, guild: Any) -> dict[hikari.Snowflake, hikari.GuildThreadChannel]:
+        guild_id = resolve_id(guild)
+        return {thread_id: thread for thread_id, thread in self.threads.items() if thread.guild_id == guild_id}
+
+    def get_role(self, role: Any) -> Optional[hikari.Role]:
+        return self.roles.get(resolve_id(role))
+
+    def get_roles_view_for_guild(self, guild: Any) -> dict[hikari.Snowflake, hikari.Role]:
+        guild_id = resolve_id(guild)
+        return {role_id: role for role_id, role in self.roles.items() if role.guild_id == guild_id}
+
+    def get_member(self, guild: Any, user: Any) -> Optional[hikari.Member]:
+        return self.members.get(resolve_id(guild), {}).get(resolve_id(user))
+
+    def get_members_view_for_guild(self, guild: Any) -> dict[hikari.Snowflake, hikari.Member]:
+        return dict(self.members.get(resolve_id(guild), {}))
+
+    def get_emoji(self, emoji: Any) -> None:
+        return None
+
+class FakeMessageIterator(hikari.LazyIterator[hikari.Message]):
+    def __init__(self, rest: FakeRESTClient, channel_id: hikari.Snowflake, messages: list[hikari.Message]) -> None:
+        self._rest = rest
+        self._channel_id = channel_id
+        self._messages = messages
+        self._index = 0
+
+    async def __anext__(self) -> hikari.Message:
+        if self._index >= len(self._messages):
+            self._complete()
+        # every page of history is its own request
+        if self._index % MESSAGES_PER_PAGE == 0:
+            await self._rest.request("fetch_messages")
+        message = self._messages[self._index]
+        self._index += 1
+        return message
+
+class FakeRESTClient:
+    def __init__(self, bot: FakeBot, latency: LatencyModel, rate_limits: Optional[dict[str, tuple[int, float]]] = None) -> None:
+        self._bot = bot
+        self._latency = latency
+        self._rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self._buckets: dict[tuple[str, int], RateLimitBucket] = {}
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.rate_limited: collections.Counter[str] = collections.Counter()
+        self.messages: dict[hikari.Snowflake, list[hikari.Message]] = {}
+        self.webhooks: dict[hikari.Snowflake, list[hikari.IncomingWebhook]] = {}
+
+    async def request(self, route: str, major_id: int = 0, bucket: Optional[str] = None) -> None:
+        self.calls[route] += 1
+        for bucket_name, bucket_major_id in (("global", 0), (bucket or route, major_id)):
+            if bucket_name not in self._rate_limits:
+                continue
+            rate_limit_bucket = self._buckets.get((bucket_name, bucket_major_id))
+            if rate_limit_bucket is None:
+                rate_limit_bucket = RateLimitBucket(*self._rate_limits[bucket_name])
+                self._buckets[(bucket_name, bucket_major_id)] = rate_limit_bucket
+            wait = rate_limit_bucket.reserve()
+            if wait > MAX_RATE_LIMIT_SECONDS:
+                self.rate_limited[bucket_name] += 1
+                instrumentation.record_rate_limit(route)
+                raise hikari.RateLimitTooLongError(
+                    route=route, is_global=False, retry_after=wait, max_retry_after=MAX_RATE_LIMIT_SECONDS, # type: ignore[arg-type]
+                    reset_at=time.time() + wait, limit=rate_limit_bucket.limit, period=rate_limit_bucket.period)
+            if wait > 0:
+                self.rate_limited[bucket_name] += 1
+                instrumentation.record_rate_limit(route)
+                rest_logger.warning("rate limited on bucket %s, backing off for %.2fs", f"{bucket_name}:{bucket_major_id}", wait)
+                await asyncio.sleep(wait)
+        await self._latency.wait()
+
+    def reset_counters(self) -> None:
+        self.calls.clear()
+        self.rate_limited.clear()
+
+    def _channel(self, channel: Any) -> hikari.GuildChannel:
+        nullable_channel: Optional[hikari.GuildChannel] = self._bot.cache.get_guild_channel(channel) or self._bot.cache.get_thread(channel)
+        if nullable_channel is None:
+            raise hikari.NotFoundError("fake://channel", {}, b"")
+        return nullable_channel
+
+    async def create_message(self, channel: Any, content: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Message:
+        channel_id = resolve_id(channel)
+        await self.request("create_message", channel_id)
+        return self._bot.world.add_message(channel_id, self._bot.me, None, "" if content is hikari.UNDEFINED else str(content))
+
+    async def edit_message(self, channel: Any, message: Any, content: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Message:
+        channel_id = resolve_id(channel)
+        await self.request("edit_message", channel_id)
+        return self._bot.world.edit_message(channel_id, resolve_id(message), content)
+
+    async def delete_message(self, channel: Any, message: Any, **kwargs: Any) -> None:
+        channel_id = resolve_id(channel)
+        await self.request("delete_message", channel_id)
+        self._bot.world.remove_messages(channel_id, {resolve_id(message)})
+
+    async def delete_messages(self, channel: Any, *messages: Any, **kwargs: Any) -> None:
+        channel_id = resolve_id(channel)
+        message_ids = {resolve_id(message) for message in flatten_messages(messages)}
+        for _ in range(0, len(message_ids), 100):
+            await self.request("delete_messages", channel_id)
+        self._bot.world.remove_messages(channel_id, message_ids)
+
+    async def fetch_message(self, channel: Any, message: Any) -> hikari.Message:
+        channel_id = resolve_id(channel)
+        await self.request("fetch_message", channel_id)
+        message_id = resolve_id(message)
+        for found_message in self.messages.get(channel_id, []):
+            if found_message.id == message_id:
+                return found_message
+        raise hikari.NotFoundError("fake://message", {}, b"")
+
+    def fetch_messages(self, channel: Any, **kwargs: Any) -> FakeMessageIterator:
+        channel_id = resolve_id(channel)
+        return FakeMessageIterator(self, channel_id, list(reversed(self.messages.get(channel_id, []))))
+
+    async def fetch_channel(self, channel: Any) -> hikari.GuildChannel:
+        await self.request("fetch_channel", resolve_id(channel))
+        return self._channel(channel)
+
+    async def edit_channel(
+        self, channel: Any, *, name: Any = hikari.UNDEFINED, permission_overwrites: Any = hikari.UNDEFINED, parent_category: Any = hikari.UNDEFINED,
+        archived: Any = hikari.UNDEFINED, locked: Any = hikari.UNDEFINED, **kwargs: Any
+    ) -> hikari.GuildChannel:
+        old_channel = self._channel(channel)
+        await self.request("edit_channel", old_channel.id, "rename_channel" if name is not hikari.UNDEFINED else None)
+        changes: dict[str, Any] = {}
+        if name is not hikari.UNDEFINED:
+            changes["name"] = name
+        if isinstance(old_channel, hikari.GuildThreadChannel):
+            if archived is not hikari.UNDEFINED:
+                changes["is_archived"] = archived
+            if locked is not hikari.UNDEFINED:
+                changes["is_locked"] = locked
+            new_thread = attr.evolve(old_channel, **changes)
+            await self._bot.world.update_thread(new_thread)
+            return new_thread
+        if permission_overwrites is not hikari.UNDEFINED:
+            changes["permission_overwrites"] = overwrites_by_id(permission_overwrites)
+        if parent_category is not hikari.UNDEFINED:
+            changes["parent_id"] = resolve_id(parent_category)
+        assert isinstance(old_channel, hikari.PermissibleGuildChannel)
+        new_channel = attr.evolve(old_channel, **changes)
+        await self._bot.world.update_channel(old_channel, new_channel)
+        return new_channel
+
+    async def edit_permission_overwrite(self, channel: Any, target: Any, *, target_type: Any = hikari.UNDEFINED, allow: Any = hikari.UNDEFINED, deny: Any = hikari.UNDEFINED, **kwargs: Any) -> None:
+        old_channel = self._channel(channel)
+        assert isinstance(old_channel, hikari.PermissibleGuildChannel)
+        await self.request("edit_permission_overwrite", old_channel.id)
+        if target_type is hikari.UNDEFINED:
+            target_type = target.type if isinstance(target, hikari.PermissionOverwrite) else hikari.PermissionOverwriteType.MEMBER
+        overwrite = hikari.PermissionOverwrite(
+            id=resolve_id(target), type=target_type,
+            allow=hikari.Permissions.NONE if allow is hikari.UNDEFINED else allow, deny=hikari.Permissions.NONE if deny is hikari.UNDEFINED else deny)
+        await self._bot.world.update_channel(old_channel, attr.evolve(old_channel, permission_overwrites={**old_channel.permission_overwrites, overwrite.id: overwrite}))
+
+    async def delete_permission_overwrite(self, channel: Any, target: Any, **kwargs: Any) -> None:
+        old_channel = self._channel(channel)
+        assert isinstance(old_channel, hikari.PermissibleGuildChannel)
+        await self.request("delete_permission_overwrite", old_channel.id)
+        overwrites = {overwrite_id: overwrite for overwrite_id, overwrite in old_channel.permission_overwrites.items() if overwrite_id != resolve_id(target)}
+        await self._bot.world.update_channel(old_channel, attr.evolve(old_channel, permission_overwrites=overwrites))
+
+    async def delete_channel(self, channel: Any, **kwargs: Any) -> hikari.GuildChannel:
+        old_channel = self._channel(channel)
+        await self.request("delete_channel", old_channel.id)
+        if isinstance(old_channel, hikari.GuildThreadChannel):
+            await self._bot.world.delete_thread(old_channel)
+        else:
+            assert isinstance(old_channel, hikari.PermissibleGuildChannel)
+            await self._bot.world.delete_channel(old_channel)
+        return old_channel
+
+    async def create_thread(self, channel: Any, type: Any, name: str, *, auto_archive_duration: Any = hikari.UNDEFINED, invitable: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.GuildThreadChannel:
+        parent = self._channel(channel)
+        await self.request("create_thread", parent.id)
+        return await self._bot.world.create_thread(parent.guild_id, name, parent.id)
+
+    async def add_thread_member(self, channel: Any, user: Any) -> None:
+        await self.request("add_thread_member", resolve_id(channel))
+
+    async def create_guild_text_channel(self, guild: Any, name: str, *, permission_overwrites: Any = hikari.UNDEFINED, category: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.GuildTextChannel:
+        await self.request("create_channel", resolve_id(guild))
+        parent_id = None if category is hikari.UNDEFINED else resolve_id(category)
+        return await self._bot.world.create_text_channel(resolve_id(guild), name, parent_id, overwrites_by_id(permission_overwrites))
+
+    async def create_guild_category(self, guild: Any, name: str, *, permission_overwrites: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.GuildCategory:
+        await self.request("create_channel", resolve_id(guild))
+        return await self._bot.world.create_category(resolve_id(guild), name, overwrites_by_id(permission_overwrites))
+
+    async def fetch_roles(self, guild: Any) -> list[hikari.Role]:
+        await self.request("fetch_roles", resolve_id(guild))
+        return list(self._bot.cache.get_roles_view_for_guild(guild).values())
+
+    async def create_role(self, guild: Any, *, name: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Role:
+        await self.request("create_role", resolve_id(guild))
+        return await self._bot.world.create_role(resolve_id(guild), str(name))
+
+    async def fetch_member(self, guild: Any, user: Any) -> hikari.Member:
+        await self.request("fetch_member", resolve_id(guild))
+        nullable_member = self._bot.cache.get_member(guild, user)
+        if nullable_member is None:
+            raise hikari.NotFoundError("fake://member", {}, b"")
+        return nullable_member
+
+    async def edit_member(self, guild: Any, user: Any, *, roles: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Member:
+        guild_id = resolve_id(guild)
+        await self.request("edit_member", guild_id)
+        member = self._bot.cache.get_member(guild_id, user)
+        assert member is not None
+        if roles is hikari.UNDEFINED:
+            return member
+        return await self._bot.world.update_member(member, [resolve_id(role) for role in roles])
+
+    async def add_role_to_member(self, guild: Any, user: Any, role: Any, **kwargs: Any) -> None:
+        guild_id = resolve_id(guild)
+        await self.request("add_role_to_member", guild_id, "edit_member")
+        member = self._bot.cache.get_member(guild_id, user)
+        assert member is not None
+        await self._bot.world.update_member(member, list(dict.fromkeys([*member.role_ids, resolve_id(role)])))
+
+    async def remove_role_from_member(self, guild: Any, user: Any, role: Any, **kwargs: Any) -> None:
+        guild_id = resolve_id(guild)
+        await self.request("remove_role_from_member", guild_id, "edit_member")
+        member = self._bot.cache.get_member(guild_id, user)
+        assert member is not None
+        await self._bot.world.update_member(member, [role_id for role_id in member.role_ids if role_id != resolve_id(role)])
+
+    async def fetch_channel_webhooks(self, channel: Any) -> list[hikari.IncomingWebhook]:
+        channel_id = resolve_id(channel)
+        await self.request("fetch_channel_webhooks", channel_id)
+        return list(self.webhooks.get(channel_id, []))
+
+    async def create_webhook(self, channel: Any, name: str, **kwargs: Any) -> hikari.IncomingWebhook:
+        channel_id = resolve_id(channel)
+        await self.request("create_webhook", channel_id)
+        return self._bot.world.add_webhook(channel_id, name)
+
+    async def execute_webhook(self, webhook: Any, token: str, content: Any = hikari.UNDEFINED, *, username: Any = hikari.UNDEFINED, thread: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Message:
+        webhook_id = resolve_id(webhook)
+        await self.request("execute_webhook", webhook_id)
+        channel_id = resolve_id(thread) if thread is not hikari.UNDEFINED else self._bot.world.webhook_channels[webhook_id]
+        return self._bot.world.add_message(channel_id, self._bot.me, webhook_id, "" if content is hikari.UNDEFINED else str(content))
+
+    async def edit_webhook_message(self, webhook: Any, token: str, message: Any, content: Any = hikari.UNDEFINED, *, thread: Any = hikari.UNDEFINED, **kwargs: Any) -> hikari.Message:
+        webhook_id = resolve_id(webhook)
+        await self.request("edit_webhook_message", webhook_id)
+        channel_id = resolve_id(thread) if thread is not hikari.UNDEFINED else self._bot.world.webhook_channels[webhook_id]
+        return self._bot.world.edit_message(channel_id, resolve_id(message), content)
+
+    async def delete_webhook_message(self, webhook: Any, token: str, message: Any, *, thread: Any = hikari.UNDEFINED, **kwargs: Any) -> None:
+        webhook_id = resolve_id(webhook)
+        await self.request("delete_webhook_message", webhook_id)
+        channel_id = resolve_id(thread) if thread is not hikari.UNDEFINED else self._bot.world.webhook_channels[webhook_id]
+        self._bot.world.remove_messages(channel_id, {resolve_id(message)})
+
+def flatten_messages(messages: Sequence[Any]) -> list[Any]:
+    flattened = []
+    for message in messages:
+        if isinstance(message, (list, tuple, set)):
+            flattened.extend(message)
+        else:
+            flattened.append(message)
+    return flattened
+
+class FakeBot:
+    def __init__(self, latency: LatencyModel, rate_limits: Optional[dict[str, tuple[int, float]]] = None) -> None:
+        self.cache = FakeCache()
+        self.rest = FakeRESTClient(self, latency, rate_limits)
+        self.world = FakeWorld(self)
+        self.me = self.world.make_user("expedition", is_bot=True)
+        self._plugins: list[lightbulb.Plugin] = []
+
+    def get_me(self) -> hikari.User:
+        return self.me
+
+    def add_plugin(self, plugin: lightbulb.Plugin) -> None:
+        # the plugins only ever reach the app through plugin.app/plugin.bot
+        plugin._app = self # type: ignore[assignment]
+        self._plugins.append(plugin)
+
+    async def dispatch(self, event: hikari.Event) -> None:
+        listeners = [
+            listener
+            for plugin in self._plugins
+            for event_type, event_listeners in plugin._listeners.items()
+            if isinstance(event, event_type)
+            for listener in event_listeners
+        ]
+        await asyncio.gather(*(listener(event) for listener in listeners))
+
+class FakeWorld:
+    def __init__(self, bot: FakeBot) -> None:
+        self._bot = bot
+        self.webhook_channels: dict[hikari.Snowflake, hikari.Snowflake] = {}
+
+    def next_id(self) -> hikari.Snowflake:
+        return next(snowflake_ids)
+
+    def make_user(self, username: str, is_bot: bool = False) -> hikari.users.UserImpl:
+        return hikari.users.UserImpl(
+            id=self.next_id(), app=self._bot, discriminator="0", username=username, global_name=None, # type: ignore[arg-type]
+            avatar_hash=None, banner_hash=None, accent_color=None, is_bot=is_bot, is_system=False, flags=hikari.UserFlag.NONE)
+
+    def add_guild(self, name: str) -> hikari.GatewayGuild:
+        guild = hikari.GatewayGuild(
+            app=self._bot, id=self.next_id(), icon_hash=None, name=name, features=[], application_id=None, # type: ignore[arg-type]
+            afk_channel_id=None, afk_timeout=datetime.timedelta(0), banner_hash=None,
+            default_message_notifications=hikari.GuildMessageNotificationsLevel.ONLY_MENTIONS, description=None,
+            discovery_splash_hash=None, explicit_content_filter=hikari.GuildExplicitContentFilterLevel.DISABLED,
+            is_widget_enabled=None, max_video_channel_users=None, mfa_level=hikari.GuildMFALevel.NONE, owner_id=self._bot.me.id,
+            preferred_locale="en-US", premium_subscription_count=None, premium_tier=hikari.GuildPremiumTier.NONE,
+            public_updates_channel_id=None, rules_channel_id=None, splash_hash=None, system_channel_flags=hikari.GuildSystemChannelFlag.NONE,
+            system_channel_id=None, vanity_url_code=None, verification_level=hikari.GuildVerificationLevel.NONE, widget_channel_id=None,
+            nsfw_level=hikari.GuildNSFWLevel.DEFAULT, is_large=False, joined_at=now(), member_count=0)
+        self._bot.cache.guilds[guild.id] = guild
+        self._bot.cache.members[guild.id] = {}
+        self._bot.cache.roles[guild.id] = self.make_role(guild.id, "@everyone", guild.id)
+        return guild
+
+    def make_role(self, guild_id: hikari.Snowflake, name: str, role_id: Optional[hikari.Snowflake] = None) -> hikari.Role:
+        return hikari.Role(
+            app=self._bot, id=role_id or self.next_id(), name=name, color=hikari.Color(0), guild_id=guild_id, is_hoisted=False, # type: ignore[arg-type]
+            icon_hash=None, unicode_emoji=None, is_managed=False, is_mentionable=False, permissions=hikari.Permissions.NONE,
+            position=len(self._bot.cache.roles), bot_id=None, integration_id=None, is_premium_subscriber_role=False,
+            subscription_listing_id=None, is_available_for_purchase=False, is_guild_linked_role=False)
+
+    def add_member(self, guild_id: hikari.Snowflake, username: str) -> hikari.Member:
+        member = hikari.Member(
+            guild_id=guild_id, is_deaf=False, is_mute=False, is_pending=False, joined_at=now(), nickname=None,
+            premium_since=None, raw_communication_disabled_until=None, role_ids=[guild_id], user=self.make_user(username),
+            guild_avatar_hash=None)
+        self._bot.cache.members[guild_id][member.id] = member
+        return member
+
+    def make_text_channel(self, guild_id: hikari.Snowflake, name: str, parent_id: Optional[hikari.Snowflake], overwrites: dict[hikari.Snowflake, hikari.PermissionOverwrite]) -> hikari.GuildTextChannel:
+        return hikari.GuildTextChannel(
+            app=self._bot, id=self.next_id(), name=name, type=hikari.ChannelType.GUILD_TEXT, guild_id=guild_id, # type: ignore[arg-type]
+            parent_id=parent_id, position=len(self._bot.cache.channels), is_nsfw=False, permission_overwrites=overwrites,
+            topic=None, last_message_id=None, rate_limit_per_user=datetime.timedelta(0), last_pin_timestamp=None,
+            default_auto_archive_duration=datetime.timedelta(days=1))
+
+    def make_thread(self, guild_id: hikari.Snowflake, name: str, parent_id: hikari.Snowflake) -> hikari.GuildPrivateThread:
+        return hikari.GuildPrivateThread(
+            app=self._bot, id=self.next_id(), name=name, type=hikari.ChannelType.GUILD_PRIVATE_THREAD, guild_id=guild_id, # type: ignore[arg-type]
+            last_message_id=None, last_pin_timestamp=None, rate_limit_per_user=datetime.timedelta(0), approximate_message_count=0,
+            approximate_member_count=1, is_archived=False, auto_archive_duration=datetime.timedelta(days=7), archive_timestamp=now(),
+            is_locked=False, member=None, owner_id=self._bot.me.id, parent_id=parent_id, thread_created_at=now(), is_invitable=False)
+
+    def make_category(self, guild_id: hikari.Snowflake, name: str, overwrites: dict[hikari.Snowflake, hikari.PermissionOverwrite]) -> hikari.GuildCategory:
+        return hikari.GuildCategory(
+            app=self._bot, id=self.next_id(), name=name, type=hikari.ChannelType.GUILD_CATEGORY, guild_id=guild_id, # type: ignore[arg-type]
+            position=len(self._bot.cache.channels), is_nsfw=False, permission_overwrites=overwrites, parent_id=None)
+
+    def add_webhook(self, channel_id: hikari.Snowflake, name: str) -> hikari.IncomingWebhook:
+        channel = self._bot.cache.get_guild_channel(channel_id)
+        webhook = hikari.IncomingWebhook(
+            app=self._bot, id=self.next_id(), type=hikari.WebhookType.INCOMING, name=name, avatar_hash=None, # type: ignore[arg-type]
+            application_id=None, channel_id=channel_id, guild_id=channel.guild_id if channel is not None else None, author=None, token="token")
+        self._bot.rest.webhooks.setdefault(channel_id, []).append(webhook)
+        self.webhook_channels[webhook.id] = channel_id
+        return webhook
+
+    def make_message(self, channel_id: hikari.Snowflake, author: hikari.User, member: Optional[hikari.Member], webhook_id: Optional[hikari.Snowflake], content: str) -> hikari.Message:
+        channel: Optional[hikari.GuildChannel] = self._bot.cache.get_guild_channel(channel_id) or self._bot.cache.get_thread(channel_id)
+        return hikari.Message(
+            app=self._bot, id=self.next_id(), channel_id=channel_id, guild_id=channel.guild_id if channel is not None else None, # type: ignore[arg-type]
+            user_mentions={}, role_mention_ids=[], channel_mentions={}, mentions_everyone=False, author=author, member=member,
+            content=content, timestamp=now(), edited_timestamp=None, is_tts=False, attachments=[], embeds=[], reactions=[],
+            is_pinned=False, webhook_id=webhook_id, type=hikari.MessageType.DEFAULT, activity=None, application=None,
+            message_reference=None, flags=hikari.MessageFlag.NONE, stickers=[], nonce=None, referenced_message=None,
+            interaction=None, application_id=None, components=[])
+
+    def add_message(self, channel_id: hikari.Snowflake, author: hikari.User, webhook_id: Optional[hikari.Snowflake], content: str, member: Optional[hikari.Member] = None) -> hikari.Message:
+        message = self.make_message(channel_id, author, member, webhook_id, content)
+        self._bot.rest.messages.setdefault(channel_id, []).append(message)
+        return message
+
+    def edit_message(self, channel_id: hikari.Snowflake, message_id: hikari.Snowflake, content: Any) -> hikari.Message:
+        messages = self._bot.rest.messages.get(channel_id, [])
+        for i, message in enumerate(messages):
+            if message.id == message_id:
+                if content is not hikari.UNDEFINED:
+                    messages[i] = attr.evolve(message, content=content, edited_timestamp=now())
+                return messages[i]
+        raise hikari.NotFoundError("fake://message", {}, b"")
+
+    def remove_messages(self, channel_id: hikari.Snowflake, message_ids: set[hikari.Snowflake]) -> None:
+        self._bot.rest.messages[channel_id] = [message for message in self._bot.rest.messages.get(channel_id, []) if message.id not in message_ids]
+
+    # everything below plays the part of the gateway: update the cache, then dispatch the event
+
+    async def create_text_channel(self, guild_id: hikari.Snowflake, name: str, parent_id: Optional[hikari.Snowflake], overwrites: dict[hikari.Snowflake, hikari.PermissionOverwrite]) -> hikari.GuildTextChannel:
+        channel = self.make_text_channel(guild_id, name, parent_id, overwrites)
+        self._bot.cache.channels[channel.id] = channel
+        await self._bot.dispatch(hikari.GuildChannelCreateEvent(shard=None, channel=channel)) # type: ignore[arg-type]
+        return channel
+
+    async def create_category(self, guild_id: hikari.Snowflake, name: str, overwrites: dict[hikari.Snowflake, hikari.PermissionOverwrite]) -> hikari.GuildCategory:
+        category = self.make_category(guild_id, name, overwrites)
+        self._bot.cache.channels[category.id] = category
+        await self._bot.dispatch(hikari.GuildChannelCreateEvent(shard=None, channel=category)) # type: ignore[arg-type]
+        return category
+
+    async def update_channel(self, old_channel: hikari.PermissibleGuildChannel, new_channel: hikari.PermissibleGuildChannel) -> None:
+        self._bot.cache.channels[new_channel.id] = new_channel
+        await self._bot.dispatch(hikari.GuildChannelUpdateEvent(shard=None, old_channel=old_channel, channel=new_channel)) # type: ignore[arg-type]
+
+    async def delete_channel(self, channel: hikari.PermissibleGuildChannel) -> None:
+        self._bot.cache.channels.pop(channel.id, None)
+        await self._bot.dispatch(hikari.GuildChannelDeleteEvent(shard=None, channel=channel)) # type: ignore[arg-type]
+
+    async def create_thread(self, guild_id: hikari.Snowflake, name: str, parent_id: hikari.Snowflake) -> hikari.GuildThreadChannel:
+        thread = self.make_thread(guild_id, name, parent_id)
+        self._bot.cache.threads[thread.id] = thread
+        await self._bot.dispatch(hikari.GuildThreadCreateEvent(shard=None, thread=thread)) # type: ignore[arg-type]
+        return thread
+
+    async def update_thread(self, thread: hikari.GuildThreadChannel) -> None:
+        self._bot.cache.threads[thread.id] = thread
+        await self._bot.dispatch(hikari.GuildThreadUpdateEvent(shard=None, thread=thread)) # type: ignore[arg-type]
+
+    async def delete_thread(self, thread: hikari.GuildThreadChannel) -> None:
+        self._bot.cache.threads.pop(thread.id, None)
+        await self._bot.dispatch(hikari.GuildThreadDeleteEvent(
+            app=self._bot, shard=None, thread_id=thread.id, guild_id=thread.guild_id, parent_id=thread.parent_id, type=thread.type)) # type: ignore[arg-type]
+
+    async def create_role(self, guild_id: hikari.Snowflake, name: str) -> hikari.Role:
+        role = self.make_role(guild_id, name)
+        self._bot.cache.roles[role.id] = role
+        await self._bot.dispatch(hikari.RoleCreateEvent(shard=None, role=role)) # type: ignore[arg-type]
+        return role
+
+    async def update_member(self, member: hikari.Member, role_ids: list[hikari.Snowflake]) -> hikari.Member:
+        new_member = attr.evolve(member, role_ids=role_ids)
+        self._bot.cache.members[member.guild_id][member.id] = new_member
+        await self._bot.dispatch(hikari.MemberUpdateEvent(shard=None, old_member=member, member=new_member)) # type: ignore[arg-type]
+        return new_member
+
+class FakeInteraction:
+    def __init__(self, member: hikari.InteractionMember) -> None:
+        self.member = member
+
+class FakeContext:
+    def __init__(self, bot: FakeBot, guild: hikari.GatewayGuild, member: hikari.Member, channel_id: hikari.Snowflake, options: dict[str, Any], is_admin: bool = False) -> None:
+        self.bot = bot
+        self.app = bot
+        self.member = member
+        self.author = member.user
+        self.guild_id = guild.id
+        self.channel_id = channel_id
+        self.options = options
+        self.responses: list[str] = []
+        permissions = hikari.Permissions.all_permissions() if is_admin else hikari.Permissions.NONE
+        self.interaction = FakeInteraction(hikari.InteractionMember(
+            **{field.name: getattr(member, field.name) for field in attr.fields(hikari.Member) if field.init}, permissions=permissions))
+
+    def get_guild(self) -> Optional[hikari.GatewayGuild]:
+        return self.bot.cache.get_guild(self.guild_id)
+
+    def get_channel(self) -> Optional[hikari.PermissibleGuildChannel]:
+        return self.bot.cache.get_guild_channel(self.channel_id)
+
+    async def respond(self, *args: Any, **kwargs: Any) -> None:
+        await self.bot.rest.request("interaction_response")
+        content = [arg for arg in args if isinstance(arg, str)]
+        self.responses.append(content[0] if content else str(kwargs.get("content", "")))
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import attr
+import collections
+import hikari
+import json
+import lightbulb
+import os
+import random
+import tempfile
+import time
+
+from typing import Any, Awaitable, Callable, Optional
+
+import setup_tables
+
+from benchmarks.fake_discord import FakeContext, LatencyModel
+from benchmarks.run import MAP_NAME, World, build_world, drain, player_ctx
+from plugins import map as map_plugin
+from utils import consts
+from utils.instrumentation import Histogram
+
+LOCATION_OPTIONS = ("location", "location-name")
+
+@attr.define
+class ReplayResult:
+    events: int
+    events_by_kind: dict[str, int]
+    skipped: int
+    errors: dict[str, int]
+    wall_seconds: float
+    events_per_second: float
+    p50_ms: float
+    p95_ms: float
+    max_lag_ms: float
+    max_in_flight: int
+    mean_in_flight: float
+    max_background_tasks: int
+    rest_calls: int
+    rest_calls_by_route: dict[str, int]
+    rate_limited: int
+
+PSEUDONYM_FIELDS = ("g", "c", "a", "m", "ref")
+
+def rekey_options(options: dict[str, Any], rekey: Callable[[int], int]) -> dict[str, Any]:
+    rekeyed: dict[str, Any] = {}
+    for name, value in options.items():
+        if isinstance(value, dict) and len(value) == 1 and isinstance(value.get("user", value.get("id")), int):
+            rekeyed[name] = {key: rekey(pseudonym) for key, pseudonym in value.items()}
+        elif isinstance(value, dict) and "len" not in value:
+            rekeyed[name] = rekey_options(value, rekey)
+        else:
+            rekeyed[name] = value
+    return rekeyed
+
+def load_records(path: str) -> list[dict[str, Any]]:
+    # a recording file can hold several bot sessions back to back, their clocks are laid end to end
+    # and pseudonyms restart in every session, so they are numbered again by (session, pseudonym)
+    records = []
+    session_offset = 0.0
+    last_time = 0.0
+    session = 0
+    pseudonyms: dict[tuple[int, int], int] = {}
+
+    def rekey(pseudonym: int) -> int:
+        return pseudonyms.setdefault((session, pseudonym), len(pseudonyms) + 1)
+
+    with open(path, encoding="utf-8") as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["k"] == "start":
+                session_offset = last_time
+                session += 1
+                continue
+            record["t"] += session_offset
+            for field in PSEUDONYM_FIELDS:
+                if field in record:
+                    record[field] = rekey(record[field])
+            if record.get("o"):
+                record["o"] = rekey_options(record["o"], rekey)
+            last_time = record["t"]
+            records.append(record)
+    return records
+
+def recorded_users(records: list[dict[str, Any]]) -> list[int]:
+    users: dict[int, None] = {}
+    for record in records:
+        users.setdefault(record["a"], None)
+        for value in (record.get("o") or {}).values():
+            if isinstance(value, dict) and "user" in value:
+                users.setdefault(value["user"], None)
+    return list(users)
+
+def recorded_locations(records: list[dict[str, Any]]) -> list[str]:
+    locations: dict[str, None] = {}
+    for record in records:
+        options = record.get("o") or {}
+        for name in LOCATION_OPTIONS:
+            if isinstance(options.get(name), str):
+                locations.setdefault(options[name].strip().lower(), None)
+    return [location for location in locations if location]
+
+def filler(length: int) -> str:
+    return ("lorem ipsum " * (length // 12 + 1))[:length] or "."
+
+class Replayer:
+    def __init__(self, world: World, records: list[dict[str, Any]], users: list[int]) -> None:
+        self.world = world
+        self.records = records
+        self.members = dict(zip(users, world.players))
+        self.commands = {
+            command.name: command
+            for command in vars(map_plugin).values()
+            if isinstance(command, lightbulb.CommandLike)
+        }
+        # maps created during the recording keep their names, everything else is played against the seeded map
+        self.created_maps = {record["o"]["map-name"] for record in records if record["k"] == "cmd" and record.get("cmd") == "create-map" and record.get("o")}
+        self.messages: dict[int, hikari.Message] = {}
+        self.latencies = Histogram()
+        self.in_flight: set[asyncio.Task[None]] = set()
+        self.in_flight_samples: list[int] = []
+        self.max_background_tasks = 0
+        self.max_lag = 0.0
+        self.skipped = 0
+        self.errors: collections.Counter[str] = collections.Counter()
+
+    def command_options(self, options: dict[str, Any]) -> dict[str, Any]:
+        converted: dict[str, Any] = {}
+        for name, value in options.items():
+            if name == "map-name" and value not in self.created_maps:
+                converted[name] = MAP_NAME
+            elif isinstance(value, dict) and "user" in value:
+                converted[name] = self.members.get(value["user"])
+            elif isinstance(value, dict) and "len" in value:
+                converted[name] = filler(value["len"])
+            elif isinstance(value, dict):
+                # roles and channels are not recreated, the command sees the option as missing
+                converted[name] = None
+            else:
+                converted[name] = value
+        return converted
+
+    def prepare(self, record: dict[str, Any]) -> Optional[Awaitable[None]]:
+        member = self.members[record["a"]]
+        kind = record["k"]
+        if kind == "msg":
+            channel_id = player_ctx(self.world, member, {}).channel_id
+            message = self.world.bot.world.add_message(channel_id, member.user, None, filler(record.get("len", 0)), member=member)
+            self.messages[record["m"]] = message
+            return self.world.bot.dispatch(hikari.GuildMessageCreateEvent(message=message, shard=None)) # type: ignore[arg-type]
+        if kind == "edit":
+            old_message = self.messages.get(record["m"])
+            if old_message is None:
+                return None
+            new_message = self.world.bot.world.edit_message(old_message.channel_id, old_message.id, filler(record.get("len", 0)) + "*")
+            self.messages[record["m"]] = new_message
+            return self.world.bot.dispatch(hikari.GuildMessageUpdateEvent(old_message=old_message, message=new_message, shard=None)) # type: ignore[arg-type]
+        if kind == "cmd":
+            command = self.commands.get(record.get("cmd", ""))
+            if command is None:
+                return None
+            channel_id = player_ctx(self.world, member, {}).channel_id
+            ctx = FakeContext(self.world.bot, self.world.guild, member, channel_id, self.command_options(record.get("o") or {}), is_admin=bool(record.get("adm")))
+            return command.callback(ctx)
+        return None
+
+    async def handle(self, kind: str, work: Awaitable[None]) -> None:
+        start = time.perf_counter()
+        try:
+            await work
+        except Exception as e:
+            self.errors[f"{kind}:{type(e).__name__}"] += 1
+        self.latencies.observe(time.perf_counter() - start)
+
+    async def replay(self, speed: Optional[float]) -> None:
+        start = time.perf_counter()
+        first_time = self.records[0]["t"] if self.records else 0.0
+        for record in self.records:
+            if speed is not None:
+                due = start + (record["t"] - first_time) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.max_lag = max(self.max_lag, time.perf_counter() - due)
+            work = self.prepare(record)
+            if work is None:
+                self.skipped += 1
+                continue
+            task = asyncio.create_task(self.handle(record["k"], work))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+            self.in_flight_samples.append(len(self.in_flight))
+            self.max_background_tasks = max(self.max_background_tasks, len(asyncio.all_tasks()) - len(self.in_flight) - 1)
+            if speed is None:
+                # let earlier events make progress, the way a busy gateway connection would
+                await asyncio.sleep(0)
+
+def parse_speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive, or max")
+    return speed
+
+async def replay(args: argparse.Namespace) -> ReplayResult:
+    records = load_records(args.recording)
+    users = recorded_users(records)
+    locations = recorded_locations(records)
+    locations += [f"location{i}" for i in range(max(0, args.locations - len(locations)))]
+    latency = LatencyModel(args.latency_ms / 1000, args.jitter_ms / 1000)
+    world = await build_world(max(1, len(users)), locations, latency, {} if args.no_rate_limits else None)
+    replayer = Replayer(world, records, users)
+    world.bot.rest.reset_counters()
+
+    start = time.perf_counter()
+    await replayer.replay(args.speed)
+    await drain()
+    wall_seconds = time.perf_counter() - start
+
+    calls = world.bot.rest.calls
+    samples = replayer.in_flight_samples
+    handled = len(records) - replayer.skipped
+    return ReplayResult(
+        len(records), dict(collections.Counter(record["k"] for record in records)), replayer.skipped, dict(replayer.errors),
+        wall_seconds, handled / wall_seconds if wall_seconds else 0.0, replayer.latencies.percentile(50) * 1000, replayer.latencies.percentile(95) * 1000,
+        replayer.max_lag * 1000, max(samples, default=0), sum(samples) / len(samples) if samples else 0.0, replayer.max_background_tasks,
+        sum(calls.values()), dict(calls.most_common()), sum(world.bot.rest.rate_limited.values()))
+
+def format_result(result: ReplayResult) -> str:
+    kinds = ", ".join(f"{kind}={count}" for kind, count in result.events_by_kind.items())
+    routes = ", ".join(f"{route}={count}" for route, count in list(result.rest_calls_by_route.items())[:6])
+    errors = ", ".join(f"{error}={count}" for error, count in result.errors.items()) or "none"
+    return "\n".join((
+        f"events      {result.events} ({kinds}), {result.skipped} skipped",
+        f"wall        {result.wall_seconds:.2f}s, {result.events_per_second:.1f} events/s",
+        f"latency     p50 {result.p50_ms:.1f}ms, p95 {result.p95_ms:.1f}ms, scheduler lag up to {result.max_lag_ms:.1f}ms",
+        f"queue       in flight max {result.max_in_flight}, mean {result.mean_in_flight:.1f}, background tasks max {result.max_background_tasks}",
+        f"rest        {result.rest_calls} calls, {result.rate_limited} rate limited ({routes})",
+        f"errors      {errors}",
+    ))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay traffic recorded with EXPEDITION_RECORD_EVENTS against an in-process fake of discord")
+    parser.add_argument("recording", help="JSONL file written by utils.event_recorder")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10 (or 10x) to scale the recorded gaps, max to send events back to back")
+    parser.add_argument("--locations", type=int, default=8, help="minimum number of locations in the replay map")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--flush-seconds", type=float, default=0.5, help="flint log flush interval used during the replay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the result to this file, for comparing runs")
+    return parser.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    random.seed(args.seed)
+    map_plugin.FLINT_LOG_FLUSH_SECONDS = args.flush_seconds
+    with tempfile.TemporaryDirectory() as directory:
+        consts.SQLITE_DB = os.path.join(directory, "replay.sqlite")
+        asyncio.run(setup_tables.create_table())
+        result = asyncio.run(replay(args))
+    print(format_result(result))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(attr.asdict(result), json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import attr
+import hikari
+import json
+import os
+import random
+import tempfile
+import time
+
+from typing import Any, Awaitable, Callable, Optional
+
+import setup_tables
+
+from benchmarks.fake_discord import FakeBot, FakeContext, LatencyModel, now
+from plugins import map as map_plugin
+from utils import consts
+from utils.instrumentation import Histogram
+
+MAP_NAME = "bench"
+ARRIVALS_MAP_NAME = "arrivals"
+SCENARIOS = ("add_player", "move", "mirror_messages", "mirror_edits", "locations_message", "yell")
+
+@attr.define
+class World:
+    bot: FakeBot
+    guild: hikari.GatewayGuild
+    admin: hikari.Member
+    players: list[hikari.Member]
+    locations: list[str]
+    command_channel_id: hikari.Snowflake
+    sent_messages: list[hikari.Message] = attr.field(factory=list)
+
+@attr.define
+class ScenarioResult:
+    scenario: str
+    players: int
+    ops: int
+    wall_seconds: float
+    p50_ms: float
+    p95_ms: float
+    rest_calls: int
+    rest_calls_by_route: dict[str, int]
+    rate_limited: int
+
+async def drain() -> None:
+    # background work (announcements, queued renames, flint log flushes) counts towards the scenario
+    current = asyncio.current_task()
+    while True:
+        pending = [task for task in asyncio.all_tasks() if task is not current and not task.done()]
+        if not pending:
+            return
+        await asyncio.wait(pending)
+
+def player_ctx(world: World, player: hikari.Member, options: dict[str, Any]) -> FakeContext:
+    channel_ids = map_plugin.player_channels.get(world.guild.id).get_channels(player.id, MAP_NAME)
+    return FakeContext(world.bot, world.guild, player, channel_ids[0] if channel_ids else world.command_channel_id, options)
+
+def admin_ctx(world: World, options: dict[str, Any]) -> FakeContext:
+    return FakeContext(world.bot, world.guild, world.admin, world.command_channel_id, options, is_admin=True)
+
+async def build_world(player_count: int, locations: list[str], latency: LatencyModel, rate_limits: Optional[dict[str, tuple[int, float]]]) -> World:
+    bot = FakeBot(latency, rate_limits)
+    bot.add_plugin(map_plugin.plugin)
+    guild = bot.world.add_guild(f"bench-{player_count}")
+    admin = bot.world.add_member(guild.id, "admin")
+    players = [bot.world.add_member(guild.id, f"player{i}") for i in range(player_count)]
+    command_channel = await bot.world.create_text_channel(guild.id, "general", None, {})
+    world = World(bot, guild, admin, players, locations, command_channel.id)
+
+    await bot.dispatch(hikari.StartedEvent(app=bot)) # type: ignore[arg-type]
+    await bot.dispatch(hikari.GuildAvailableEvent(
+        shard=None, guild=guild, emojis={}, stickers={}, roles={}, channels={}, threads={}, members={}, presences={}, voice_states={})) # type: ignore[arg-type]
+    await map_plugin.create_map.callback(admin_ctx(world, {"map-name": MAP_NAME, "locations": ", ".join(locations)}))
+    await map_plugin.create_map.callback(admin_ctx(world, {"map-name": ARRIVALS_MAP_NAME, "locations": ", ".join(locations)}))
+
+    # players are seeded straight into the cache, add-player is measured on its own
+    # they get channels the way the plugin allocates them, threads once the categories or the guild run out of room
+    templates = map_plugin.permission_templates.get(guild.id)
+    category = None
+    thread_category = None
+    parent = None
+    player_channel_rows = []
+    channel_capacity = map_plugin.MAX_CHAT_CATEGORIES * map_plugin.CHAT_CATEGORY_CAPACITY
+    for i, player in enumerate(players):
+        location = locations[i % len(locations)]
+        channel_name = map_plugin.get_player_location_name(player, location)
+        if i < channel_capacity and len(guild.get_channels()) < map_plugin.GUILD_CHANNEL_BUDGET:
+            if i % map_plugin.CHAT_CATEGORY_CAPACITY == 0:
+                category = await bot.world.create_category(guild.id, f"{MAP_NAME}-channels-{i // map_plugin.CHAT_CATEGORY_CAPACITY}", {})
+            assert category is not None
+            overwrites = {overwrite.id: overwrite for overwrite in templates.location_channel_overwrites(player.id, True)}
+            channel = await bot.world.create_text_channel(guild.id, channel_name, category.id, overwrites)
+            bot.world.add_webhook(channel.id, map_plugin.WEBHOOK_NAME)
+            player_channel_rows.append((channel.id, MAP_NAME, player.id))
+            continue
+        if thread_category is None:
+            thread_category = await bot.world.create_category(guild.id, f"{MAP_NAME}-threads", {})
+        if parent is None or map_plugin.count_member_overwrites(parent) >= map_plugin.THREAD_PARENT_CAPACITY:
+            overwrites = {overwrite.id: overwrite for overwrite in templates.thread_parent_overwrites()}
+            parent = await bot.world.create_text_channel(guild.id, f"{MAP_NAME}-threads-{len(map_plugin.get_channel_index(guild).thread_parent_ids.get(MAP_NAME, []))}", thread_category.id, overwrites)
+            bot.world.add_webhook(parent.id, map_plugin.WEBHOOK_NAME)
+        player_overwrite = templates.player_thread_parent(player.id)
+        new_parent = attr.evolve(parent, permission_overwrites={**parent.permission_overwrites, player_overwrite.id: player_overwrite})
+        await bot.world.update_channel(parent, new_parent)
+        parent = new_parent
+        thread = await bot.world.create_thread(guild.id, channel_name, parent.id)
+        player_channel_rows.append((thread.id, MAP_NAME, player.id))
+    await map_plugin.player_channels.add_channels(guild.id, player_channel_rows)
+    await map_plugin.warm_guild_caches(bot, guild) # type: ignore[arg-type]
+    await drain()
+    return world
+
+async def scenario_add_player(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    arrivals = [world.bot.world.add_member(world.guild.id, f"arrival{i}") for i in range(samples)]
+    return [lambda arrival=arrival: map_plugin.add_player.callback(admin_ctx(world, {"player": arrival, "map-name": ARRIVALS_MAP_NAME})) for arrival in arrivals]
+
+async def scenario_move(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    operations = []
+    for player in random.sample(world.players, min(samples, len(world.players))):
+        location = random.choice(world.locations)
+        while len(world.locations) > 1 and location == map_plugin.get_map_occupancy(world.guild, map_plugin.atlas.get_map(world.guild.id, MAP_NAME)).location_of(player.id): # type: ignore[arg-type]
+            location = random.choice(world.locations)
+        operations.append(lambda player=player, location=location: map_plugin.move.callback(player_ctx(world, player, {"location": location})))
+    return operations
+
+async def scenario_mirror_messages(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    async def send(player: hikari.Member, i: int) -> None:
+        channel_id = player_ctx(world, player, {}).channel_id
+        message = world.bot.world.add_message(channel_id, player.user, None, f"benchmark message {i}", member=player)
+        world.sent_messages.append(message)
+        await world.bot.dispatch(hikari.GuildMessageCreateEvent(message=message, shard=None)) # type: ignore[arg-type]
+    return [lambda player=player, i=i: send(player, i) for i, player in enumerate(random.choices(world.players, k=samples))]
+
+async def scenario_mirror_edits(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    async def edit(message: hikari.Message) -> None:
+        edited_message = attr.evolve(message, content=f"{message.content} (edited)", edited_timestamp=now())
+        await world.bot.dispatch(hikari.GuildMessageUpdateEvent(old_message=message, message=edited_message, shard=None)) # type: ignore[arg-type]
+    return [lambda message=message: edit(message) for message in world.sent_messages[:samples]]
+
+async def scenario_locations_message(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    bench_map = map_plugin.atlas.get_map(world.guild.id, MAP_NAME)
+    assert bench_map is not None
+    return [
+        lambda player=player: map_plugin.locations_message(admin_ctx(world, {}), world.guild, bench_map, [player], None, random.choice(world.locations)) # type: ignore[arg-type]
+        for player in random.choices(world.players, k=samples)
+    ]
+
+async def scenario_yell(world: World, samples: int) -> list[Callable[[], Awaitable[Any]]]:
+    return [lambda player=player: map_plugin.yell.callback(player_ctx(world, player, {"message": "benchmark yell"})) for player in random.choices(world.players, k=samples)]
+
+SCENARIO_BUILDERS = {
+    "add_player": scenario_add_player,
+    "move": scenario_move,
+    "mirror_messages": scenario_mirror_messages,
+    "mirror_edits": scenario_mirror_edits,
+    "locations_message": scenario_locations_message,
+    "yell": scenario_yell,
+}
+
+async def run_scenario(world: World, scenario: str, samples: int) -> ScenarioResult:
+    operations = await SCENARIO_BUILDERS[scenario](world, samples)
+    world.bot.rest.reset_counters()
+    histogram = Histogram()
+    start = time.perf_counter()
+    for operation in operations:
+        operation_start = time.perf_counter()
+        await operation()
+        histogram.observe(time.perf_counter() - operation_start)
+    await drain()
+    wall_seconds = time.perf_counter() - start
+    calls = world.bot.rest.calls
+    return ScenarioResult(
+        scenario, len(world.players), len(operations), wall_seconds, histogram.percentile(50) * 1000, histogram.percentile(95) * 1000,
+        sum(calls.values()), dict(calls.most_common()), sum(world.bot.rest.rate_limited.values()))
+
+def format_result(result: ScenarioResult) -> str:
+    top_routes = ", ".join(f"{route}={count}" for route, count in list(result.rest_calls_by_route.items())[:4])
+    calls_per_op = result.rest_calls / result.ops if result.ops else 0
+    return (f"{result.players:>6} {result.scenario:<18} {result.ops:>5} {result.wall_seconds:>8.2f} {result.p50_ms:>8.1f} {result.p95_ms:>8.1f} "
+        f"{result.rest_calls:>7} {calls_per_op:>7.1f} {result.rate_limited:>6}  {top_routes}")
+
+async def run(args: argparse.Namespace) -> list[ScenarioResult]:
+    latency = LatencyModel(args.latency_ms / 1000, args.jitter_ms / 1000)
+    rate_limits = {} if args.no_rate_limits else None
+    map_plugin.FLINT_LOG_FLUSH_SECONDS = args.flush_seconds
+    print(f"{'players':>6} {'scenario':<18} {'ops':>5} {'wall_s':>8} {'p50_ms':>8} {'p95_ms':>8} {'calls':>7} {'per_op':>7} {'429s':>6}  top routes")
+    results = []
+    for player_count in args.players:
+        world = await build_world(player_count, [f"location{i}" for i in range(args.locations)], latency, rate_limits)
+        await map_plugin.atlas.set_movement_mode(world.guild.id, MAP_NAME, args.movement_mode)
+        await map_plugin.atlas.set_spectator_digest(world.guild.id, MAP_NAME, args.spectator_digest_seconds)
+        await map_plugin.settings_manager.set_setting(world.guild.id, "webhook_pool_size", args.webhook_pool_size)
+        await map_plugin.settings_manager.set_setting(world.guild.id, "webhook_pool_strategy", args.webhook_pool_strategy)
+        await map_plugin.settings_manager.set_setting(world.guild.id, "should_track_roles", args.track_roles)
+        for scenario in args.scenarios:
+            samples = args.yell_samples if scenario == "yell" else args.samples
+            result = await run_scenario(world, scenario, samples)
+            print(format_result(result), flush=True)
+            results.append(result)
+    return results
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive the map plugin's hot paths against an in-process fake of discord")
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--locations", type=int, default=8)
+    parser.add_argument("--samples", type=int, default=20, help="operations per scenario")
+    parser.add_argument("--yell-samples", type=int, default=3, help="yells fan out to every location channel, so fewer are run")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--movement-mode", choices=map_plugin.MOVEMENT_MODES, default=map_plugin.RENAME_MOVEMENT, help="how the bench map moves players")
+    parser.add_argument("--spectator-digest-seconds", type=int, default=0, help="post spectator digests this often instead of mirroring each message, 0 is off")
+    parser.add_argument("--webhook-pool-size", type=int, default=1, help="webhooks per spectator channel and thread parent")
+    parser.add_argument("--webhook-pool-strategy", choices=map_plugin.POOL_STRATEGIES, default=map_plugin.POOL_STRATEGIES[0])
+    parser.add_argument("--track-roles", action="store_true", help="give moved players their location role")
+    parser.add_argument("--flush-seconds", type=float, default=0.5, help="flint log flush interval used during the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file, for comparing runs")
+    return parser.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        consts.SQLITE_DB = os.path.join(directory, "benchmark.sqlite")
+        asyncio.run(setup_tables.create_table())
+        results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump([attr.asdict(result) for result in results], json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,10 @@ import sqlite3
 
 from lightbulb import commands
 
-from plugins import map
+from plugins import map, stats
+from utils.event_recorder import EventRecorder
+from utils.instrumentation import instrumentation, record_rest_rate_limits
+from utils.metrics_server import MetricsServer
 from utils.type_enforcer import TypeEnforcementError
 
 with open('secrets/client', 'r') as client_file:
@@ -27,6 +30,19 @@ bot = lightbulb.BotApp(
 )
 
 bot.add_plugin(map.plugin)
+bot.add_plugin(stats.plugin)
+
+record_rest_rate_limits(instrumentation)
+
+# set to a file path to record scrubbed traffic for benchmarks/replay.py
+record_events_path = os.environ.get("EXPEDITION_RECORD_EVENTS")
+if record_events_path:
+    EventRecorder(record_events_path).subscribe(bot)
+
+# set to a port to serve prometheus metrics on /metrics, bound to localhost unless EXPEDITION_METRICS_HOST says otherwise
+metrics_port = os.environ.get("EXPEDITION_METRICS_PORT")
+if metrics_port:
+    MetricsServer(instrumentation, os.environ.get("EXPEDITION_METRICS_HOST", "127.0.0.1"), int(metrics_port)).subscribe(bot)
 
 @bot.listen(lightbulb.CommandErrorEvent)
 async def on_error(event: lightbulb.CommandErrorEvent) -> None:
@@ -1,17 +1,28 @@
 import asyncio
 import datetime
+import functools
 import hikari
+import itertools
 import lightbulb
 import random
 import re
 
 from lightbulb import commands
-from typing import Any, Optional, Union
-
-from utils.atlas import Atlas, Map
+from typing import Any, Coroutine, Optional, Union
+
+from utils.atlas import MOVEMENT_MODES, RENAME_MOVEMENT, SWAP_MOVEMENT, Atlas, Map
+from utils.bounded_cache import BoundedCache
+from utils.guild_cache import GuildCaches, GuildChannelIndex, MapOccupancy, MirrorRoute, get_channel_member_overwrite
+from utils.instrumentation import instrumentation
+from utils.line_buffer import LineBuffer
+from utils.mirrored_messages import MirroredMessages
+from utils.ordered_work import OrderedWorkQueues
 from utils.settings_manager import ServerSettings, SettingsManager
-from utils.consts import ADMIN_DENIES, ADMIN_PERMISSIONS, READ_DENIES, READ_PERMISSIONS, WRITE_DENIES, WRITE_PERMISSIONS
+from utils.permission_templates import PermissionTemplates
+from utils.player_channels import PlayerChannels, ServerPlayerChannels
+from utils.rest_dispatch import Priority, RestDispatcher
 from utils.type_enforcer import TypeEnforcer
+from utils.webhook_pool import POOL_STRATEGIES, WebhookPool
 
 WEBHOOK_NAME = "Expedition"
 
@@ -19,6 +30,10 @@ plugin = lightbulb.Plugin("MapPlugin")
 
 atlas = Atlas()
 settings_manager = SettingsManager()
+permission_templates = PermissionTemplates(settings_manager)
+guild_caches = GuildCaches()
+player_channels = PlayerChannels()
+player_work_queues = OrderedWorkQueues()
 
 guildEnforcer = TypeEnforcer[hikari.Guild]()
 guildChannelEnforcer = TypeEnforcer[hikari.GuildChannel]()
@@ -32,10 +47,75 @@ emote_pattern = r'^<(a?):.*:(\d+)>$'
 link_pattern = r'\[([^\]]+)\]\(([^\)]+)\)'
 
 MAX_DISPLAY_NAME_LENGTH = 80
+STATE_READY_TIMEOUT_SECONDS = 3
+WARMUP_CONCURRENCY = 4
+NAME_CACHE_SIZE = 4096
+ANNOUNCE_WINDOW_SECONDS = 1
+FAN_OUT_CONCURRENCY = 8
+FLINT_LOG_FLUSH_SECONDS = 10
+FLINT_LOG_MAX_CHARS = 1800
+# discord allows two renames per channel every ten minutes
+RENAME_MIN_COOLDOWN_MINUTES = 5
+CHAT_CATEGORY_CAPACITY = 45
+MAX_CHAT_CATEGORIES = 10
+# discord caps a guild at 500 channels, past this budget players get private threads instead of channels
+GUILD_CHANNEL_BUDGET = 475
+THREAD_PARENT_CAPACITY = 50
+THREAD_AUTO_ARCHIVE_DURATION = datetime.timedelta(days=7)
+# discord allows 15 webhooks per channel, leave room for other bots
+MAX_WEBHOOK_POOL_SIZE = 10
+REST_MAX_IN_FLIGHT = 32
+REST_MAX_IN_FLIGHT_PER_GUILD = 16
+LOW_PRIORITY_MAX_DELAY_SECONDS = 30
+ANNOUNCE_MAX_WINDOW_SECONDS = 5
+# a resumed gateway replays events from the last few minutes at most
+MIRROR_DEDUP_WINDOW_SECONDS = 15 * 60
+MIRROR_DEDUP_MAX_ENTRIES = 50000
+MIRRORED_MESSAGE_RETENTION_SECONDS = 7 * 24 * 60 * 60
+MIRRORED_MESSAGE_FLUSH_SECONDS = 1
+SPECTATOR_DIGEST_MAX_LINES = 25
+# a full digest plus its longest possible line still fits in discord's 2000 character limit
+SPECTATOR_DIGEST_MAX_CHARS = 1400
+SPECTATOR_DIGEST_LINE_CHARS = 500
+SPECTATOR_DIGEST_CONTENT_CHARS = 300
+MAX_SPECTATOR_DIGEST_SECONDS = 600
+REPLY_HEADER_PREFIX = "*In Reply to"
+
+states_ready = asyncio.Event()
+warmup_semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+background_tasks: set[asyncio.Task[Any]] = set()
+backfilled_guild_ids: set[int] = set()
+backfill_locks: dict[int, asyncio.Lock] = {}
+sanitized_name_cache: BoundedCache[int, tuple[str, str]] = BoundedCache(NAME_CACHE_SIZE)
+channel_name_cache: BoundedCache[str, tuple[str, Optional[str]]] = BoundedCache(NAME_CACHE_SIZE)
+fan_out_semaphore = asyncio.Semaphore(FAN_OUT_CONCURRENCY)
+rest_dispatch = RestDispatcher(REST_MAX_IN_FLIGHT, REST_MAX_IN_FLIGHT_PER_GUILD, LOW_PRIORITY_MAX_DELAY_SECONDS)
+mirrored_messages = MirroredMessages(MIRROR_DEDUP_WINDOW_SECONDS, MIRROR_DEDUP_MAX_ENTRIES, MIRRORED_MESSAGE_RETENTION_SECONDS, MIRRORED_MESSAGE_FLUSH_SECONDS)
+pending_entry_announcements: dict[tuple[int, str, str], list[tuple[int, int, str]]] = {}
+entry_move_ids = itertools.count()
+flint_log_buffers: dict[int, LineBuffer] = {}
+spectator_digest_buffers: dict[tuple[int, str, str], LineBuffer] = {}
+channel_creation_locks: dict[tuple[int, str], asyncio.Lock] = {}
+webhook_pool_locks: dict[int, asyncio.Lock] = {}
+# keyed by (guild id, player id, map name)
+pending_location_roles: dict[tuple[int, int, str], str] = {}
+applied_location_roles: dict[tuple[int, int, str], int] = {}
 
 def flatten_list_of_lists(lists):
     return [item for sublist in lists for item in sublist]
 
+async def send_to_channel(channel: hikari.TextableGuildChannel, content: str, *, span_name: str = "rest.send", priority: Priority = Priority.NOTICE, **kwargs: Any) -> hikari.Message:
+    async def send() -> hikari.Message:
+        with instrumentation.span(span_name):
+            return await channel.send(content, **kwargs)
+    return await rest_dispatch.run(channel.guild_id, priority, send)
+
+def run_in_background(coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task[Any]:
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 def is_admin(ctx: lightbulb.SlashContext) -> bool:
     return not ((isinstance(ctx.interaction.member, hikari.InteractionMember) and ((~ctx.interaction.member.permissions and hikari.Permissions.MANAGE_GUILD) is not hikari.Permissions.NONE)))
 
@@ -48,46 +128,106 @@ async def get_role_with_name(guild:hikari.Guild, role_name: str, should_fetch: b
             return role
     return None
 
-async def get_everyone_role(guild: hikari.Guild) -> hikari.Role:
-    optional_role = await get_role_with_name(guild, "@everyone")
-    if optional_role is None:
-        raise ValueError("Guild somehow doesn't have an @everyone role")
-    role: hikari.Role = optional_role
-    return role
-
-async def get_private_perms(guild: hikari.Guild) -> hikari.PermissionOverwrite:
-    everyone_role = await get_everyone_role(guild)
-    return hikari.PermissionOverwrite(
-        id=everyone_role.id,
-        type=hikari.channels.PermissionOverwriteType.ROLE, # pyright: ignore[reportAttributeAccessIssue]
-        deny=(hikari.Permissions.VIEW_CHANNEL)
-    )
-
 async def ensure_category_exists(guild: hikari.Guild, channel_name: str) -> hikari.GuildChannel:
     for channel_id, channel in guild.get_channels().items():
         if channel.name == channel_name and (channel.type == hikari.channels.ChannelType.GUILD_CATEGORY): # pyright: ignore[reportAttributeAccessIssue]
             return channel
-    private_perms = await get_private_perms(guild)
-    return await guild.create_category(channel_name, permission_overwrites = [private_perms])
+    return await guild.create_category(channel_name, permission_overwrites=permission_templates.get(guild.id).category_overwrites())
+
+async def ensure_guild_state(guild: hikari.Guild) -> None:
+    if atlas.is_loaded(guild.id) and settings_manager.is_loaded(guild.id) and player_channels.is_loaded(guild.id) and guild.id in backfilled_guild_ids:
+        return
+    if not states_ready.is_set():
+        try:
+            await asyncio.wait_for(states_ready.wait(), STATE_READY_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    await asyncio.gather(atlas.ensure_server_loaded(guild.id), settings_manager.ensure_server_loaded(guild.id), player_channels.ensure_server_loaded(guild.id))
+    # old channels are claimed before anything reads the guild's player channels
+    async with backfill_locks.setdefault(guild.id, asyncio.Lock()):
+        if guild.id not in backfilled_guild_ids:
+            await backfill_player_channels(guild, get_channel_index(guild))
+            backfilled_guild_ids.add(guild.id)
+    backfill_locks.pop(guild.id, None)
 
 async def get_guild(ctx: lightbulb.SlashContext) -> hikari.Guild:
-    return await guildEnforcer.ensure_type(ctx.get_guild(), ctx, "For some reason the bot could not tell which server the command came from")
+    guild = await guildEnforcer.ensure_type(ctx.get_guild(), ctx, "For some reason the bot could not tell which server the command came from")
+    await ensure_guild_state(guild)
+    return guild
 
 async def get_map(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_name: str) -> Map:
     return await mapEnforcer.ensure_type(atlas.get_map(guild.id, map_name), ctx, f"Could not find map under name {map_name}")
 
+def get_channel_index(guild: hikari.Guild) -> GuildChannelIndex:
+    return guild_caches.get(guild.id).channel_index(guild)
+
+def get_guild_channel(guild: hikari.Guild, channel_id: int) -> Optional[hikari.GuildChannel]:
+    # threads are cached apart from the guild's channels
+    channel = guild.get_channel(channel_id)
+    if channel is None and isinstance(guild.app, hikari.CacheAware):
+        thread = guild.app.cache.get_thread(channel_id)
+        return thread if thread is not None and thread.guild_id == guild.id else None
+    return channel
+
 def get_flint_log_channel(guild: hikari.Guild) -> Optional[hikari.TextableGuildChannel]:
-    for channel_id, channel in guild.get_channels().items():
-        if channel.name == "flint-log" and channel.type == hikari.ChannelType.GUILD_TEXT and isinstance(channel, hikari.TextableGuildChannel):
-            return channel
-    return None
+    flint_log_channel_id = get_channel_index(guild).flint_log_channel_id
+    channel = guild.get_channel(flint_log_channel_id) if flint_log_channel_id is not None else None
+    return channel if isinstance(channel, hikari.TextableGuildChannel) else None
+
+def get_flint_log_buffer(bot: hikari.GatewayBot, guild_id: int) -> LineBuffer:
+    flint_log_buffer = flint_log_buffers.get(guild_id)
+    if flint_log_buffer is None:
+        async def send_flint_log(content: str) -> None:
+            # looked up at flush time, the log channel may have been recreated since the lines were buffered
+            guild = bot.cache.get_guild(guild_id)
+            flint_log_channel = get_flint_log_channel(guild) if guild is not None else None
+            if flint_log_channel is not None:
+                await send_to_channel(flint_log_channel, content, span_name="rest.flint_log", priority=Priority.LOG)
+        flint_log_buffer = LineBuffer(send_flint_log, FLINT_LOG_FLUSH_SECONDS, FLINT_LOG_MAX_CHARS)
+        flint_log_buffers[guild_id] = flint_log_buffer
+    return flint_log_buffer
+
+def get_spectator_digest_buffer(bot: hikari.GatewayBot, guild_id: int, map_to_use: Map, location: str) -> LineBuffer:
+    key = (guild_id, map_to_use.name, location)
+    spectator_digest_buffer = spectator_digest_buffers.get(key)
+    if spectator_digest_buffer is None:
+        async def send_spectator_digest(content: str) -> None:
+            guild = bot.cache.get_guild(guild_id)
+            spectator_channel = find_spectator_channel(guild, map_to_use, location) if guild is not None else None
+            if spectator_channel is not None:
+                await send_to_channel(spectator_channel, content, span_name="rest.spectator_digest", priority=Priority.MIRROR, user_mentions=False, role_mentions=False, mentions_everyone=False)
+        spectator_digest_buffer = LineBuffer(send_spectator_digest, map_to_use.spectator_digest_seconds, SPECTATOR_DIGEST_MAX_CHARS, SPECTATOR_DIGEST_MAX_LINES)
+        spectator_digest_buffers[key] = spectator_digest_buffer
+    return spectator_digest_buffer
+
+async def drop_spectator_digest_buffers(guild_id: int, map_name: str) -> None:
+    # buffers keep the interval they were made with, so they are flushed and rebuilt when it changes
+    keys = [key for key in spectator_digest_buffers if key[0] == guild_id and key[1] == map_name]
+    await asyncio.gather(*(spectator_digest_buffers.pop(key).flush() for key in keys))
+
+def format_spectator_digest_line(guild: hikari.Guild, display_name: str, message: hikari.Message) -> str:
+    content = " ".join((message.content or "").split())
+    if len(content) > SPECTATOR_DIGEST_CONTENT_CHARS:
+        content = content[:SPECTATOR_DIGEST_CONTENT_CHARS - 3] + "..."
+    links = [f"<{attachment.url}>" for attachment in message.attachments]
+    if message.stickers:
+        links.append(f"<https://media.discordapp.net/stickers/{message.stickers[0].id}.png?size=160>")
+    prefix = f"**{display_name}**: "
+    # the jump link lets admins open the original, spectators only see the summary
+    jump_link = f" [↗](<{message.make_link(guild)}>)"
+    room = SPECTATOR_DIGEST_LINE_CHARS - len(prefix) - len(jump_link)
+    body = content[:room]
+    # links that would push the line over its cap are left to the jump link
+    for link in links:
+        if len(body) + len(link) + 1 <= room:
+            body = f"{body} {link}".strip()
+    return f"{prefix}{body}{jump_link}"
 
 async def log_action_to_flint(ctx: lightbulb.SlashContext, action: str, player: hikari.User, channel: hikari.GuildChannel):
     guild = await get_guild(ctx)
-    flint_log_channel = get_flint_log_channel(guild)
-    if flint_log_channel is None:
+    if get_flint_log_channel(guild) is None:
         return
-    await flint_log_channel.send(f"{player.mention} {action} {channel.mention}")
+    get_flint_log_buffer(ctx.bot, guild.id).append(f"{player.mention} {action} {channel.mention}")
 
 def get_channels_in_category(guild: hikari.Guild, category: hikari.GuildChannel) -> list[hikari.GuildChannel]:
     channels = []
@@ -103,68 +243,99 @@ def get_channels_in_categories(guild: hikari.Guild, category_ids: list[int]) ->
             channels.append(channel)
     return channels
 
-async def get_category_for_chats(guild: hikari.Guild, map_name: str, channel_count: int) -> hikari.GuildChannel:
-    i = 0
-    for i in range(10):
+async def get_category_for_chats(guild: hikari.Guild, map_name: str, channel_count: int) -> Optional[hikari.GuildChannel]:
+    if len(guild.get_channels()) + channel_count > GUILD_CHANNEL_BUDGET:
+        return None
+    for i in range(MAX_CHAT_CATEGORIES):
         category = await ensure_category_exists(guild, f"{map_name}-channels-{i}")
         channel_count_in_category = len(get_channels_in_category(guild, category))
-        if channel_count_in_category + channel_count <= 45:
+        if channel_count_in_category + channel_count <= CHAT_CATEGORY_CAPACITY:
             return category
-    raise ValueError("Somehow hit i=10 for getting category for chats o.o")
+    return None
+
+def count_member_overwrites(channel: hikari.GuildChannel) -> int:
+    return sum(1 for overwrite in channel.permission_overwrites.values() if overwrite.type == hikari.PermissionOverwriteType.MEMBER) if isinstance(channel, hikari.PermissibleGuildChannel) else 0
+
+async def ensure_thread_parent(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_of_location: Map, player: hikari.Member) -> hikari.GuildTextChannel:
+    # a player's threads share one parent channel, which they need to see for the threads to show up
+    templates = permission_templates.get(guild.id)
+    parents = [
+        parent
+        for parent_id in get_channel_index(guild).thread_parent_ids.get(map_of_location.name, [])
+        if isinstance(parent := guild.get_channel(parent_id), hikari.GuildTextChannel)
+    ]
+    for parent in parents:
+        if player.id in parent.permission_overwrites:
+            return parent
+    nullable_parent = next((parent for parent in parents if count_member_overwrites(parent) < THREAD_PARENT_CAPACITY), None)
+    if nullable_parent is None:
+        category = await ensure_category_exists(guild, f"{map_of_location.name}-threads")
+        parent = await guild.create_text_channel(f"{map_of_location.name}-threads-{len(parents)}", permission_overwrites=templates.thread_parent_overwrites(), category=category.id)
+        await ensure_webhook_on_channel(ctx, parent)
+    else:
+        parent = nullable_parent
+    overwrite = templates.player_thread_parent(player.id)
+    await ctx.bot.rest.edit_permission_overwrite(parent, overwrite, allow=overwrite.allow, deny=overwrite.deny)
+    return parent
+
+async def create_location_thread(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, map_of_location: Map, channel_name: str) -> hikari.GuildThreadChannel:
+    parent = await ensure_thread_parent(ctx, guild, map_of_location, player)
+    thread = await ctx.bot.rest.create_thread(parent, hikari.ChannelType.GUILD_PRIVATE_THREAD, channel_name, auto_archive_duration=THREAD_AUTO_ARCHIVE_DURATION, invitable=False)
+    await ctx.bot.rest.add_thread_member(thread, player)
+    return thread
+
+async def find_uncached_location_thread(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, map_of_location: Map, location: str) -> Optional[hikari.GuildThreadChannel]:
+    # archived threads drop out of the cache on reconnect, but stay recorded against their player
+    for channel_id in get_player_channels(guild).get_channels(player.id, map_of_location.name):
+        if get_guild_channel(guild, channel_id) is not None:
+            continue
+        try:
+            with instrumentation.span("rest.fetch"):
+                channel = await ctx.bot.rest.fetch_channel(channel_id)
+        except hikari.NotFoundError:
+            await player_channels.remove_channel(guild.id, channel_id)
+            continue
+        if isinstance(channel, hikari.GuildThreadChannel) and get_location_channels_location(channel) == location.lower():
+            return channel
+    return None
 
 def get_sanitized_player_name(player: hikari.Member) -> str:
-    return ''.join((filter(lambda c: c.isalnum() ,player.display_name))).lower()
+    cached_name = sanitized_name_cache.get(player.id)
+    if cached_name is not None and cached_name[0] == player.display_name:
+        return cached_name[1]
+    sanitized_name = ''.join((filter(lambda c: c.isalnum() ,player.display_name))).lower()
+    sanitized_name_cache.put(player.id, (player.display_name, sanitized_name))
+    return sanitized_name
     
 def get_player_location_name(player:hikari.Member, location: str) -> str:
     return f"{get_sanitized_player_name(player)}-{location.lower()}"
 
-async def ensure_location_channel(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, category: hikari.GuildChannel, map_of_location: Map, location: str, player_in: bool) -> hikari.GuildChannel:
-    channel_name = get_player_location_name(player, location)
-    for channel in get_channels_in_category(guild, category):
-        if channel.name == channel_name:
+async def ensure_location_channel(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, map_of_location: Map, location: str, player_in: bool) -> hikari.GuildChannel:
+    nullable_channel = get_player_location_channel_in_map(guild, player, map_of_location, location)
+    if nullable_channel is not None:
+        return nullable_channel
+    async with channel_creation_locks.setdefault((guild.id, map_of_location.name), asyncio.Lock()):
+        nullable_thread = await find_uncached_location_thread(ctx, guild, player, map_of_location, location)
+        if nullable_thread is not None:
+            return nullable_thread
+        channel_name = get_player_location_name(player, location)
+        nullable_category = await get_category_for_chats(guild, map_of_location.name, 1)
+        if nullable_category is None:
+            channel: hikari.GuildChannel = await create_location_thread(ctx, guild, player, map_of_location, channel_name)
+            await player_channels.add_channel(guild.id, channel.id, map_of_location.name, player.id)
             return channel
-    private_perms = await get_private_perms(guild)
-    user_perms = hikari.PermissionOverwrite(
-        id=player.id,
-        type=hikari.PermissionOverwriteType.MEMBER,
-        allow=WRITE_PERMISSIONS if player_in else READ_PERMISSIONS,
-        deny=WRITE_DENIES if player_in else READ_DENIES
-    )
-    perms = [private_perms, user_perms]
-    server_settings = settings_manager.get_settings(guild.id)
-    if server_settings.admin_role_id is not None:
-        perms.append(hikari.PermissionOverwrite(
-            id=server_settings.admin_role_id,
-            type=hikari.PermissionOverwriteType.ROLE,
-            allow=ADMIN_PERMISSIONS,
-            deny=ADMIN_DENIES
-        ))
-    channel = await guild.create_text_channel(channel_name, permission_overwrites=perms, category=category.id)
-    await ensure_webhook_on_channel(ctx, channel)
-    return channel
+        perms = permission_templates.get(guild.id).location_channel_overwrites(player.id, player_in)
+        channel = await guild.create_text_channel(channel_name, permission_overwrites=perms, category=nullable_category.id)
+        await player_channels.add_channel(guild.id, channel.id, map_of_location.name, player.id)
+        await ensure_webhook_on_channel(ctx, channel)
+        return channel
 
 async def ensure_spectator_locations_channel(ctx: lightbulb.SlashContext, guild: hikari.Guild, category: hikari.GuildChannel, created_map: Map) -> hikari.GuildChannel:
     channel_name = f"{created_map.name.lower()}-locations"
     for channel in get_channels_in_category(guild, category):
         if channel.name == channel_name:
             return channel
-    private_perms = await get_private_perms(guild)
-    perms = [private_perms]
-    server_settings = settings_manager.get_settings(guild.id)
-    if server_settings.admin_role_id is not None:
-        perms.append(hikari.PermissionOverwrite(
-            id=server_settings.admin_role_id,
-            type=hikari.PermissionOverwriteType.ROLE,
-            allow=ADMIN_PERMISSIONS,
-            deny=ADMIN_DENIES
-        ))
-    if server_settings.spectator_role_id is not None:
-        perms.append(hikari.PermissionOverwrite(
-            id=server_settings.spectator_role_id,
-            type=hikari.PermissionOverwriteType.ROLE,
-            allow=READ_PERMISSIONS,
-            deny=READ_DENIES
-        ))
+    perms = permission_templates.get(guild.id).spectator_channel_overwrites()
     channel = await guild.create_text_channel(channel_name, permission_overwrites=perms, category=category.id)
     await ensure_webhook_on_channel(ctx, channel)
     return channel
@@ -174,52 +345,40 @@ async def ensure_spectator_channel(ctx: lightbulb.SlashContext, guild: hikari.Gu
     for channel in get_channels_in_category(guild, category):
         if channel.name == channel_name:
             return channel
-    private_perms = await get_private_perms(guild)
-    perms = [private_perms]
-    server_settings = settings_manager.get_settings(guild.id)
-    if server_settings.admin_role_id is not None:
-        perms.append(hikari.PermissionOverwrite(
-            id=server_settings.admin_role_id,
-            type=hikari.PermissionOverwriteType.ROLE,
-            allow=ADMIN_PERMISSIONS,
-            deny=ADMIN_DENIES
-        ))
-    if server_settings.spectator_role_id is not None:
-        perms.append(hikari.PermissionOverwrite(
-            id=server_settings.spectator_role_id,
-            type=hikari.PermissionOverwriteType.ROLE,
-            allow=READ_PERMISSIONS,
-            deny=READ_DENIES
-        ))
+    perms = permission_templates.get(guild.id).spectator_channel_overwrites()
     channel = await guild.create_text_channel(channel_name, permission_overwrites=perms, category=category.id)
     await ensure_webhook_on_channel(ctx, channel)
     return channel
 
 def find_locations_channel(guild: hikari.Guild, map_to_use: Map) -> Optional[hikari.TextableGuildChannel]:
-    for channel_id, channel in guild.get_channels().items():
-        if channel.name == f"{map_to_use.name.lower()}-locations" and isinstance(channel, hikari.TextableGuildChannel):
-            return channel
-    return None
+    locations_channel_id = get_channel_index(guild).locations_channel_ids.get(map_to_use.name.lower())
+    channel = guild.get_channel(locations_channel_id) if locations_channel_id is not None else None
+    return channel if isinstance(channel, hikari.TextableGuildChannel) else None
 
 def separate_link_markdown(s: str) -> Optional[tuple[str, str]]:
     match = re.match(link_pattern, s)
     return (match.group(1), match.group(2)) if match else None
 
-cached_locations_channel_message_arrays: dict[str, list[hikari.Message]] = {}
+cached_locations_channel_message_arrays: dict[tuple[int, str], list[hikari.Message]] = {}
 async def get_locations_channel_message_array(locations_channel: hikari.TextableGuildChannel, map_to_use: Map) -> list[hikari.Message]:
-    if map_to_use.name in cached_locations_channel_message_arrays:
-        return cached_locations_channel_message_arrays[map_to_use.name]
+    if (locations_channel.guild_id, map_to_use.name) in cached_locations_channel_message_arrays:
+        instrumentation.record_cache_lookup("ledger", True)
+        return cached_locations_channel_message_arrays[(locations_channel.guild_id, map_to_use.name)]
+    instrumentation.record_cache_lookup("ledger", False)
     locations_channel_message_array = []
-    async for message in locations_channel.fetch_history():
-        locations_channel_message_array.append(message)
+    with instrumentation.span("rest.fetch"):
+        async for message in locations_channel.fetch_history():
+            locations_channel_message_array.append(message)
 
     locations_channel_message_array = locations_channel_message_array[::-1]
+    cache_locations_channel_message_array(locations_channel.guild_id, map_to_use.name, locations_channel_message_array)
     return locations_channel_message_array
     
-def cache_locations_channel_message_array(map_name: str, message_array: list[hikari.Message]) -> None:
-    cached_locations_channel_message_arrays[map_name] = message_array
+def cache_locations_channel_message_array(guild_id: int, map_name: str, message_array: list[hikari.Message]) -> None:
+    cached_locations_channel_message_arrays[(guild_id, map_name)] = message_array
 
 locations_message_cond = asyncio.Condition()
+@instrumentation.timed("locations_message")
 async def locations_message(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, players_changed: list[hikari.Member], change_message: Optional[hikari.Message], new_location: Optional[str]) -> None:
     locations_channel = find_locations_channel(guild, map_to_use)
     if not locations_channel:
@@ -231,7 +390,8 @@ async def locations_message(ctx: lightbulb.SlashContext, guild: hikari.Guild, ma
         locations_channel_message_str = "\n".join(list(map(lambda m: m.content if m.content is not None else "", locations_channel_message_array)))
         if not locations_channel_message_str and new_location is not None:
             players_list = ", ".join(list(map(lambda player_changed: f"[{get_sanitized_player_name(player_changed).capitalize()}]({change_message.make_link(guild) if change_message else 'https://example.com'})", players_changed)))
-            await locations_channel.send(f"{new_location.capitalize()}: {players_list}\n")
+            ledger_message = await send_to_channel(locations_channel, f"{new_location.capitalize()}: {players_list}\n", span_name="rest.ledger", priority=Priority.LEDGER)
+            cache_locations_channel_message_array(guild.id, map_to_use.name, [ledger_message])
             return
         
         new_message = ""
@@ -274,190 +434,454 @@ async def locations_message(ctx: lightbulb.SlashContext, guild: hikari.Guild, ma
         new_locations_channel_message_array = []
         for line in new_message.split('\n'):
             if len(current_message) + len(line) > 1800:
-                if current_message_index >= len(locations_channel_message_array):
-                    await locations_channel.send(current_message)
-                else:
-                    await locations_channel_message_array[current_message_index].edit(content=current_message)
+                new_locations_channel_message_array.append(await write_ledger_message(guild, map_to_use, locations_channel, locations_channel_message_array, current_message_index, current_message))
                 current_message = ""
                 current_message_index += 1
             current_message += "\n" + line
         if current_message:
-            if current_message_index >= len(locations_channel_message_array):
-                new_locations_channel_message_array.append(await locations_channel.send(current_message))
-            else:
-                new_locations_channel_message_array.append(await locations_channel_message_array[current_message_index].edit(content=current_message))
-        cache_locations_channel_message_array(map_to_use.name, new_locations_channel_message_array)
+            new_locations_channel_message_array.append(await write_ledger_message(guild, map_to_use, locations_channel, locations_channel_message_array, current_message_index, current_message))
+        cache_locations_channel_message_array(guild.id, map_to_use.name, new_locations_channel_message_array)
         current_message_index += 1
         while current_message_index < len(locations_channel_message_array):
-            await locations_channel_message_array[current_message_index].delete()
+            queue_ledger_edit(guild, map_to_use, locations_channel_message_array[current_message_index], None)
             current_message_index += 1
 
+async def write_ledger_message(guild: hikari.Guild, map_to_use: Map, locations_channel: hikari.TextableGuildChannel, locations_channel_message_array: list[hikari.Message], index: int, content: str) -> hikari.Message:
+    if index >= len(locations_channel_message_array):
+        return await send_to_channel(locations_channel, content, span_name="rest.ledger", priority=Priority.LEDGER)
+    # the cached copy is updated right away, the edit itself can wait behind player facing work
+    ledger_message = locations_channel_message_array[index]
+    ledger_message.content = content
+    queue_ledger_edit(guild, map_to_use, ledger_message, content)
+    return ledger_message
+
+def queue_ledger_edit(guild: hikari.Guild, map_to_use: Map, ledger_message: hikari.Message, content: Optional[str]) -> None:
+    # edits to a ledger message that has not been written yet are coalesced, only the latest content is sent
+    ledger_work = functools.partial(edit_ledger_message, guild.id, map_to_use.name, ledger_message, content)
+    run_in_background(rest_dispatch.run(guild.id, Priority.LEDGER, ledger_work, coalesce_key=("ledger", ledger_message.id)))
+
+async def edit_ledger_message(guild_id: int, map_name: str, ledger_message: hikari.Message, content: Optional[str]) -> None:
+    try:
+        with instrumentation.span("rest.ledger"):
+            if content is None:
+                await ledger_message.delete()
+            else:
+                await ledger_message.edit(content=content)
+                instrumentation.increment("ledger.edits")
+    except hikari.NotFoundError:
+        # someone removed the message, the next ledger update rebuilds from the channel history
+        cached_locations_channel_message_arrays.pop((guild_id, map_name), None)
+
 def get_all_location_channels_for_map(guild: hikari.Guild, map_name: str) -> list[hikari.GuildChannel]:
-    map_chat_category_ids: list[int] = []
-    for channel_id, channel in guild.get_channels().items():
-        if channel.name is not None and f"{map_name}-channels-" in channel.name and (channel.type == hikari.channels.ChannelType.GUILD_CATEGORY): # pyright: ignore[reportAttributeAccessIssue]
-            map_chat_category_ids.append(channel.id)
-    return get_channels_in_categories(guild, map_chat_category_ids)
+    location_channels = []
+    for channel_id in get_channel_index(guild).location_channel_ids.get(map_name, []):
+        channel = get_guild_channel(guild, channel_id)
+        if channel is not None:
+            location_channels.append(channel)
+    return location_channels
+
+def get_active_location_channels_for_map(guild: hikari.Guild, map_name: str) -> list[hikari.GuildChannel]:
+    return [channel for channel in get_all_location_channels_for_map(guild, map_name) if is_active_location_channel(guild, channel)]
+
+def get_player_channels(guild: hikari.Guild) -> ServerPlayerChannels:
+    return player_channels.get(guild.id)
 
 def get_player_location_channels(guild: hikari.Guild, player: hikari.Member, map_name: str) -> list[hikari.GuildChannel]:
-    map_chat_category_ids: list[int] = []
-    for channel_id, channel in guild.get_channels().items():
-        if channel.name is not None and f"{map_name}-channels-" in channel.name and (channel.type == hikari.channels.ChannelType.GUILD_CATEGORY):  # pyright: ignore[reportAttributeAccessIssue]
-            map_chat_category_ids.append(channel.id)
     player_location_channels = []
-    for channel in get_channels_in_categories(guild, map_chat_category_ids):
-        if channel.name is not None and f"{get_sanitized_player_name(player)}-" in channel.name:
+    for channel_id in get_player_channels(guild).get_channels(player.id, map_name):
+        channel = get_guild_channel(guild, channel_id)
+        if channel is not None:
             player_location_channels.append(channel)
     return player_location_channels
 
 def get_maps_player_is_in(guild: hikari.Guild, player: hikari.Member) -> list[Map]:
-    server_maps = atlas.get_maps_in_server(guild.id)
     maps_player_is_in = []
-    for server_map in server_maps:
-        if get_player_location_channels(guild, player, server_map.name):
-            maps_player_is_in.append(server_map)
+    for map_name in get_player_channels(guild).get_maps(player.id):
+        nullable_map = atlas.get_map(guild.id, map_name)
+        if nullable_map is not None:
+            maps_player_is_in.append(nullable_map)
     return maps_player_is_in
 
 def get_category_of_channel(guild: hikari.Guild, channel_id: int) -> Optional[hikari.GuildChannel]:
-    nullable_channel = guild.get_channel(channel_id)
+    nullable_channel = get_guild_channel(guild, channel_id)
+    if isinstance(nullable_channel, hikari.GuildThreadChannel):
+        # a location thread's parent channel sits in the map's thread category
+        nullable_channel = guild.get_channel(nullable_channel.parent_id)
     if nullable_channel is None:
         return None
     channel: hikari.GuildChannel = nullable_channel
     return guild.get_channel(channel.parent_id) if channel.parent_id is not None else None
 
+def parse_channel_name(channel_name: str) -> tuple[str, Optional[str]]:
+    parsed_name = channel_name_cache.get(channel_name)
+    if parsed_name is None:
+        split_name = channel_name.split("-", 1)
+        parsed_name = (split_name[0], split_name[1] if len(split_name) > 1 else None)
+        channel_name_cache.put(channel_name, parsed_name)
+    return parsed_name
+
 def get_map_name_from_category(category_name: str) -> Optional[str]:
-    split_name = category_name.split("-")
-    return split_name[0] if len(split_name) > 1 else None
+    prefix, rest = parse_channel_name(category_name)
+    return prefix if rest is not None else None
+
+def player_can_write_in_channel(channel: hikari.GuildChannel, player_id: int) -> bool:
+    if isinstance(channel, hikari.GuildThreadChannel):
+        # a thread only ever belongs to one player, it is locked once they move out of it
+        return not channel.is_locked
+    return player_id in channel.permission_overwrites and hikari.Permissions.SEND_MESSAGES in channel.permission_overwrites[player_id].allow
+
+def is_active_location_channel(guild: hikari.Guild, channel: hikari.GuildChannel) -> bool:
+    # channels a player has moved out of in a swap map stay behind read-only
+    nullable_player_channel = get_player_channels(guild).get_player(channel.id)
+    return nullable_player_channel is None or player_can_write_in_channel(channel, nullable_player_channel[1])
 
 def get_active_channel_for_player_in_map(guild: hikari.Guild, player: hikari.Member, map_to_use: Map) -> Optional[hikari.TextableGuildChannel]:
-    player_location_channels = get_player_location_channels(guild, player, map_to_use.name)
-    for player_location_channel in player_location_channels:
-        if player.id in player_location_channel.permission_overwrites and player_location_channel.permission_overwrites[player.id].allow.SEND_MESSAGES and isinstance(player_location_channel, hikari.TextableGuildChannel):
+    for player_location_channel in get_player_location_channels(guild, player, map_to_use.name):
+        if player_can_write_in_channel(player_location_channel, player.id) and isinstance(player_location_channel, hikari.TextableGuildChannel):
             return player_location_channel
     return None
 
+def get_map_occupancy(guild: hikari.Guild, map_to_use: Map) -> MapOccupancy:
+    guild_cache = guild_caches.get(guild.id)
+    occupancy = guild_cache.get_occupancy(map_to_use.name)
+    if occupancy is None:
+        occupancy = MapOccupancy()
+        server_player_channels = get_player_channels(guild)
+        for channel in get_all_location_channels_for_map(guild, map_to_use.name):
+            nullable_player_channel = server_player_channels.get_player(channel.id)
+            location = get_location_channels_location(channel)
+            if nullable_player_channel is None or location is None or not player_can_write_in_channel(channel, nullable_player_channel[1]):
+                continue
+            occupancy.place(nullable_player_channel[1], channel.id, location)
+        guild_cache.set_occupancy(map_to_use.name, occupancy)
+    return occupancy
+
+def sync_occupancy_with_channel(guild_id: int, channel_id: int, nullable_channel: Optional[hikari.GuildChannel]) -> None:
+    nullable_player_channel = player_channels.get(guild_id).get_player(channel_id)
+    if nullable_player_channel is None:
+        return
+    map_name, player_id = nullable_player_channel
+    occupancy = guild_caches.get(guild_id).get_occupancy(map_name)
+    # while a move is still renaming, the occupancy is ahead of discord and the event is stale
+    if occupancy is None or (nullable_channel is not None and player_work_queues.is_busy((guild_id, player_id))):
+        return
+    location = get_location_channels_location(nullable_channel) if nullable_channel is not None else None
+    if nullable_channel is not None and location is not None and player_can_write_in_channel(nullable_channel, player_id):
+        occupancy.place(player_id, channel_id, location)
+    elif occupancy.channel_of(player_id) == channel_id:
+        occupancy.remove(player_id)
+
+async def send_to_channel_limited(channel: hikari.TextableGuildChannel, content: str) -> hikari.Message:
+    async with fan_out_semaphore:
+        return await send_to_channel(channel, content, span_name="rest.announce")
+
+async def send_to_location(guild: hikari.Guild, map_to_use: Map, location: str, content: str, exclude_player_ids: set[int]) -> None:
+    sends = []
+    for player_id, channel_id in get_map_occupancy(guild, map_to_use).occupants(location).items():
+        channel = get_guild_channel(guild, channel_id)
+        if player_id in exclude_player_ids or not isinstance(channel, hikari.TextableGuildChannel):
+            continue
+        sends.append(send_to_channel_limited(channel, content))
+    await asyncio.gather(*sends, return_exceptions=True)
+
+def broadcast_to_location(guild: hikari.Guild, map_to_use: Map, location: str, content: str, exclude_player_ids: set[int]) -> asyncio.Task[Any]:
+    return run_in_background(send_to_location(guild, map_to_use, location, content, exclude_player_ids))
+
+def queue_entry_announcement(guild: hikari.Guild, map_to_use: Map, location: str, players: list[hikari.Member]) -> None:
+    # moves landing in the same location within the window are announced together
+    key = (guild.id, map_to_use.name, location)
+    # players who moved together share a move id, so they are not told about each other
+    move_id = next(entry_move_ids)
+    entries = [(move_id, player.id, player.display_name) for player in players]
+    pending_entries = pending_entry_announcements.get(key)
+    if pending_entries is not None:
+        pending_entries.extend(entries)
+        return
+    pending_entry_announcements[key] = entries
+    run_in_background(flush_entry_announcements(guild, map_to_use, location))
+
+async def flush_entry_announcements(guild: hikari.Guild, map_to_use: Map, location: str) -> None:
+    await asyncio.sleep(ANNOUNCE_WINDOW_SECONDS)
+    # during a rush of moves the window stretches, so more entries share one announcement
+    waited = ANNOUNCE_WINDOW_SECONDS
+    while rest_dispatch.queued(Priority.MOVE) and waited < ANNOUNCE_MAX_WINDOW_SECONDS:
+        await asyncio.sleep(ANNOUNCE_WINDOW_SECONDS)
+        waited += ANNOUNCE_WINDOW_SECONDS
+    entries = pending_entry_announcements.pop((guild.id, map_to_use.name, location), [])
+    entered_player_ids = [player_id for _, player_id, _ in entries]
+    sends = []
+    for player_id, channel_id in get_map_occupancy(guild, map_to_use).occupants(location).items():
+        # players only hear about whoever entered after they did, and not about who came in with them
+        if player_id in entered_player_ids:
+            last_entry_index = len(entered_player_ids) - 1 - entered_player_ids[::-1].index(player_id)
+            own_move_id = entries[last_entry_index][0]
+            later_entries = [entry for entry in entries[last_entry_index + 1:] if entry[0] != own_move_id]
+        else:
+            later_entries = entries
+        entered_names = list(dict.fromkeys(name for _, entered_player_id, name in later_entries if entered_player_id != player_id))
+        channel = get_guild_channel(guild, channel_id)
+        if not entered_names or not isinstance(channel, hikari.TextableGuildChannel):
+            continue
+        sends.append(send_to_channel_limited(channel, f"{', '.join(entered_names)} {'have' if len(entered_names) > 1 else 'has'} entered {location}"))
+    await asyncio.gather(*sends, return_exceptions=True)
+
 def get_player_location_channel_in_map(guild: hikari.Guild, player: hikari.Member, map_to_use: Map, location: str) -> Optional[hikari.TextableGuildChannel]:
     player_location_channels = get_player_location_channels(guild, player, map_to_use.name)
-    location_channel_name = get_player_location_name(player, location)
     filtered_player_location_channels = [
         player_location_channel
         for player_location_channel in player_location_channels
-        if player_location_channel.name == location_channel_name and isinstance(player_location_channel, hikari.TextableGuildChannel)
+        if get_location_channels_location(player_location_channel) == location.lower() and isinstance(player_location_channel, hikari.TextableGuildChannel)
     ]
     return filtered_player_location_channels[0] if filtered_player_location_channels else None
 
 async def get_players_in_map_with_role(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, role: hikari.Role) -> list[hikari.Member]:
     players_with_role_in_map = []
-    all_location_channels = get_all_location_channels_for_map(guild, map_to_use.name)
+    all_location_channels = get_active_location_channels_for_map(guild, map_to_use.name)
     for location_channel in all_location_channels:
         player = await get_player_from_location(ctx.bot, guild, location_channel)
         if player is not None and role.id in player.role_ids:
             players_with_role_in_map.append(player)
     return players_with_role_in_map
 
-async def get_player_to_location_channel_map_for_players(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, players: list[hikari.Member]) -> dict[hikari.Member, hikari.GuildTextChannel]:
-    player_to_location_channel_map = {}
-    all_location_channels = get_all_location_channels_for_map(guild, map_to_use.name)
-    player_ids = list(map(lambda p: p.id, players))
-    for location_channel in all_location_channels:
-        player = await get_player_from_location(ctx.bot, guild, location_channel)
-        if player is not None and player.id in player_ids:
-            player_to_location_channel_map[player] = location_channel
-    return player_to_location_channel_map
-
 async def make_channel_readable_for_player(channel: hikari.GuildChannel, player: hikari.Member):
-    permissions = hikari.PermissionOverwrite(
-        id=player.id,
-        type=hikari.PermissionOverwriteType.MEMBER,
-        allow=READ_PERMISSIONS,
-        deny=READ_DENIES
-    )
-    return await channel.edit(permission_overwrites=[permissions])
+    if isinstance(channel, hikari.GuildThreadChannel):
+        # archiving frees the thread's slot in the guild's active thread limit, locking keeps the player from reopening it
+        return await rest_dispatch.run(channel.guild_id, Priority.MOVE, functools.partial(channel.edit, locked=True, archived=True))
+    permissions = permission_templates.get(channel.guild_id).location_channel_overwrites(player.id, False)
+    return await rest_dispatch.run(channel.guild_id, Priority.MOVE, functools.partial(channel.edit, permission_overwrites=permissions))
 
 async def make_channel_writeable_for_player(channel: hikari.GuildChannel, player: hikari.Member):
-    permissions = hikari.PermissionOverwrite(
-        id=player.id,
-        type=hikari.PermissionOverwriteType.MEMBER,
-        allow=WRITE_PERMISSIONS,
-        deny=WRITE_DENIES
-    )
-    return await channel.edit(permission_overwrites=[permissions])
+    if isinstance(channel, hikari.GuildThreadChannel):
+        return await rest_dispatch.run(channel.guild_id, Priority.MOVE, functools.partial(channel.edit, archived=False, locked=False))
+    permissions = permission_templates.get(channel.guild_id).location_channel_overwrites(player.id, True)
+    return await rest_dispatch.run(channel.guild_id, Priority.MOVE, functools.partial(channel.edit, permission_overwrites=permissions))
 
 def get_location_channels_location(channel: hikari.GuildChannel) -> Optional[str]:
     if channel.name is None:
         return None
-    split_channel = channel.name.split('-')
-    if len(split_channel) < 2:
+    return parse_channel_name(channel.name)[1]
+
+async def get_channel_webhooks(bot: hikari.GatewayBot, channel: hikari.GuildTextChannel) -> Optional[WebhookPool]:
+    guild_cache = guild_caches.get(channel.guild_id)
+    cached_webhooks = guild_cache.get_webhooks(channel.id)
+    instrumentation.record_cache_lookup("webhook", cached_webhooks is not None)
+    if cached_webhooks is not None:
+        return cached_webhooks
+    with instrumentation.span("rest.fetch"):
+        channel_webhooks = await bot.rest.fetch_channel_webhooks(channel)
+    webhooks = [webhook for webhook in channel_webhooks if webhook.name == WEBHOOK_NAME and isinstance(webhook, hikari.ExecutableWebhook)]
+    if not webhooks:
         return None
-    return "-".join(split_channel[1:])
-
-async def ensure_webhook_on_channel(ctx: lightbulb.SlashContext, channel: hikari.GuildChannel) -> hikari.PartialWebhook:
+    webhook_pool = WebhookPool(webhooks)
+    guild_cache.set_webhooks(channel.id, webhook_pool)
+    return webhook_pool
+
+async def ensure_webhook_pool(bot: hikari.GatewayBot, channel: hikari.GuildTextChannel) -> Optional[WebhookPool]:
+    # only channels that take traffic from many sources are grown past their first webhook
+    size = settings_manager.get_settings(channel.guild_id).webhook_pool_size
+    webhook_pool = await get_channel_webhooks(bot, channel)
+    if webhook_pool is None or len(webhook_pool) >= size or not webhook_pool.growable:
+        return webhook_pool
+    async with webhook_pool_locks.setdefault(channel.id, asyncio.Lock()):
+        while len(webhook_pool) < size and webhook_pool.growable:
+            try:
+                with instrumentation.span("rest.create_webhook"):
+                    webhook_pool.add(await bot.rest.create_webhook(channel, WEBHOOK_NAME))
+            except (hikari.BadRequestError, hikari.ForbiddenError):
+                webhook_pool.growable = False
+    return webhook_pool
+
+async def get_location_webhooks(bot: hikari.GatewayBot, guild: hikari.Guild, channel: hikari.GuildChannel) -> tuple[Optional[WebhookPool], hikari.UndefinedOr[hikari.Snowflake]]:
+    # threads post through their parent channel's webhooks, which every thread under it shares
+    if isinstance(channel, hikari.GuildThreadChannel):
+        parent = guild.get_channel(channel.parent_id)
+        if not isinstance(parent, hikari.GuildTextChannel):
+            return None, hikari.UNDEFINED
+        return await ensure_webhook_pool(bot, parent), channel.id
+    if isinstance(channel, hikari.GuildTextChannel):
+        return await get_channel_webhooks(bot, channel), hikari.UNDEFINED
+    return None, hikari.UNDEFINED
+
+def get_webhook_token(webhook: hikari.ExecutableWebhook) -> str:
+    if not webhook.token:
+        raise ValueError("Cannot use a webhook without knowing its token")
+    return webhook.token
+
+async def ensure_webhook_on_channel(ctx: lightbulb.SlashContext, channel: hikari.GuildChannel) -> WebhookPool:
     if not isinstance(channel, hikari.GuildTextChannel):
         raise ValueError("Trying to attach webhook to non-text-channel")
     text_channel: hikari.GuildTextChannel = channel
-    channel_webhooks = await ctx.bot.rest.fetch_channel_webhooks(text_channel)
-    for webhook in channel_webhooks:
-        if webhook.name == WEBHOOK_NAME:
-            return webhook
+    existing_webhooks = await get_channel_webhooks(ctx.bot, text_channel)
+    if existing_webhooks is not None:
+        return existing_webhooks
     webhook = await ctx.bot.rest.create_webhook(text_channel, WEBHOOK_NAME)
-    return webhook
+    webhook_pool = WebhookPool([webhook])
+    guild_caches.get(text_channel.guild_id).set_webhooks(text_channel.id, webhook_pool)
+    return webhook_pool
 
 async def get_player_from_location(bot: lightbulb.BotApp, guild: hikari.Guild, location_channel: hikari.GuildChannel) -> Optional[hikari.Member]:
-    channel_permissions = location_channel.permission_overwrites
-    for overwrite_id, permission in channel_permissions.items():
-        if permission.type != hikari.PermissionOverwriteType.MEMBER:
-            continue
-        player_id = permission.id
-        nullable_player = guild.get_member(player_id)
-        channel_player: hikari.Member = nullable_player if nullable_player is not None else await bot.rest.fetch_member(guild.id, player_id)
-        return channel_player
-    return None # player could have left server
+    nullable_player_channel = get_player_channels(guild).get_player(location_channel.id)
+    instrumentation.record_cache_lookup("player_channels", nullable_player_channel is not None)
+    if nullable_player_channel is not None:
+        player_id = nullable_player_channel[1]
+    else:
+        nullable_overwrite = get_channel_member_overwrite(location_channel)
+        if nullable_overwrite is None:
+            return None
+        player_id = nullable_overwrite.id
+    nullable_player = guild.get_member(player_id)
+    if nullable_player is not None:
+        return nullable_player
+    with instrumentation.span("rest.fetch"):
+        return await bot.rest.fetch_member(guild.id, player_id) # player could have left server
 
 async def get_players_in_location(bot: lightbulb.BotApp, guild: hikari.Guild, map_channels: list[hikari.GuildChannel], location:str) -> list[hikari.Member]:
     location_players = []
     for map_channel in map_channels:
         map_channel_location = get_location_channels_location(map_channel)
-        if location == map_channel_location:
-            channel_permissions = map_channel.permission_overwrites
+        if location == map_channel_location and is_active_location_channel(guild, map_channel):
             player = await get_player_from_location(bot, guild, map_channel)
             if player is not None:
                 location_players.append(player)
     return location_players
 
-def find_spectator_channel(guild: hikari.Guild, map_to_use: Map, location: str) -> Optional[hikari.GuildTextChannel]:
-    nullable_spectator_channel_category = None
-    for possible_spectator_category_id, possible_spectator_category in guild.get_channels().items():
-        if possible_spectator_category.name == f"{map_to_use.name.lower()}-spectator" and possible_spectator_category.type == hikari.ChannelType.GUILD_CATEGORY:
-            nullable_spectator_channel_category = possible_spectator_category
-            break
-    if nullable_spectator_channel_category is None:
+def get_spectator_display_name(guild: hikari.Guild, map_to_use: Map, location: str, nullable_speaker: Optional[hikari.Member]) -> str:
+    occupancy = get_map_occupancy(guild, map_to_use)
+    speaker_id = nullable_speaker.id if nullable_speaker is not None else 0
+    nullable_header = occupancy.header(location, speaker_id)
+    if nullable_header is not None:
+        return nullable_header
+    other_names = []
+    for member_id in occupancy.occupants(location):
+        member = guild.get_member(member_id)
+        if member_id != speaker_id and member is not None:
+            other_names.append(member.display_name)
+    display_name = "{} (to {})".format(
+        nullable_speaker.display_name if nullable_speaker is not None else "???",
+        ", ".join(other_names) if other_names else "nobody else")
+    if len(display_name) >= MAX_DISPLAY_NAME_LENGTH:
+        display_name = display_name[:MAX_DISPLAY_NAME_LENGTH - 4] + "...)"
+    occupancy.set_header(location, speaker_id, display_name)
+    return display_name
+
+def build_mirror_route(guild: hikari.Guild, channel_id: int) -> Optional[MirrorRoute]:
+    nullable_channel = get_guild_channel(guild, channel_id)
+    if nullable_channel is None:
+        return None
+    channel: hikari.GuildChannel = nullable_channel
+    nullable_category = get_category_of_channel(guild, channel.id)
+    if nullable_category is None or nullable_category.name is None or "-spectator" in nullable_category.name:
         return None
-    spectator_channel_category: hikari.GuildChannel = nullable_spectator_channel_category
-    spectator_channels = get_channels_in_category(guild, spectator_channel_category)
-    for spectator_channel in spectator_channels:
-        if not isinstance(spectator_channel, hikari.GuildTextChannel):
+    nullable_map_name = get_map_name_from_category(nullable_category.name)
+    if nullable_map_name is None:
+        return None
+    nullable_fetched_map = atlas.get_map(guild.id, nullable_map_name)
+    nullable_location = get_location_channels_location(channel)
+    if nullable_fetched_map is None or nullable_location is None:
+        return None
+    fetched_map: Map = nullable_fetched_map
+    location: str = nullable_location
+    # player channels come from the occupancy when a message is mirrored, only channels no player owns are kept here
+    server_player_channels = get_player_channels(guild)
+    shared_channel_ids = []
+    for chat_channel in get_all_location_channels_for_map(guild, nullable_map_name):
+        if chat_channel.id in server_player_channels or not isinstance(chat_channel, hikari.TextableGuildChannel):
             continue
-        spectator_text_channel: hikari.GuildTextChannel = spectator_channel
-        spectator_location = get_location_channels_location(spectator_text_channel)
-        if spectator_location == location:
-            return spectator_text_channel
-    return None
+        if get_location_channels_location(chat_channel) == location:
+            shared_channel_ids.append(chat_channel.id)
+    nullable_spectator_channel = find_spectator_channel(guild, fetched_map, location)
+    return MirrorRoute(
+        channel.id,
+        fetched_map.name,
+        location,
+        fetched_map.talking_enabled,
+        shared_channel_ids,
+        nullable_spectator_channel.id if nullable_spectator_channel is not None else None)
+
+def get_mirror_route(guild: hikari.Guild, channel_id: int) -> Optional[MirrorRoute]:
+    # routes are dropped on channel events and map edits, moves only change who is read from the occupancy
+    mirror_routes = guild_caches.get(guild.id).mirror_routes(atlas.version(guild.id))
+    if channel_id in mirror_routes:
+        instrumentation.record_cache_lookup("mirror_route", True)
+        return mirror_routes[channel_id]
+    instrumentation.record_cache_lookup("mirror_route", False)
+    route = build_mirror_route(guild, channel_id)
+    mirror_routes[channel_id] = route
+    return route
+
+def get_route_destination_channels(guild: hikari.Guild, map_to_use: Map, route: MirrorRoute) -> list[hikari.TextableGuildChannel]:
+    destination_channel_ids = route.shared_channel_ids + list(get_map_occupancy(guild, map_to_use).occupants(route.location).values())
+    destination_channels = []
+    for channel_id in destination_channel_ids:
+        if channel_id == route.channel_id:
+            continue
+        channel = get_guild_channel(guild, channel_id)
+        if isinstance(channel, hikari.TextableGuildChannel):
+            destination_channels.append(channel)
+    return destination_channels
+
+def get_route_spectator_channel(guild: hikari.Guild, route: MirrorRoute) -> Optional[hikari.GuildTextChannel]:
+    spectator_channel = guild.get_channel(route.spectator_channel_id) if route.spectator_channel_id is not None else None
+    return spectator_channel if isinstance(spectator_channel, hikari.GuildTextChannel) else None
+
+def find_spectator_channel(guild: hikari.Guild, map_to_use: Map, location: str) -> Optional[hikari.GuildTextChannel]:
+    spectator_channel_id = get_channel_index(guild).spectator_channel_ids.get((map_to_use.name.lower(), location))
+    spectator_channel = guild.get_channel(spectator_channel_id) if spectator_channel_id is not None else None
+    return spectator_channel if isinstance(spectator_channel, hikari.GuildTextChannel) else None
 
 async def ensure_location_role(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_name: str, location: str) -> hikari.Role:
-    existing_roles = await guild.fetch_roles()
     location_role_name = f"{map_name.lower()}-{location.lower()}"
-    for role in existing_roles:
-        if location_role_name == role.name:
-            return role
-    return await ctx.bot.rest.create_role(guild, name=location_role_name)
+    guild_cache = guild_caches.get(guild.id)
+    for role_id in sorted(guild_cache.role_ids(guild).get(location_role_name, set())):
+        existing_role = guild.get_role(role_id)
+        if existing_role is not None:
+            return existing_role
+    role = await ctx.bot.rest.create_role(guild, name=location_role_name)
+    guild_cache.add_role(role)
+    return role
 
-async def set_new_location_role(ctx: lightbulb.SlashContext, player: hikari.Member, guild: hikari.Guild, map_name: str, location: str) -> list[hikari.Role]:
-    roles = await player.fetch_roles()
-    roles = list(filter(lambda r: not r.name.startswith(f"{map_name.lower()}-"), roles))
+def get_location_role_ids(guild: hikari.Guild, map_name: str) -> set[int]:
+    location_role_prefix = f"{map_name.lower()}-"
+    return {role_id for role_name, role_ids in guild_caches.get(guild.id).role_ids(guild).items() if role_name.startswith(location_role_prefix) for role_id in role_ids}
+
+async def update_location_roles(guild: hikari.Guild, player_id: int, map_name: str, nullable_new_role_id: Optional[int]) -> None:
+    # the member cache can lag behind our own role changes, so the role applied last is always treated as held
+    nullable_member = guild.get_member(player_id)
+    held_role_ids = set(nullable_member.role_ids) if nullable_member is not None else set()
+    nullable_applied_role_id = applied_location_roles.pop((guild.id, player_id, map_name), None)
+    if nullable_applied_role_id is not None:
+        held_role_ids.add(nullable_applied_role_id)
+    stale_role_ids = (held_role_ids & get_location_role_ids(guild, map_name)) - {nullable_new_role_id}
+    role_changes = len(stale_role_ids)
+    with instrumentation.span("rest.roles"):
+        for role_id in stale_role_ids:
+            await guild.app.rest.remove_role_from_member(guild.id, player_id, role_id)
+        if nullable_new_role_id is not None and nullable_new_role_id not in held_role_ids:
+            await guild.app.rest.add_role_to_member(guild.id, player_id, nullable_new_role_id)
+            role_changes += 1
+    instrumentation.increment("roles.changes", role_changes)
+    if nullable_new_role_id is not None:
+        applied_location_roles[(guild.id, player_id, map_name)] = nullable_new_role_id
+
+async def set_new_location_role(ctx: lightbulb.SlashContext, player: hikari.Member, guild: hikari.Guild, map_name: str, location: str) -> None:
     new_role = await ensure_location_role(ctx, guild, map_name, location)
-    roles.append(new_role)
-    await player.edit(roles=roles)
-    return roles
+    await update_location_roles(guild, player.id, map_name, new_role.id)
+
+async def apply_pending_location_role(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, map_name: str) -> None:
+    nullable_location = pending_location_roles.pop((guild.id, player.id, map_name), None)
+    if nullable_location is not None:
+        await set_new_location_role(ctx, player, guild, map_name, nullable_location)
+
+def queue_location_role(ctx: lightbulb.SlashContext, guild: hikari.Guild, player: hikari.Member, map_name: str, location: str) -> None:
+    # moves made while the role change is still queued only move where it points, so just the final role is applied
+    key = (guild.id, player.id, map_name)
+    already_queued = key in pending_location_roles
+    pending_location_roles[key] = location
+    if already_queued:
+        instrumentation.increment("roles.coalesced")
+        return
+    # queued behind the rename so a later move's role always lands last
+    player_work_queues.submit((guild.id, player.id), functools.partial(apply_pending_location_role, ctx, guild, player, map_name))
 
 def replace_rpt_emotes(s: str) -> str:
     s = s.replace("<:RPTblank:602609116334129171>", "<:RPTblank:1054538954982035496>")
@@ -466,17 +890,18 @@ def replace_rpt_emotes(s: str) -> str:
     s = s.replace("<:RPTmark:604411500744146984>", "<:RPTmark:1055177873109041243>")
     return s
 
-async def find_message_in_channel(bot: hikari.GatewayBot, channel: hikari.GuildTextChannel, original_content: str) -> Optional[hikari.Message]:
-    if original_content.startswith("*In Reply to"):
+async def find_message_in_channel(bot: hikari.GatewayBot, channel: hikari.TextableGuildChannel, original_content: str) -> Optional[hikari.Message]:
+    if original_content.startswith(REPLY_HEADER_PREFIX):
         original_content_lines = original_content.split('\n')
         original_content = "\n".join(original_content_lines[2:])
     i = 0
-    async for message in bot.rest.fetch_messages(channel):
-        if i == 99:
-            break
-        if message.content == original_content:
-            return message
-        i += 1
+    with instrumentation.span("rest.fetch"):
+        async for message in bot.rest.fetch_messages(channel):
+            if i == 99:
+                break
+            if message.content == original_content:
+                return message
+            i += 1
     return None
 
 def transform_text_content(bot: hikari.GatewayBot, content: str) -> str:
@@ -489,7 +914,7 @@ def transform_text_content(bot: hikari.GatewayBot, content: str) -> str:
     content = replace_rpt_emotes(content)
     return content
 
-async def execute_mirrored_webhook(bot: hikari.GatewayBot, webhook: hikari.ExecutableWebhook, display_name: hikari.UndefinedOr[str], message: hikari.Message, channel: hikari.GuildTextChannel):
+async def execute_mirrored_webhook(bot: hikari.GatewayBot, webhooks: WebhookPool, display_name: hikari.UndefinedOr[str], message: hikari.Message, channel: hikari.TextableGuildChannel, thread: hikari.UndefinedOr[hikari.Snowflake] = hikari.UNDEFINED) -> hikari.Message:
     content = message.content or ""
     embeds = message.embeds
     avatar_url: Union[hikari.UndefinedType, str, hikari.URL] = message.author.avatar_url or hikari.UNDEFINED
@@ -511,42 +936,128 @@ async def execute_mirrored_webhook(bot: hikari.GatewayBot, webhook: hikari.Execu
     if message.referenced_message and len(content) < 1750 and message.referenced_message.content:
         found_message = await find_message_in_channel(bot, channel, message.referenced_message.content)
         if found_message:
-            quoted_reply = f"*In Reply to {found_message.make_link(channel.get_guild())}*"
+            quoted_reply = f"{REPLY_HEADER_PREFIX} {found_message.make_link(channel.get_guild())}*"
             content = f"{quoted_reply}\n\n{content}"
 
-    await webhook.execute(
-        content=content,
-        username=display_name,
-        avatar_url=avatar_url,
-        attachments=message.attachments,
-        user_mentions=message.user_mentions_ids if hasattr(message, 'user_mentions_ids') else [],
-        embeds=embeds,
-        mentions_everyone=False,
-        flags=message.flags
-    )
+    server_settings = settings_manager.get_settings(channel.guild_id)
+
+    async def execute() -> hikari.Message:
+        with webhooks.use(server_settings.webhook_pool_strategy, server_settings.webhook_pool_size) as webhook, instrumentation.span("rest.webhook_execute"):
+            return await bot.rest.execute_webhook(
+                webhook,
+                get_webhook_token(webhook),
+                content=content,
+                thread=thread,
+                username=display_name,
+                avatar_url=avatar_url,
+                attachments=message.attachments,
+                user_mentions=message.user_mentions_ids if hasattr(message, 'user_mentions_ids') else [],
+                embeds=embeds,
+                mentions_everyone=False,
+                flags=message.flags
+            )
+    return await rest_dispatch.run(channel.guild_id, Priority.MIRROR, execute)
+
+async def mirror_to_channel(bot: hikari.GatewayBot, guild: hikari.Guild, webhooks: WebhookPool, display_name: hikari.UndefinedOr[str], message: hikari.Message, channel: hikari.TextableGuildChannel, thread: hikari.UndefinedOr[hikari.Snowflake] = hikari.UNDEFINED) -> bool:
+    # each copy is recorded as soon as it is sent, and one broken destination does not cost the others their copy
+    try:
+        mirrored_message = await execute_mirrored_webhook(bot, webhooks, display_name, message, channel, thread)
+    except (hikari.HTTPError, ValueError) as e:
+        instrumentation.increment("mirror.failures")
+        if isinstance(e, (hikari.NotFoundError, hikari.ForbiddenError)):
+            # the webhook was most likely deleted, the next message fetches the channel's webhooks again
+            webhook_channel_id = channel.parent_id if isinstance(channel, hikari.GuildThreadChannel) else channel.id
+            if webhook_channel_id is not None:
+                guild_caches.get(guild.id).drop_webhooks(webhook_channel_id)
+        return False
+    mirrored_messages.record(guild.id, message.id, [(mirrored_message.channel_id, mirrored_message.id, mirrored_message.webhook_id or 0)])
+    return True
 
 async def edit_location_to_move(player: hikari.Member, location_channel: hikari.GuildChannel, new_location: str) -> tuple[bool, float]:
+    async def rename() -> None:
+        with instrumentation.span("rest.rename"):
+            await location_channel.edit(name=get_player_location_name(player, new_location))
     try:
-        await location_channel.edit(name=get_player_location_name(player, new_location))
+        await rest_dispatch.run(location_channel.guild_id, Priority.MOVE, rename)
         return True, 0
     except hikari.errors.RateLimitTooLongError as e:
+        instrumentation.increment("move.renames_rate_limited")
         return False, e.retry_after
     
 async def check_cant_roles(guild: hikari.Guild, player: hikari.Member, action: str) -> bool:
-    roles = await guild.fetch_roles()
-    for role in roles:
-        if role.name.lower() == f"cant{action}".lower() and role.id in player.role_ids:
-            return False
-    return True
+    cant_role_ids = guild_caches.get(guild.id).role_ids(guild).get(f"cant{action}".lower(), set())
+    return cant_role_ids.isdisjoint(player.role_ids)
 
+async def undo_move(guild: hikari.Guild, map_to_use: Map, player: hikari.Member, location_channel: hikari.GuildChannel, moved_channel_ids: set[int], old_location: str, new_location: str, previous_cooldown: Optional[datetime.datetime]) -> None:
+    async with map_to_use.cond:
+        # only undo the move if nothing has moved the player since
+        occupancy = get_map_occupancy(guild, map_to_use)
+        if occupancy.channel_of(player.id) in moved_channel_ids and occupancy.location_of(player.id) == new_location:
+            occupancy.place(player.id, location_channel.id, old_location)
+            if previous_cooldown is None:
+                map_to_use.cooldowns.pop(player.id, None)
+            else:
+                map_to_use.cooldowns[player.id] = previous_cooldown
+
+def describe_move_failure(error: Exception) -> str:
+    if isinstance(error, hikari.RateLimitTooLongError):
+        return "Discord rate limits"
+    if isinstance(error, hikari.ForbiddenError):
+        return "the bot is missing permissions"
+    if isinstance(error, hikari.NotFoundError):
+        return "the channel no longer exists"
+    if isinstance(error, hikari.HTTPResponseError):
+        return f"Discord answered {error.status}"
+    return str(error) or type(error).__name__
+
+async def rename_for_move(guild: hikari.Guild, map_to_use: Map, player: hikari.Member, location_channel: hikari.GuildChannel, old_location: str, new_location: str, previous_cooldown: Optional[datetime.datetime]) -> Optional[str]:
+    # answers why the move failed, or None once the channel is renamed
+    try:
+        result, _ = await edit_location_to_move(player, location_channel, new_location)
+        failure = None if result else "Discord rate limits"
+    except Exception as e:
+        failure = describe_move_failure(e)
+    if failure is None:
+        instrumentation.increment("move.renames_completed")
+        return None
+    instrumentation.increment("move.renames_failed")
+    await undo_move(guild, map_to_use, player, location_channel, {location_channel.id}, old_location, new_location, previous_cooldown)
+    return failure
+
+async def swap_player_channels(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, player: hikari.Member, location_channel: hikari.GuildChannel, new_location: str) -> hikari.GuildChannel:
+    # the new channel is opened before the old one is closed, so a failure never leaves the player without a channel to write in
+    with instrumentation.span("rest.swap"):
+        new_channel = await ensure_location_channel(ctx, guild, player, map_to_use, new_location, True)
+        if not player_can_write_in_channel(new_channel, player.id):
+            await make_channel_writeable_for_player(new_channel, player)
+        await make_channel_readable_for_player(location_channel, player)
+    return new_channel
+
+async def swap_for_move(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, player: hikari.Member, location_channel: hikari.GuildChannel, old_location: str, new_location: str, previous_cooldown: Optional[datetime.datetime]) -> Optional[str]:
+    try:
+        new_channel = await swap_player_channels(ctx, guild, map_to_use, player, location_channel, new_location)
+    except Exception as e:
+        instrumentation.increment("move.swaps_failed")
+        nullable_new_channel = get_player_location_channel_in_map(guild, player, map_to_use, new_location)
+        moved_channel_ids = {location_channel.id} | ({nullable_new_channel.id} if nullable_new_channel is not None else set())
+        await undo_move(guild, map_to_use, player, location_channel, moved_channel_ids, old_location, new_location, previous_cooldown)
+        return describe_move_failure(e)
+    instrumentation.increment("move.swaps_completed")
+    async with map_to_use.cond:
+        # a first visit creates the channel, so the occupancy pointed at the old one until now
+        occupancy = get_map_occupancy(guild, map_to_use)
+        if occupancy.channel_of(player.id) == location_channel.id and occupancy.location_of(player.id) == new_location:
+            occupancy.place(player.id, new_channel.id, new_location)
+    return None
+
+@instrumentation.timed("move_players_to_location")
 async def move_players_to_location(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, players: list[hikari.Member], new_location: str, team_name: Optional[str], ignore_cooldown: bool) -> None:
     settings = settings_manager.get_settings(guild.id)
     player = await interactionMemberEnforcer.ensure_type(ctx.interaction.member, ctx, "Could not determine which member issued the command")
+    players_left_behind = []
+    players_already_there = []
+    pending_moves: list[tuple[hikari.Member, hikari.GuildChannel, str, Optional[datetime.datetime]]] = []
     async with map_to_use.cond:
-        moved_players = {}
-        players_left_behind = []
-        players_already_there = []
-
         if new_location not in map_to_use.locations:
             await ctx.respond(f"{new_location} is not in the map you are moving with")
             return
@@ -565,18 +1076,14 @@ async def move_players_to_location(ctx: lightbulb.SlashContext, guild: hikari.Gu
         if not can_move and not is_admin(ctx):
             await ctx.respond("You do not have the required statistics to move")
             return
-        
-        player_to_location_channel = await get_player_to_location_channel_map_for_players(ctx, guild, map_to_use, players)
 
-        async def attempt_edit(player: hikari.Member, location_channel: hikari.GuildChannel, location: str):
-            result, _ = await edit_location_to_move(player, location_channel, new_location)
-            return player, result, location
-        
-        async_tasks = []
-        for player, location_channel in player_to_location_channel.items():
-            location = get_location_channels_location(location_channel)
-            if location is None:
-                players_left_behind.append((player, "Could not determine current location"))
+        # the move is decided and committed in memory here, discord catches up once the lock is released
+        occupancy = get_map_occupancy(guild, map_to_use)
+        for player in players:
+            location = occupancy.location_of(player.id)
+            channel_id = occupancy.channel_of(player.id)
+            location_channel = get_guild_channel(guild, channel_id) if channel_id is not None else None
+            if location is None or location_channel is None:
                 continue
             if location == new_location:
                 players_already_there.append(player)
@@ -588,76 +1095,86 @@ async def move_players_to_location(ctx: lightbulb.SlashContext, guild: hikari.Gu
                 if diff.total_seconds() > 0:
                     players_left_behind.append((player, f"Cooldown has {diff.total_seconds()} seconds left"))
                     continue
-            async_tasks.append(asyncio.create_task(attempt_edit(player, location_channel, location)))
-        await asyncio.gather(*async_tasks)
-        for task in async_tasks:
-            player, success, location = task.result()
-            if success:
-                moved_players[location] = moved_players.get(location, []) + [player]
-                map_to_use.reset_cooldown(player.id)
-            else:
-                players_left_behind.append((player, f"Discord rate limits"))
-
-        moved_players_list = flatten_list_of_lists(moved_players.values())
-        if not moved_players:
-            if len(players) == 1 and players_left_behind:
-                await ctx.respond(f"Could not move to {new_location}: {players_left_behind[0][1]}")
-                return
-            elif len(players) == 1 and players_already_there:
-                await ctx.respond(f"Already in {new_location}")
-                return
-            await ctx.respond(f"No players were moved, all players were either already in {new_location} or left behind due to cooldowns or missing roles")
+            destination_channel_id = location_channel.id
+            if map_to_use.movement_mode == SWAP_MOVEMENT:
+                nullable_destination_channel = get_player_location_channel_in_map(guild, player, map_to_use, new_location)
+                if nullable_destination_channel is not None:
+                    destination_channel_id = nullable_destination_channel.id
+            pending_moves.append((player, location_channel, location, map_to_use.cooldowns.get(player.id)))
+            occupancy.place(player.id, destination_channel_id, new_location)
+            map_to_use.reset_cooldown(player.id)
+
+    if not pending_moves:
+        if len(players) == 1 and players_left_behind:
+            await ctx.respond(f"Could not move to {new_location}: {players_left_behind[0][1]}")
             return
-        async_tasks = []
-        if settings.announce_entry and player_to_location_channel:
-            location_channel = list(player_to_location_channel.values())[0]
-            category = get_category_of_channel(guild, location_channel.id)
-            if category is not None:
-                chat_channels = get_channels_in_category(guild, category)
-                moved_player_ids = set(map(lambda p: p.id, moved_players_list))
-                moved_players_string = ", ".join(map(lambda p: p.display_name, moved_players_list))
-                for chat_channel in chat_channels:
-                    if not isinstance(chat_channel, hikari.TextableGuildChannel):
-                        continue
-                    chat_player = await get_player_from_location(ctx.bot, guild, chat_channel) # shouldn't actually wait for it most of the time
-                    if chat_player is None or chat_player.id in moved_player_ids:
-                        continue
-                    chat_text_channel: hikari.TextableGuildChannel = chat_channel
-                    chat_channel_location = get_location_channels_location(chat_text_channel)
-                    if chat_channel_location == new_location:
-                        async_tasks.append(asyncio.create_task(chat_text_channel.send(f"{moved_players_string} {'have' if len(moved_players_list) > 1 else 'has'} entered {new_location}")))
-        await asyncio.gather(*async_tasks)
-        nullable_spectator_to_text_channel = find_spectator_channel(guild, map_to_use, new_location)
-        to_message = None
-        movees_name = f"Team {team_name}" if team_name is not None else players[0].display_name
-        if nullable_spectator_to_text_channel is not None:
-            to_message = await nullable_spectator_to_text_channel.send(
-                f"{movees_name} moved to {new_location}")
-        async_tasks = []
-        for location, players in moved_players.items():
-            nullable_spectator_from_text_channel = find_spectator_channel(guild, map_to_use, location)
-            if nullable_spectator_from_text_channel is not None:
-                location_text = new_location if to_message is None else f"[{new_location}]({to_message.make_link(guild)})"
-                async_tasks.append(asyncio.create_task(nullable_spectator_from_text_channel.send(
-                    f"{movees_name} moved from {location} to {location_text}")))
-        if settings.should_track_roles:
-            for player in flatten_list_of_lists(moved_players.values()):
-                async_tasks.append(asyncio.create_task(set_new_location_role(ctx, player, guild, map_to_use.name, new_location)))
-        channel = guild.get_channel(ctx.channel_id)
-        if channel is not None:
-            for player in flatten_list_of_lists(moved_players.values()):
-                async_tasks.append(asyncio.create_task(log_action_to_flint(ctx, "move", player, channel)))
-        if len(players) > 1:
-            async_tasks.append(asyncio.create_task(ctx.respond(
-                f"""Players moved to {new_location}: {', '.join(map(lambda p: p.display_name, flatten_list_of_lists(moved_players.values())))}
+        elif len(players) == 1 and players_already_there:
+            await ctx.respond(f"Already in {new_location}")
+            return
+        await ctx.respond(f"No players were moved, all players were either already in {new_location} or left behind due to cooldowns or missing roles")
+        return
+    move_tasks = []
+    for player, location_channel, location, previous_cooldown in pending_moves:
+        if map_to_use.movement_mode == SWAP_MOVEMENT:
+            instrumentation.increment("move.swaps_queued")
+            move_work = functools.partial(swap_for_move, ctx, guild, map_to_use, player, location_channel, location, new_location, previous_cooldown)
+        else:
+            instrumentation.increment("move.renames_queued")
+            move_work = functools.partial(rename_for_move, guild, map_to_use, player, location_channel, location, new_location, previous_cooldown)
+        move_tasks.append(player_work_queues.submit((guild.id, player.id), move_work))
+    # everything after the renames is queued behind them, the command answers as soon as the move is committed in memory
+    player_work_queues.submit((guild.id, pending_moves[0][0].id), functools.partial(finish_move, ctx, guild, map_to_use, players, pending_moves, move_tasks, new_location, team_name))
+    moving_players_list = [player for player, _, _, _ in pending_moves]
+    if len(players) > 1:
+        await ctx.respond(
+            f"""Players moved to {new_location}: {', '.join(map(lambda p: p.display_name, moving_players_list))}
     Players left behind: {', '.join(map(lambda p: f"{p[0].display_name} ({p[1]})", players_left_behind)) if players_left_behind else 'None'}
     Players already there: {', '.join(map(lambda p: p.display_name, players_already_there)) if players_already_there else 'None'}"""
-            )))
+        )
+    else:
+        await ctx.respond(f"""Player moved to {new_location}""")
+
+async def finish_move(ctx: lightbulb.SlashContext, guild: hikari.Guild, map_to_use: Map, players: list[hikari.Member], pending_moves: list[tuple[hikari.Member, hikari.GuildChannel, str, Optional[datetime.datetime]]], move_tasks: list[asyncio.Task[Optional[str]]], new_location: str, team_name: Optional[str]) -> None:
+    settings = settings_manager.get_settings(guild.id)
+    move_results = await asyncio.gather(*move_tasks, return_exceptions=True)
+    moved_players: dict[str, list[hikari.Member]] = {}
+    failed_players: dict[str, list[hikari.Member]] = {}
+    for (player, _, location, _), failure in zip(pending_moves, move_results):
+        if failure is None:
+            moved_players[location] = moved_players.get(location, []) + [player]
         else:
-            async_tasks.append(asyncio.create_task(ctx.respond(
-                f"""Player moved to {new_location}""")))
-        await asyncio.gather(*async_tasks)
-    await locations_message(ctx, guild, map_to_use, flatten_list_of_lists(moved_players.values()), to_message, new_location)
+            reason = describe_move_failure(failure) if isinstance(failure, Exception) else str(failure)
+            failed_players[reason] = failed_players.get(reason, []) + [player]
+    for reason, reason_players in failed_players.items():
+        # failed moves were already rolled back by undo_move, so the player only needs to hear about it
+        await ctx.respond(f"Could not move {', '.join(map(lambda p: p.display_name, reason_players))} to {new_location}: {reason}")
+    moved_players_list = flatten_list_of_lists(moved_players.values())
+    if not moved_players:
+        return
+    if settings.announce_entry:
+        queue_entry_announcement(guild, map_to_use, new_location, moved_players_list)
+    nullable_spectator_to_text_channel = find_spectator_channel(guild, map_to_use, new_location)
+    to_message = None
+    movees_name = f"Team {team_name}" if team_name is not None else players[0].display_name
+    if nullable_spectator_to_text_channel is not None:
+        to_message = await send_to_channel(nullable_spectator_to_text_channel,
+            f"{movees_name} moved to {new_location}")
+    async_tasks = []
+    for location, location_players in moved_players.items():
+        nullable_spectator_from_text_channel = find_spectator_channel(guild, map_to_use, location)
+        if nullable_spectator_from_text_channel is not None:
+            location_text = new_location if to_message is None else f"[{new_location}]({to_message.make_link(guild)})"
+            async_tasks.append(asyncio.create_task(send_to_channel(nullable_spectator_from_text_channel,
+                f"{movees_name} moved from {location} to {location_text}")))
+    if settings.should_track_roles:
+        for player in moved_players_list:
+            queue_location_role(ctx, guild, player, map_to_use.name, new_location)
+    channel = get_guild_channel(guild, ctx.channel_id)
+    if channel is not None:
+        for player in moved_players_list:
+            await log_action_to_flint(ctx, "move", player, channel)
+    await asyncio.gather(*async_tasks)
+    await locations_message(ctx, guild, map_to_use, moved_players_list, to_message, new_location)
 
 def message_is_bot_or_commandlike(message: hikari.PartialMessage) -> bool:
     return (message.content is not None and message.content is not hikari.UNDEFINED and message.content[0] in ("=", "!", "/", "?", ".")) or (bool(message.author) and message.author.is_bot)
@@ -703,15 +1220,15 @@ async def add_player(ctx: lightbulb.SlashContext) -> None:
     player = await memberEnforcer.ensure_type(ctx.options['player'], ctx, "Somehow couldn't get player from the command")
     fetched_map = await get_map(ctx, guild, map_name)
     async with fetched_map.cond:
-        category_for_chats = await get_category_for_chats(guild, fetched_map.name, 1)
         starting_location = fetched_map.locations[0]
-        channel = await ensure_location_channel(ctx, guild, player, category_for_chats, fetched_map, starting_location, True)
+        channel = await ensure_location_channel(ctx, guild, player, fetched_map, starting_location, True)
+        get_map_occupancy(guild, fetched_map).place(player.id, channel.id, starting_location)
         nullable_spectator_text_channel = find_spectator_channel(guild, fetched_map, starting_location)
         settings = settings_manager.get_settings(guild.id)
         if settings.should_track_roles:
             await set_new_location_role(ctx, player, guild, fetched_map.name, starting_location)
     if nullable_spectator_text_channel is not None:
-        spec_message = await nullable_spectator_text_channel.send(f"{player.mention} finds themselves on {fetched_map.name}")
+        spec_message = await send_to_channel(nullable_spectator_text_channel, f"{player.mention} finds themselves on {fetched_map.name}")
         await locations_message(ctx, guild, fetched_map, [player], spec_message, starting_location)
     await ctx.respond(f"{get_sanitized_player_name(player)} added to {fetched_map.name} at {fetched_map.locations[0]}")
 
@@ -739,7 +1256,7 @@ async def toggle_announce_entry(ctx: lightbulb.SlashContext) -> None:
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.announce_entry
-    await settings_manager.set_announce_entry(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "announce_entry", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} entry")
 
 @plugin.command
@@ -757,17 +1274,21 @@ async def remove_player(ctx: lightbulb.SlashContext) -> None:
     active_location_channel = await guildChannelEnforcer.ensure_type(get_active_channel_for_player_in_map(guild, player, fetched_map), ctx, "Player is not active on the map...")
     active_location = await stringEnforcer.ensure_type(get_location_channels_location(active_location_channel), ctx, "Player is not active on the map...")
     async with fetched_map.cond:
-        for channel in get_player_location_channels(guild, player, fetched_map.name):
+        player_location_channels = get_player_location_channels(guild, player, fetched_map.name)
+        for channel in player_location_channels:
             await channel.delete()
+        for parent_id in {channel.parent_id for channel in player_location_channels if isinstance(channel, hikari.GuildThreadChannel)}:
+            await ctx.bot.rest.delete_permission_overwrite(parent_id, player)
+        await player_channels.remove_channels(guild.id, [channel.id for channel in player_location_channels])
+        get_map_occupancy(guild, fetched_map).remove(player.id)
     await locations_message(ctx, guild, fetched_map, [player], None, None)
     nullable_spectator_text_channel = find_spectator_channel(guild, fetched_map, active_location)
     if nullable_spectator_text_channel is not None:
-        await nullable_spectator_text_channel.send(f"{player.mention} removed from {fetched_map.name}")
+        await send_to_channel(nullable_spectator_text_channel, f"{player.mention} removed from {fetched_map.name}")
     settings = settings_manager.get_settings(guild.id)
-    if settings.should_track_roles:    
-        roles = await player.fetch_roles()
-        roles = list(filter(lambda r: not r.name.startswith(f"expedition-{fetched_map.name.lower()}-"), roles))
-        await player.edit(roles=roles)
+    if settings.should_track_roles:
+        pending_location_roles.pop((guild.id, player.id, fetched_map.name), None)
+        await player_work_queues.submit((guild.id, player.id), functools.partial(update_location_roles, guild, player.id, fetched_map.name, None))
     await ctx.respond(f"{get_sanitized_player_name(player)} removed from {fetched_map.name}")
 
 @plugin.command
@@ -861,7 +1382,7 @@ async def whos_here(ctx: lightbulb.SlashContext) -> None:
     category = await guildChannelEnforcer.ensure_type(
         get_category_of_channel(guild, active_channel.id), ctx, "Could not find category of active channel, contact the admins")
     location = await stringEnforcer.ensure_type(get_location_channels_location(active_channel), ctx, "Could not determine location from your active channel, contact the admins")
-    map_channels = get_channels_in_category(guild, category)
+    map_channels = get_all_location_channels_for_map(guild, map_to_use.name)
     location_players = await get_players_in_location(ctx.bot, guild, map_channels, location)
     if len(location_players) <= 1:
         await ctx.respond(f"You're the only one in {location}")
@@ -878,7 +1399,7 @@ async def spectator_role(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting spectator role id...", flags=hikari.MessageFlag.LOADING)
     guild = await get_guild(ctx)
     role: hikari.Role = ctx.options['role']
-    await settings_manager.set_spectator_role_id(guild.id, role.id)
+    await settings_manager.set_setting(guild.id, "spectator_role_id", role.id)
     await ctx.respond(f"{role.mention} set as spectator role for the server")
 
 @plugin.command
@@ -890,7 +1411,7 @@ async def admin_role(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting admin role id...", flags=hikari.MessageFlag.LOADING)
     guild = await get_guild(ctx)
     role: hikari.Role = ctx.options['role']
-    await settings_manager.set_admin_role_id(guild.id, role.id)
+    await settings_manager.set_setting(guild.id, "admin_role_id", role.id)
     await ctx.respond(f"{role.mention} set as admin role for the server")
 
 @plugin.command
@@ -900,7 +1421,7 @@ async def admin_role(ctx: lightbulb.SlashContext) -> None:
 async def enable_role_tracking(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Enabling role tracking...", flags=hikari.MessageFlag.LOADING)
     guild = await get_guild(ctx)
-    await settings_manager.set_should_track_roles(guild.id, True)
+    await settings_manager.set_setting(guild.id, "should_track_roles", True)
     await ctx.respond(f"Enabled role tracking")
 
 @plugin.command
@@ -910,7 +1431,7 @@ async def enable_role_tracking(ctx: lightbulb.SlashContext) -> None:
 async def disable_role_tracking(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Disabling role tracking...", flags=hikari.MessageFlag.LOADING)
     guild = await get_guild(ctx)
-    await settings_manager.set_should_track_roles(guild.id, False)
+    await settings_manager.set_setting(guild.id, "should_track_roles", False)
     await ctx.respond(f"Disabled role tracking")
 
 @plugin.command
@@ -922,24 +1443,76 @@ async def toggle_sync_commands_and_bots_to_spectators(ctx: lightbulb.SlashContex
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.sync_commands_and_bots_to_spectators
-    await settings_manager.set_sync_commands_and_bots_to_spectators(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "sync_commands_and_bots_to_spectators", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} syncing command and bot messages to spectators")
 
 @plugin.command
 @lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
-@lightbulb.option("minutes", "Minutes to set cooldown to (must be >=5)", type=int)
-@lightbulb.command("set-movement-cooldown", "How many minutes a player has to wait before moving again (must be >= 5 due to discord rate limits)")
+@lightbulb.option("minutes", "Minutes to set cooldown to, can be fractional (must be >=5 unless every map uses swap movement)", type=float)
+@lightbulb.command("set-movement-cooldown", "How many minutes a player has to wait before moving again (>= 5 for maps that move by renaming channels)")
 @lightbulb.implements(commands.SlashCommand)
 async def set_movement_cooldown(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting cooldown...", flags=hikari.MessageFlag.LOADING)
     minutes = ctx.options['minutes']
-    if minutes < 5:
-        await ctx.respond("The cooldown must be greater than 5 minutes due to discord rate limits on editing channels")
+    if minutes < 0:
+        await ctx.respond("The cooldown can't be negative")
         return
     guild = await get_guild(ctx)
-    await settings_manager.set_cooldown_minutes(guild.id, minutes)
+    rename_maps = [server_map.name for server_map in atlas.get_maps_in_server(guild.id) if server_map.movement_mode == RENAME_MOVEMENT]
+    if minutes < RENAME_MIN_COOLDOWN_MINUTES and rename_maps:
+        await ctx.respond(f"The cooldown must be at least {RENAME_MIN_COOLDOWN_MINUTES} minutes due to discord rate limits on renaming channels, switch {', '.join(rename_maps)} to swap movement first")
+        return
+    await settings_manager.set_setting(guild.id, "cooldown_minutes", minutes)
     await ctx.respond(f"Cooldown set")
 
+@plugin.command
+@lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
+@lightbulb.option("mode", "rename moves one channel per player, swap keeps a channel per location and allows short cooldowns", type=str, choices=MOVEMENT_MODES)
+@lightbulb.option("map-name", "Name of the map whose movement mode will be set", type=str)
+@lightbulb.command("set-movement-mode", "Choose whether moving renames the player's channel or swaps them into a channel per location")
+@lightbulb.implements(commands.SlashCommand)
+async def set_movement_mode(ctx: lightbulb.SlashContext) -> None:
+    await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting movement mode...", flags=hikari.MessageFlag.LOADING)
+    map_name = ctx.options["map-name"].lower()
+    movement_mode = ctx.options["mode"].lower()
+    if movement_mode not in MOVEMENT_MODES:
+        await ctx.respond(f"Movement mode must be one of {', '.join(MOVEMENT_MODES)}")
+        return
+    guild = await get_guild(ctx)
+    result_map = await atlas.set_movement_mode(guild.id, map_name, movement_mode)
+    if result_map is None:
+        await ctx.respond(f"Could not find map {map_name}")
+        return
+    settings = settings_manager.get_settings(guild.id)
+    if movement_mode == RENAME_MOVEMENT and settings.cooldown_minutes < RENAME_MIN_COOLDOWN_MINUTES:
+        await ctx.respond(f"{map_name} now moves by renaming channels, but the movement cooldown is {settings.cooldown_minutes} minutes, moves faster than every {RENAME_MIN_COOLDOWN_MINUTES} minutes will hit discord rate limits")
+        return
+    await ctx.respond(f"{map_name} now moves by {'renaming channels' if movement_mode == RENAME_MOVEMENT else 'swapping between location channels'}")
+
+@plugin.command
+@lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
+@lightbulb.option("seconds", f"Seconds between digests (0 turns digests off and mirrors every message, at most {MAX_SPECTATOR_DIGEST_SECONDS})", type=int)
+@lightbulb.option("map-name", "Name of the map whose spectator channels get digests", type=str)
+@lightbulb.command("set-spectator-digest", "Post a summary of each location's messages to spectators every few seconds instead of mirroring each one")
+@lightbulb.implements(commands.SlashCommand)
+async def set_spectator_digest(ctx: lightbulb.SlashContext) -> None:
+    await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting spectator digest...", flags=hikari.MessageFlag.LOADING)
+    map_name = ctx.options["map-name"].lower()
+    seconds = ctx.options["seconds"]
+    if seconds < 0 or seconds > MAX_SPECTATOR_DIGEST_SECONDS:
+        await ctx.respond(f"Seconds must be between 0 and {MAX_SPECTATOR_DIGEST_SECONDS}")
+        return
+    guild = await get_guild(ctx)
+    result_map = await atlas.set_spectator_digest(guild.id, map_name, seconds)
+    if result_map is None:
+        await ctx.respond(f"Could not find map {map_name}")
+        return
+    await drop_spectator_digest_buffers(guild.id, result_map.name)
+    if seconds == 0:
+        await ctx.respond(f"Spectators of {map_name} now see every message")
+        return
+    await ctx.respond(f"Spectators of {map_name} now get a digest every {seconds} seconds, or every {SPECTATOR_DIGEST_MAX_LINES} messages")
+
 @plugin.command
 @lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
 @lightbulb.command("toggle-yelling", "Turn on/off the ability for players to yell")
@@ -949,7 +1522,7 @@ async def toggle_yelling(ctx: lightbulb.SlashContext) -> None:
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.yell_enabled
-    await settings_manager.set_yell_enabled(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "yell_enabled", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} yelling")
 
 @plugin.command
@@ -961,7 +1534,7 @@ async def set_yell_cooldown(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting cooldown...", flags=hikari.MessageFlag.LOADING)
     seconds = ctx.options['seconds']
     guild = await get_guild(ctx)
-    await settings_manager.set_yell_cooldown_seconds(guild.id, seconds)
+    await settings_manager.set_setting(guild.id, "yell_cooldown_seconds", seconds)
     await ctx.respond(f"Cooldown set")
 
 @plugin.command
@@ -973,7 +1546,7 @@ async def toggle_whispering(ctx: lightbulb.SlashContext) -> None:
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.whisper_enabled
-    await settings_manager.set_whisper_enabled(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "whisper_enabled", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} whispering")
 
 @plugin.command
@@ -985,7 +1558,7 @@ async def set_whisper_percentage(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting whisper percentage...", flags=hikari.MessageFlag.LOADING)
     percentage = ctx.options['percentage']
     guild = await get_guild(ctx)
-    await settings_manager.set_whisper_percentage(guild.id, percentage)
+    await settings_manager.set_setting(guild.id, "whisper_percentage", percentage)
     await ctx.respond(f"Percentage set")
 
 @plugin.command
@@ -997,7 +1570,7 @@ async def set_whisper_cooldown(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting cooldown...", flags=hikari.MessageFlag.LOADING)
     seconds = ctx.options['seconds']
     guild = await get_guild(ctx)
-    await settings_manager.set_whisper_cooldown_seconds(guild.id, seconds)
+    await settings_manager.set_setting(guild.id, "whisper_cooldown_seconds", seconds)
     await ctx.respond(f"Cooldown set")
 
 @plugin.command
@@ -1009,7 +1582,7 @@ async def toggle_peeking(ctx: lightbulb.SlashContext) -> None:
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.peek_enabled
-    await settings_manager.set_peek_enabled(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "peek_enabled", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} peeking")
 
 @plugin.command
@@ -1021,7 +1594,7 @@ async def set_peek_percentage(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting peeking percentage...", flags=hikari.MessageFlag.LOADING)
     percentage = ctx.options['percentage']
     guild = await get_guild(ctx)
-    await settings_manager.set_peek_percentage(guild.id, percentage)
+    await settings_manager.set_setting(guild.id, "peek_percentage", percentage)
     await ctx.respond(f"Percentage set")
 
 @plugin.command
@@ -1033,7 +1606,7 @@ async def set_peek_cooldown(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting cooldown...", flags=hikari.MessageFlag.LOADING)
     seconds = ctx.options['seconds']
     guild = await get_guild(ctx)
-    await settings_manager.set_peek_cooldown_seconds(guild.id, seconds)
+    await settings_manager.set_setting(guild.id, "peek_cooldown_seconds", seconds)
     await ctx.respond(f"Cooldown set")
 
 @plugin.command
@@ -1045,7 +1618,7 @@ async def toggle_hunting(ctx: lightbulb.SlashContext) -> None:
     guild = await get_guild(ctx)
     server_settings = settings_manager.get_settings(guild.id)
     new_value = not server_settings.hunt_enabled
-    await settings_manager.set_hunt_enabled(guild.id, new_value)
+    await settings_manager.set_setting(guild.id, "hunt_enabled", new_value)
     await ctx.respond(f"{'Enabled' if new_value else 'Disabled'} hunting")
 
 @plugin.command
@@ -1057,7 +1630,7 @@ async def set_hunt_percentage(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting hunting percentage...", flags=hikari.MessageFlag.LOADING)
     percentage = ctx.options['percentage']
     guild = await get_guild(ctx)
-    await settings_manager.set_hunt_percentage(guild.id, percentage)
+    await settings_manager.set_setting(guild.id, "hunt_percentage", percentage)
     await ctx.respond(f"Percentage set")
 
 @plugin.command
@@ -1069,9 +1642,30 @@ async def set_hunt_cooldown(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting cooldown...", flags=hikari.MessageFlag.LOADING)
     seconds = ctx.options['seconds']
     guild = await get_guild(ctx)
-    await settings_manager.set_hunt_cooldown_seconds(guild.id, seconds)
+    await settings_manager.set_setting(guild.id, "hunt_cooldown_seconds", seconds)
     await ctx.respond(f"Cooldown set")
 
+@plugin.command
+@lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
+@lightbulb.option("strategy", "round-robin takes turns, least-loaded picks the webhook with the fewest messages in flight", type=str, choices=POOL_STRATEGIES, default=POOL_STRATEGIES[0])
+@lightbulb.option("size", f"Webhooks per spectator channel and thread parent (1 to {MAX_WEBHOOK_POOL_SIZE}, default 1)", type=int)
+@lightbulb.command("set-webhook-pool", "Spread mirrored messages on busy channels over several webhooks, each has its own rate limit")
+@lightbulb.implements(commands.SlashCommand)
+async def set_webhook_pool(ctx: lightbulb.SlashContext) -> None:
+    await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Setting webhook pool...", flags=hikari.MessageFlag.LOADING)
+    size = ctx.options['size']
+    strategy = ctx.options['strategy'].lower()
+    if size < 1 or size > MAX_WEBHOOK_POOL_SIZE:
+        await ctx.respond(f"The pool size must be between 1 and {MAX_WEBHOOK_POOL_SIZE}")
+        return
+    if strategy not in POOL_STRATEGIES:
+        await ctx.respond(f"Strategy must be one of {', '.join(POOL_STRATEGIES)}")
+        return
+    guild = await get_guild(ctx)
+    await settings_manager.set_setting(guild.id, "webhook_pool_size", size)
+    await settings_manager.set_setting(guild.id, "webhook_pool_strategy", strategy)
+    await ctx.respond(f"Busy channels now use {size} webhook{'s' if size != 1 else ''}, picked {strategy}")
+
 
 @plugin.command
 @lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
@@ -1123,7 +1717,7 @@ async def remove_location(ctx: lightbulb.SlashContext) -> None:
         await ctx.respond(f"Failed to remove {location_name} from {map_name}, this could be because the map doesn't exist or because the location doesn't exist in it")
         return
     async with result_map.cond:
-        location_channels = get_all_location_channels_for_map(guild, result_map.name)
+        location_channels = get_active_location_channels_for_map(guild, result_map.name)
         for location_channel in location_channels:
             if location_channel.name and location_channel.name.lower() and f"-{location_name.lower()}" not in location_channel.name.lower():
                 continue
@@ -1132,13 +1726,19 @@ async def remove_location(ctx: lightbulb.SlashContext) -> None:
             if nullable_player is None:
                 continue
             player: hikari.Member = nullable_player
-            try:
-                await location_channel.edit(name=get_player_location_name(player, default_location))
-            except hikari.RateLimitedError as e:
-                await ctx.respond(f"{get_sanitized_player_name(player)} moving too quickly for discord rate limits, get them to move in {e.retry_after} seconds")
+            if result_map.movement_mode == SWAP_MOVEMENT:
+                try:
+                    new_channel = await swap_player_channels(ctx, guild, result_map, player, location_channel, default_location)
+                    get_map_occupancy(guild, result_map).place(player.id, new_channel.id, default_location)
+                except hikari.HTTPError:
+                    await ctx.respond(f"Could not move {get_sanitized_player_name(player)} out of {location_name}, move them with move-player")
+            else:
+                renamed, retry_after = await edit_location_to_move(player, location_channel, default_location)
+                if not renamed:
+                    await ctx.respond(f"{get_sanitized_player_name(player)} moving too quickly for discord rate limits, get them to move in {retry_after} seconds")
             nullable_spectator_to_text_channel = find_spectator_channel(guild, result_map, default_location)
             if nullable_spectator_to_text_channel is not None:
-                await nullable_spectator_to_text_channel.send(f"{player.display_name} came from {location_name}")
+                await send_to_channel(nullable_spectator_to_text_channel, f"{player.display_name} came from {location_name}")
             if server_settings.should_track_roles:
                 await set_new_location_role(ctx, player, guild, result_map.name, default_location)    
     await ctx.respond(f"Removed {location_name} from {map_name}")
@@ -1154,7 +1754,7 @@ async def prod_yell(ctx: lightbulb.SlashContext, guild: hikari.Guild, member: hi
     if len(filtered_maps) != 1:
         return await ctx.respond("Can't find which map you want to yell in, contact Keegan, code prod_yell:10")
     map_to_use = filtered_maps[0]
-    location_channels = get_all_location_channels_for_map(guild, map_to_use.name)
+    location_channels = get_active_location_channels_for_map(guild, map_to_use.name)
     locations_yelled_in_for_specs = []
     async_tasks = []
     for location_channel in location_channels:
@@ -1164,10 +1764,10 @@ async def prod_yell(ctx: lightbulb.SlashContext, guild: hikari.Guild, member: hi
             nullable_spectator_channel = find_spectator_channel(guild, map_to_use, location)
             if nullable_spectator_channel is not None and location not in locations_yelled_in_for_specs:
                 specator_channel = nullable_spectator_channel
-                async_tasks.append(asyncio.create_task(specator_channel.send(message, mentions_everyone=False)))
+                async_tasks.append(asyncio.create_task(send_to_channel(specator_channel, message, mentions_everyone=False)))
                 locations_yelled_in_for_specs.append(location)
         if isinstance(location_channel, hikari.TextableGuildChannel):
-            async_tasks.append(asyncio.create_task(location_channel.send(message, mentions_everyone=False)))
+            async_tasks.append(asyncio.create_task(send_to_channel(location_channel, message, priority=Priority.MIRROR, mentions_everyone=False)))
     async_tasks.append(asyncio.create_task(ctx.respond(f"You yelled {ctx.options['message']}")))
     await asyncio.gather(*async_tasks)
 
@@ -1224,7 +1824,7 @@ async def yell(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Yelling...", flags=hikari.MessageFlag.LOADING)
     active_channel = await guildChannelEnforcer.ensure_type(get_active_channel_for_player_in_map(guild, player, map_to_use), ctx, "Can't find player's active channel in the map")
     active_location = await stringEnforcer.ensure_type(get_location_channels_location(active_channel), ctx, "Can't find active location")
-    location_channels = get_all_location_channels_for_map(guild, map_to_use.name)
+    location_channels = get_active_location_channels_for_map(guild, map_to_use.name)
     locations_yelled_in_for_specs = []
     async_tasks = []
     for location_channel in location_channels:
@@ -1233,12 +1833,12 @@ async def yell(ctx: lightbulb.SlashContext) -> None:
         nullable_spectator_channel = find_spectator_channel(guild, map_to_use, location)
         if nullable_spectator_channel is not None and location not in locations_yelled_in_for_specs:
             specator_channel = nullable_spectator_channel
-            async_tasks.append(asyncio.create_task(specator_channel.send(message, mentions_everyone=False)))
+            async_tasks.append(asyncio.create_task(send_to_channel(specator_channel, message, mentions_everyone=False)))
             locations_yelled_in_for_specs.append(location)
         if location_channel.id != active_channel.id and isinstance(location_channel, hikari.TextableGuildChannel):
-            async_tasks.append(asyncio.create_task(location_channel.send(message, mentions_everyone=False)))
+            async_tasks.append(asyncio.create_task(send_to_channel(location_channel, message, priority=Priority.MIRROR, mentions_everyone=False)))
     map_to_use.reset_yell_cooldown(player.id)
-    channel = guild.get_channel(ctx.channel_id) 
+    channel = get_guild_channel(guild, ctx.channel_id) 
     if channel is not None:
         await log_action_to_flint(ctx, "yell", player, channel)
     async_tasks.append(asyncio.create_task(ctx.respond(f"You yelled {ctx.options['message']}")))
@@ -1304,32 +1904,20 @@ async def whisper(ctx: lightbulb.SlashContext) -> None:
     if active_location != target_active_location:
         await ctx.respond(f"You must be in the same location as {target.mention} to whisper to them.")
         return
-    await target_active_channel.send(f"{player.mention} ({player.display_name}) whispered to you:\n\n{ctx.options['message']}")
+    async_tasks = [asyncio.create_task(send_to_channel(target_active_channel, f"{player.mention} ({player.display_name}) whispered to you:\n\n{ctx.options['message']}", priority=Priority.MIRROR))]
     was_overheard = settings.whisper_percentage > 0 and random.randint(1, 100) <= settings.whisper_percentage
     if was_overheard:
-        nullable_category = get_category_of_channel(guild, active_channel.id)  
-        if nullable_category is None:
-            return
-        map_category: hikari.GuildChannel = nullable_category
-        chat_channels = get_channels_in_category(guild, map_category)
-        for chat_channel in chat_channels:
-            if chat_channel == active_channel or chat_channel == target_active_channel or not isinstance(chat_channel, hikari.TextableGuildChannel):
-                continue
-            chat_text_channel: hikari.TextableGuildChannel = chat_channel
-            chat_channel_location = get_location_channels_location(chat_text_channel)
-            if chat_channel_location == active_location:
-                await chat_channel.send(f"You overheard {player.mention} ({player.display_name}) whisper to {target.mention} ({target.display_name}):\n\n{ctx.options['message']}")
+        broadcast_to_location(guild, map_to_use, active_location, f"You overheard {player.mention} ({player.display_name}) whisper to {target.mention} ({target.display_name}):\n\n{ctx.options['message']}", {player.id, target.id})
     nullable_spectator_text_channel = find_spectator_channel(guild, map_to_use, active_location)
-    if nullable_spectator_text_channel is None:
-        return
-    spectator_text_channel: hikari.TextableGuildChannel = nullable_spectator_text_channel
-    overheard_text = " (and overheard by everyone else)" if was_overheard else ""
-    await spectator_text_channel.send(f"{player.mention} ({player.display_name}) whispered{overheard_text} to {target.mention} ({target.display_name}):\n\n{ctx.options['message']}")
+    if nullable_spectator_text_channel is not None:
+        overheard_text = " (and overheard by everyone else)" if was_overheard else ""
+        async_tasks.append(asyncio.create_task(send_to_channel(nullable_spectator_text_channel, f"{player.mention} ({player.display_name}) whispered{overheard_text} to {target.mention} ({target.display_name}):\n\n{ctx.options['message']}")))
     map_to_use.reset_whisper_cooldown(player.id)
-    channel = guild.get_channel(ctx.channel_id) 
+    channel = get_guild_channel(guild, ctx.channel_id) 
     if channel is not None:
         await log_action_to_flint(ctx, "whisper", player, channel)
-    await ctx.respond(f"You whispered to {target.mention} ({target.display_name}) :\n\n{ctx.options['message']}")
+    async_tasks.append(asyncio.create_task(ctx.respond(f"You whispered to {target.mention} ({target.display_name}) :\n\n{ctx.options['message']}")))
+    await asyncio.gather(*async_tasks)
     
 @plugin.command
 @lightbulb.option("location-name", "The location you want to peek at", type=str)
@@ -1383,23 +1971,12 @@ async def peek(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Peeking...", flags=hikari.MessageFlag.LOADING)
     was_seen = settings.peek_percentage > 0 and random.randint(1, 100) <= settings.peek_percentage
     if was_seen:
-        nullable_category = get_category_of_channel(guild, active_channel.id)  
-        if nullable_category is None:
-            return
-        map_category: hikari.GuildChannel = nullable_category
-        chat_channels = get_channels_in_category(guild, map_category)
-        for chat_channel in chat_channels:
-            if chat_channel == active_channel or not isinstance(chat_channel, hikari.GuildTextChannel):
-                continue
-            chat_text_channel: hikari.GuildTextChannel = chat_channel
-            chat_channel_location = get_location_channels_location(chat_text_channel)
-            if chat_channel_location == target_location:
-                await chat_channel.send(f"You saw {player.mention} ({player.display_name}) peek in to {target_location}")
+        broadcast_to_location(guild, map_to_use, target_location, f"You saw {player.mention} ({player.display_name}) peek in to {target_location}", {player.id})
     map_to_use.reset_peek_cooldown(player.id)
-    channel = guild.get_channel(ctx.channel_id) 
+    channel = get_guild_channel(guild, ctx.channel_id) 
     if channel is not None:
         await log_action_to_flint(ctx, "peek", player, channel)
-    map_channels = get_channels_in_category(guild, category)
+    map_channels = get_all_location_channels_for_map(guild, map_to_use.name)
     location_players = await get_players_in_location(ctx.bot, guild, map_channels, target_location)
     if len(location_players) == 0:
         await ctx.respond(f"No one is in {target_location}")
@@ -1451,20 +2028,9 @@ async def hunt(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(hikari.interactions.ResponseType.DEFERRED_MESSAGE_CREATE, "Hunting...", flags=hikari.MessageFlag.LOADING)
     was_seen = settings.hunt_percentage > 0 and random.randint(1, 100) <= settings.hunt_percentage
     if was_seen:
-        nullable_category = get_category_of_channel(guild, active_channel.id)  
-        if nullable_category is None:
-            return
-        map_category: hikari.GuildChannel = nullable_category
-        chat_channels = get_channels_in_category(guild, map_category)
-        for chat_channel in chat_channels:
-            if chat_channel == active_channel or not isinstance(chat_channel, hikari.GuildTextChannel):
-                continue
-            chat_text_channel: hikari.GuildTextChannel = chat_channel
-            chat_channel_location = get_location_channels_location(chat_text_channel)
-            if chat_channel_location == current_location:
-                await chat_channel.send(f"You saw {player.mention} ({player.display_name}) hunt")
+        broadcast_to_location(guild, map_to_use, current_location, f"You saw {player.mention} ({player.display_name}) hunt", {player.id})
     map_to_use.reset_hunt_cooldown(player.id)
-    channel = guild.get_channel(ctx.channel_id) 
+    channel = get_guild_channel(guild, ctx.channel_id) 
     if channel is not None:
         await log_action_to_flint(ctx, "hunt", player, channel)
     await ctx.respond("You have hunted, you can now message production")
@@ -1507,6 +2073,7 @@ async def remove_roles_from_location(ctx: lightbulb.SlashContext) -> None:
     await ctx.respond(f"Removed roles from {location_name} in {map_name}")
 
 @plugin.listener(hikari.MessageCreateEvent, bind=True) # type: ignore[misc]
+@instrumentation.timed("mirror_messages")
 async def mirror_messages(plugin: lightbulb.Plugin, event: hikari.MessageCreateEvent):
     bot = plugin.bot
     bot_user = bot.get_me()
@@ -1520,86 +2087,96 @@ async def mirror_messages(plugin: lightbulb.Plugin, event: hikari.MessageCreateE
     if nullable_guild is None:
         return
     guild: hikari.Guild = nullable_guild
-    nullable_channel =  bot.cache.get_guild_channel(event.message.channel_id)
-    if nullable_channel is None:
-        return
-    channel: hikari.GuildChannel = nullable_channel
-    nullable_category = get_category_of_channel(guild, channel.id)  
-    if nullable_category is None:
-        return
-    category: hikari.GuildChannel = nullable_category
-    nullable_category_name = category.name
-    if nullable_category_name is None or "-spectator" in nullable_category_name:
+    await ensure_guild_state(guild)
+    nullable_route = get_mirror_route(guild, event.message.channel_id)
+    if nullable_route is None:
         return
-    category_name: str = nullable_category_name
-    nullable_map_name = get_map_name_from_category(category_name)
-    if nullable_map_name is None:
-        return
-    map_name: str = nullable_map_name
-    nullable_fetched_map = atlas.get_map(guild.id, map_name)
+    route: MirrorRoute = nullable_route
+    nullable_fetched_map = atlas.get_map(guild.id, route.map_name)
     if nullable_fetched_map is None:
         return
     fetched_map: Map = nullable_fetched_map
-    if not fetched_map.talking_enabled:
+    if not route.talking_enabled:
         return await event.message.respond("Talking here is off right now.")
-    nullable_location = get_location_channels_location(channel)
-    if nullable_location is None:
+    location = route.location
+    # a resumed or replayed gateway event is fanned out at most once
+    if not mirrored_messages.claim(event.message.id):
+        instrumentation.increment("mirror.duplicates_skipped")
         return
-    location: str = nullable_location
-    chat_channels = get_channels_in_category(guild, category)
     server_settings = settings_manager.get_settings(guild.id)
-    for chat_channel in chat_channels:
-        if chat_channel == channel or not isinstance(chat_channel, hikari.GuildTextChannel):
-            continue
-        chat_text_channel: hikari.GuildTextChannel = chat_channel
-        chat_channel_location = get_location_channels_location(chat_text_channel)
-        if chat_channel_location == location:
-            webhooks = await bot.rest.fetch_channel_webhooks(chat_text_channel)
-            display_name: hikari.UndefinedOr[str] = event.message.member.display_name if event.message.member is not None else hikari.UNDEFINED
-            async_tasks = []
-            for webhook in webhooks:
-                if not(webhook.name == WEBHOOK_NAME) or not isinstance(webhook, hikari.ExecutableWebhook):
-                    continue
-                async_tasks.append(asyncio.create_task(execute_mirrored_webhook(plugin.bot, webhook, display_name, event.message, chat_text_channel)))
-            await asyncio.gather(*async_tasks)
-
-    location_players = await get_players_in_location(bot, guild, chat_channels, location)
-    other_players_in_channel = list(filter(lambda p: event.message.member is None or p.id != event.message.member.id, location_players))
-    nullable_spectator_text_channel = find_spectator_channel(guild, fetched_map, location)
+    display_name: hikari.UndefinedOr[str] = event.message.member.display_name if event.message.member is not None else hikari.UNDEFINED
+    fan_out = 0
+    for chat_text_channel in get_route_destination_channels(guild, fetched_map, route):
+        webhooks, thread = await get_location_webhooks(bot, guild, chat_text_channel)
+        if webhooks is not None and await mirror_to_channel(plugin.bot, guild, webhooks, display_name, event.message, chat_text_channel, thread):
+            fan_out += 1
+    instrumentation.increment("mirror.messages")
+    instrumentation.observe_size("mirror.fan_out", fan_out)
+
+    nullable_spectator_text_channel = get_route_spectator_channel(guild, route)
     if nullable_spectator_text_channel is None:
         return
     spectator_text_channel: hikari.GuildTextChannel = nullable_spectator_text_channel
-    spectator_webhooks = await bot.rest.fetch_channel_webhooks(spectator_text_channel)
-    display_name = "{} (to {})".format(
-        event.message.member.display_name if event.message.member is not None else "???", 
-        ", ".join(map(lambda x: x.display_name, other_players_in_channel)) if other_players_in_channel else "nobody else")
-    if len(display_name) >= MAX_DISPLAY_NAME_LENGTH:
-        display_name = display_name[:MAX_DISPLAY_NAME_LENGTH - 4] + "...)"
+    display_name = get_spectator_display_name(guild, fetched_map, location, event.message.member)
     if (not server_settings.sync_commands_and_bots_to_spectators) and message_is_bot_or_commandlike(event.message):
         return
-    for spectator_webhook in spectator_webhooks:
-        if not (spectator_webhook.name == WEBHOOK_NAME and isinstance(spectator_webhook, hikari.ExecutableWebhook)):
-            continue
-        await execute_mirrored_webhook(plugin.bot, spectator_webhook, display_name, event.message, spectator_text_channel)
-
-async def check_for_edited_message_in_channel_and_edit(bot: hikari.GatewayBot, player: hikari.UndefinedNoneOr[hikari.Member], chat_channel: hikari.GuildTextChannel, location: str, old_message: hikari.UndefinedNoneOr[str], new_message: hikari.UndefinedNoneOr[str]) -> None:
-    chat_text_channel: hikari.GuildTextChannel = chat_channel
-    chat_channel_location = get_location_channels_location(chat_text_channel)
-    if chat_channel_location == location:
-        webhooks = await bot.rest.fetch_channel_webhooks(chat_text_channel)
-        display_name: hikari.UndefinedOr[str] = player.display_name if player is not None and player is not hikari.UNDEFINED else hikari.UNDEFINED
-        for webhook in webhooks:
-            if not(webhook.name == WEBHOOK_NAME) or not isinstance(webhook, hikari.ExecutableWebhook):
-                continue
-            found_message = False
-            if old_message:
-                found_message = await find_message_in_channel(bot, chat_text_channel, old_message)
-            if found_message and found_message.content:
-                if found_message.content.startswith("*In reply to"):
-                    new_content = "\n".join(found_message.content.split("\n")[:2] + ([new_message] if new_message else ["*Message deleted*"]))
-                await webhook.edit_message(found_message.id, content=new_message)    
+    if fetched_map.spectator_digest_seconds > 0:
+        get_spectator_digest_buffer(bot, guild.id, fetched_map, location).append(format_spectator_digest_line(guild, display_name, event.message))
+        instrumentation.increment("mirror.spectator_digest_lines")
+        return
+    spectator_webhooks = await ensure_webhook_pool(bot, spectator_text_channel)
+    if spectator_webhooks is not None:
+        await mirror_to_channel(plugin.bot, guild, spectator_webhooks, display_name, event.message, spectator_text_channel)
+
+async def edit_mirrored_message(bot: hikari.GatewayBot, webhook: hikari.ExecutableWebhook, message_id: hikari.Snowflake, content: hikari.UndefinedNoneOr[str], thread: hikari.UndefinedOr[hikari.Snowflake] = hikari.UNDEFINED) -> None:
+    with instrumentation.span("rest.webhook_edit"):
+        await bot.rest.edit_webhook_message(webhook, get_webhook_token(webhook), message_id, content=content, thread=thread)
+
+def keep_reply_header(copy_content: Optional[str], new_content: Optional[str]) -> Optional[str]:
+    if not copy_content or not copy_content.startswith(REPLY_HEADER_PREFIX):
+        return new_content
+    return "\n".join(copy_content.split("\n")[:2] + ([new_content] if new_content else []))
+
+async def edit_mirrored_copy(bot: hikari.GatewayBot, guild: hikari.Guild, channel_id: int, message_id: int, webhook_id: int, new_content: Optional[str], is_reply: bool) -> None:
+    nullable_channel = get_guild_channel(guild, channel_id)
+    if nullable_channel is None:
+        return
+    webhooks, thread = await get_location_webhooks(bot, guild, nullable_channel)
+    if webhooks is None:
+        return
+    try:
+        if is_reply or not webhook_id:
+            # the copy is only read when its reply header has to be kept, or it was saved without its webhook
+            with instrumentation.span("rest.fetch"):
+                copy = await bot.rest.fetch_message(channel_id, message_id)
+            new_content = keep_reply_header(copy.content, new_content)
+            webhook_id = copy.webhook_id or 0
+        # a mirrored message can only be edited by the webhook of the pool that sent it
+        webhook = webhooks.get(webhook_id)
+        if webhook is None:
+            return
+        await rest_dispatch.run(guild.id, Priority.MIRROR, functools.partial(edit_mirrored_message, bot, webhook, hikari.Snowflake(message_id), new_content, thread))
+    except hikari.NotFoundError:
+        pass
+    except (hikari.HTTPError, ValueError):
+        instrumentation.increment("mirror.edit_failures")
+
+async def check_for_edited_message_in_channel_and_edit(bot: hikari.GatewayBot, guild: hikari.Guild, chat_channel: hikari.TextableGuildChannel, old_message: Optional[str], new_message: Optional[str]) -> None:
+    # messages mirrored before copies were recorded are still found by their content
+    webhooks, thread = await get_location_webhooks(bot, guild, chat_channel)
+    if webhooks is None or not old_message:
+        return
+    found_message = await find_message_in_channel(bot, chat_channel, old_message)
+    if found_message is None or not found_message.content:
+        return
+    webhook = webhooks.get(found_message.webhook_id)
+    if webhook is None:
+        return
+    new_content = keep_reply_header(found_message.content, new_message)
+    await rest_dispatch.run(guild.id, Priority.MIRROR, functools.partial(edit_mirrored_message, bot, webhook, found_message.id, new_content, thread))
 
 @plugin.listener(hikari.GuildMessageUpdateEvent, bind=True) # type: ignore[misc]
+@instrumentation.timed("mirror_edits")
 async def mirror_edits(plugin: lightbulb.Plugin, event: hikari.GuildMessageUpdateEvent):
     bot = plugin.bot
     bot_user = bot.get_me()
@@ -1615,74 +2192,200 @@ async def mirror_edits(plugin: lightbulb.Plugin, event: hikari.GuildMessageUpdat
     if nullable_guild is None:
         return
     guild: hikari.Guild = nullable_guild
-    nullable_channel =  bot.cache.get_guild_channel(event.message.channel_id)
-    if nullable_channel is None:
-        return
-    channel: hikari.GuildChannel = nullable_channel
-    nullable_category = get_category_of_channel(guild, channel.id)  
-    if nullable_category is None:
-        return
-    category: hikari.GuildChannel = nullable_category
-    nullable_category_name = category.name
-    if nullable_category_name is None or "-spectator" in nullable_category_name:
-        return
-    category_name: str = nullable_category_name
-    nullable_map_name = get_map_name_from_category(category_name)
-    if nullable_map_name is None:
+    await ensure_guild_state(guild)
+    nullable_route = get_mirror_route(guild, event.message.channel_id)
+    if nullable_route is None:
         return
-    map_name: str = nullable_map_name
-    nullable_fetched_map = atlas.get_map(guild.id, map_name)
+    route: MirrorRoute = nullable_route
+    nullable_fetched_map = atlas.get_map(guild.id, route.map_name)
     if nullable_fetched_map is None:
         return
     fetched_map: Map = nullable_fetched_map
-    if not fetched_map.talking_enabled:
+    if not route.talking_enabled:
         return await event.message.respond("Talking here is off right now.")
-    nullable_location = get_location_channels_location(channel)
-    if nullable_location is None:
+    new_content = event.content or None
+    copies = (await mirrored_messages.copies_of([event.message_id])).get(event.message_id)
+    if copies is not None:
+        # every copy, spectator ones included, is edited by its id
+        is_reply = bool(event.old_message.referenced_message or event.message.referenced_message)
+        await asyncio.gather(*(
+            edit_mirrored_copy(bot, guild, copy_channel_id, copy_message_id, copy_webhook_id, new_content, is_reply)
+            for copy_channel_id, copy_message_id, copy_webhook_id in copies))
         return
-    location: str = nullable_location
-    chat_channels = get_channels_in_category(guild, category)
     server_settings = settings_manager.get_settings(guild.id)
-    player = event.message.member
-    async_tasks = []
-    for chat_channel in chat_channels:
-        if chat_channel == channel or not isinstance(chat_channel, hikari.GuildTextChannel):
-            continue
-        async_tasks.append(asyncio.create_task(check_for_edited_message_in_channel_and_edit(
-            plugin.bot, 
-            player, 
-            chat_channel, 
-            location, 
-            event.old_message.content, 
-            event.content)))
-    await asyncio.gather(*async_tasks)
-    location_players = await get_players_in_location(bot, guild, chat_channels, location)
-    other_players_in_channel = list(filter(lambda p: player is None or player is hikari.UNDEFINED or p.id != player.id, location_players))
-    nullable_spectator_text_channel = find_spectator_channel(guild, fetched_map, location)
-    if nullable_spectator_text_channel is None:
+    chat_channels = get_route_destination_channels(guild, fetched_map, route)
+    # digest lines are not edited, the summary keeps what was first said
+    nullable_spectator_text_channel = get_route_spectator_channel(guild, route)
+    if (nullable_spectator_text_channel is not None and fetched_map.spectator_digest_seconds <= 0
+            and (server_settings.sync_commands_and_bots_to_spectators or not message_is_bot_or_commandlike(event.message))):
+        chat_channels.append(nullable_spectator_text_channel)
+    await asyncio.gather(*(
+        check_for_edited_message_in_channel_and_edit(bot, guild, chat_channel, event.old_message.content, new_content)
+        for chat_channel in chat_channels))
+
+async def delete_mirrored_messages(bot: hikari.GatewayBot, channel_id: int, message_ids: list[int]) -> list[int]:
+    # answers the copies that are gone, a copy that is already gone counts as deleted
+    try:
+        with instrumentation.span("rest.delete_mirrored"):
+            if len(message_ids) == 1:
+                await bot.rest.delete_message(channel_id, message_ids[0])
+            else:
+                await bot.rest.delete_messages(channel_id, message_ids)
+    except hikari.NotFoundError:
+        pass
+    except hikari.ForbiddenError:
+        instrumentation.increment("mirror.delete_failures")
+        return []
+    except hikari.BulkDeleteError as e:
+        instrumentation.increment("mirror.delete_failures")
+        return [int(message_id) for message_id in e.deleted_messages]
+    return message_ids
+
+async def propagate_deletes(bot: hikari.GatewayBot, guild_id: int, channel_id: int, source_message_ids: list[int]) -> None:
+    nullable_guild = bot.cache.get_available_guild(guild_id)
+    if nullable_guild is None:
         return
-    spectator_text_channel: hikari.GuildTextChannel = nullable_spectator_text_channel
-    spectator_webhooks = await bot.rest.fetch_channel_webhooks(spectator_text_channel)
-    display_name = "{} (to {})".format(
-        player.display_name if player is not None and player is not hikari.UNDEFINED else "???", 
-        ", ".join(map(lambda x: x.display_name, other_players_in_channel)) if other_players_in_channel else "nobody else")
-    if len(display_name) >= MAX_DISPLAY_NAME_LENGTH:
-        display_name = display_name[:MAX_DISPLAY_NAME_LENGTH - 4] + "...)"
-    if (not server_settings.sync_commands_and_bots_to_spectators) and message_is_bot_or_commandlike(event.message):
+    guild: hikari.Guild = nullable_guild
+    await ensure_guild_state(guild)
+    if get_mirror_route(guild, channel_id) is None:
         return
-    for spectator_webhook in spectator_webhooks:
-        if not (spectator_webhook.name == WEBHOOK_NAME and isinstance(spectator_webhook, hikari.ExecutableWebhook)):
-            continue
-        found_message = False
-        if event.old_message.content:
-            found_message = await find_message_in_channel(plugin.bot, spectator_text_channel, event.old_message.content)
-        if found_message and found_message.content:
-            new_content = event.content
-            if found_message.content.startswith("*In reply to"):
-                new_content = "\n".join(found_message.content.split("\n")[:2] + ([new_content] if new_content else ["*Message deleted*"]))
-            await spectator_webhook.edit_message(found_message.id, content=new_content)
+    copies = await mirrored_messages.copies_of(source_message_ids)
+    if not copies:
+        return
+    # a burst removed in one location costs one bulk delete per channel it was mirrored to
+    copies_by_channel: dict[int, list[int]] = {}
+    for source_copies in copies.values():
+        for copy_channel_id, copy_message_id, _ in source_copies:
+            copies_by_channel.setdefault(copy_channel_id, []).append(copy_message_id)
+    instrumentation.increment("mirror.deletes", len(copies))
+    deleted_ids = await asyncio.gather(*(
+        rest_dispatch.run(guild.id, Priority.MIRROR, functools.partial(delete_mirrored_messages, bot, copy_channel_id, copy_message_ids))
+        for copy_channel_id, copy_message_ids in copies_by_channel.items()))
+    await mirrored_messages.forget(list(copies), [message_id for channel_deleted_ids in deleted_ids for message_id in channel_deleted_ids])
+
+@plugin.listener(hikari.GuildMessageDeleteEvent, bind=True) # type: ignore[misc]
+@instrumentation.timed("mirror_deletes")
+async def mirror_deletes(plugin: lightbulb.Plugin, event: hikari.GuildMessageDeleteEvent):
+    await propagate_deletes(plugin.bot, event.guild_id, event.channel_id, [event.message_id])
+
+@plugin.listener(hikari.GuildBulkMessageDeleteEvent, bind=True) # type: ignore[misc]
+@instrumentation.timed("mirror_bulk_deletes")
+async def mirror_bulk_deletes(plugin: lightbulb.Plugin, event: hikari.GuildBulkMessageDeleteEvent):
+    await propagate_deletes(plugin.bot, event.guild_id, event.channel_id, list(event.message_ids))
 
 @plugin.listener(hikari.StartedEvent)
 async def setup_states(event: hikari.StartedEvent):
-    await atlas.load_from_db()
-    await settings_manager.load_from_db()
+    # only guilds we are in are loaded up front, anything else loads the first time it is seen
+    guild_ids = list(event.app.cache.get_guilds_view().keys())
+    await asyncio.gather(atlas.load_from_db(guild_ids), settings_manager.load_from_db(guild_ids), player_channels.load_from_db(guild_ids), mirrored_messages.load_from_db())
+    states_ready.set()
+
+async def backfill_player_channels(guild: hikari.Guild, channel_index: GuildChannelIndex) -> None:
+    # channels made before player channels were stored are claimed by their member overwrite
+    server_player_channels = get_player_channels(guild)
+    missing_channels = []
+    for map_name, channel_ids in channel_index.location_channel_ids.items():
+        for channel_id in channel_ids:
+            channel = guild.get_channel(channel_id)
+            if channel is None or channel_id in server_player_channels:
+                continue
+            nullable_overwrite = get_channel_member_overwrite(channel)
+            if nullable_overwrite is not None:
+                missing_channels.append((channel_id, map_name, nullable_overwrite.id))
+    await player_channels.add_channels(guild.id, missing_channels)
+
+async def warm_locations_channel_message_array(locations_channel: hikari.TextableGuildChannel, server_map: Map) -> None:
+    # a move that got to the ledger first already has it, and one that comes in while it is read waits for it
+    async with locations_message_cond:
+        if (locations_channel.guild_id, server_map.name) not in cached_locations_channel_message_arrays:
+            await get_locations_channel_message_array(locations_channel, server_map)
+
+async def warm_guild_caches(bot: hikari.GatewayBot, guild: hikari.Guild) -> None:
+    guild_cache = guild_caches.get(guild.id)
+    channel_index = guild_cache.channel_index(guild)
+    guild_cache.role_ids(guild)
+
+    async def limited(coroutine: Coroutine[Any, Any, Any]) -> Any:
+        async with warmup_semaphore:
+            return await coroutine
+
+    warmup_coroutines = []
+    for server_map in atlas.get_maps_in_server(guild.id):
+        spectator_channel_ids = [channel_id for (map_name, location), channel_id in channel_index.spectator_channel_ids.items() if map_name == server_map.name]
+        # location threads share their parent channel's webhooks
+        for channel_id in channel_index.location_channel_ids.get(server_map.name, []) + channel_index.thread_parent_ids.get(server_map.name, []) + spectator_channel_ids:
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, hikari.GuildTextChannel):
+                warmup_coroutines.append(limited(get_channel_webhooks(bot, channel)))
+        locations_channel = find_locations_channel(guild, server_map)
+        if locations_channel is not None:
+            warmup_coroutines.append(limited(warm_locations_channel_message_array(locations_channel, server_map)))
+    await asyncio.gather(*warmup_coroutines, return_exceptions=True)
+
+@plugin.listener(hikari.GuildAvailableEvent)
+async def load_guild_state(event: hikari.GuildAvailableEvent):
+    await ensure_guild_state(event.guild)
+    run_in_background(warm_guild_caches(event.app, event.guild))
+
+@plugin.listener(hikari.GuildLeaveEvent)
+async def drop_guild_caches(event: hikari.GuildLeaveEvent):
+    guild_caches.drop(event.guild_id)
+    backfilled_guild_ids.discard(event.guild_id)
+    flint_log_buffers.pop(event.guild_id, None)
+    for key in [key for key in spectator_digest_buffers if key[0] == event.guild_id]:
+        spectator_digest_buffers.pop(key, None)
+    for key in [key for key in applied_location_roles if key[0] == event.guild_id]:
+        applied_location_roles.pop(key, None)
+
+@plugin.listener(hikari.StoppingEvent)
+async def flush_flint_logs(event: hikari.StoppingEvent):
+    await asyncio.gather(*(flint_log_buffer.flush() for flint_log_buffer in flint_log_buffers.values()), *(spectator_digest_buffer.flush() for spectator_digest_buffer in spectator_digest_buffers.values()), mirrored_messages.flush())
+    # queued ledger edits and logs are written before the bot goes down
+    await rest_dispatch.drain()
+
+@plugin.listener(hikari.GuildChannelCreateEvent)
+@plugin.listener(hikari.GuildChannelUpdateEvent)
+@plugin.listener(hikari.GuildChannelDeleteEvent)
+async def invalidate_channel_caches(event: hikari.GuildChannelEvent):
+    guild_cache = guild_caches.get(event.guild_id)
+    if isinstance(event, hikari.GuildChannelUpdateEvent):
+        # renames and overwrite edits come with every move, so only the one channel is looked at again
+        guild_cache.update_channel(event.channel, get_location_channels_location(event.channel))
+    else:
+        guild_cache.invalidate_channels()
+    sync_occupancy_with_channel(event.guild_id, event.channel_id, None if isinstance(event, hikari.GuildChannelDeleteEvent) else event.channel)
+    if isinstance(event, hikari.GuildChannelDeleteEvent):
+        guild_cache.drop_webhooks(event.channel_id)
+        await player_channels.remove_channel(event.guild_id, event.channel_id)
+    if isinstance(event, hikari.GuildChannelUpdateEvent) and event.old_channel is not None and event.old_channel.name is not None:
+        channel_name_cache.pop(event.old_channel.name)
+
+@plugin.listener(hikari.GuildThreadCreateEvent)
+@plugin.listener(hikari.GuildThreadUpdateEvent)
+@plugin.listener(hikari.GuildThreadDeleteEvent)
+async def invalidate_thread_caches(event: hikari.GuildThreadEvent):
+    if isinstance(event, hikari.GuildThreadUpdateEvent):
+        guild_caches.get(event.guild_id).update_channel(event.thread, get_location_channels_location(event.thread))
+    else:
+        guild_caches.get(event.guild_id).invalidate_channels()
+    if isinstance(event, hikari.GuildThreadDeleteEvent):
+        sync_occupancy_with_channel(event.guild_id, event.thread_id, None)
+        await player_channels.remove_channel(event.guild_id, event.thread_id)
+    elif isinstance(event, (hikari.GuildThreadCreateEvent, hikari.GuildThreadUpdateEvent)):
+        sync_occupancy_with_channel(event.guild_id, event.thread_id, event.thread)
+
+@plugin.listener(hikari.MemberUpdateEvent)
+async def invalidate_member_caches(event: hikari.MemberUpdateEvent):
+    sanitized_name_cache.pop(event.user_id)
+    if event.old_member is None or event.old_member.display_name != event.member.display_name:
+        guild_caches.get(event.guild_id).rename_member(event.user_id)
+
+@plugin.listener(hikari.WebhookUpdateEvent)
+async def invalidate_webhook_cache(event: hikari.WebhookUpdateEvent):
+    guild_caches.get(event.guild_id).drop_webhooks(event.channel_id)
+
+@plugin.listener(hikari.RoleCreateEvent)
+@plugin.listener(hikari.RoleUpdateEvent)
+@plugin.listener(hikari.RoleDeleteEvent)
+async def invalidate_role_caches(event: hikari.RoleEvent):
+    guild_caches.get(event.guild_id).invalidate_roles()
@@ -0,0 +1,51 @@
+import hikari
+import lightbulb
+import time
+
+from lightbulb import commands
+
+from utils.instrumentation import instrumentation
+
+plugin = lightbulb.Plugin("StatsPlugin")
+
+MAX_STATS_MESSAGE_LENGTH = 1900
+
+command_start_times: dict[int, float] = {}
+
+def finish_command_span(context: lightbulb.Context) -> None:
+    start = command_start_times.pop(id(context), None)
+    if start is not None:
+        instrumentation.observe(f"command.{context.command.name if context.command else 'unknown'}", time.perf_counter() - start)
+
+@plugin.listener(lightbulb.CommandInvocationEvent)
+async def start_command_span(event: lightbulb.CommandInvocationEvent):
+    command_start_times[id(event.context)] = time.perf_counter()
+
+@plugin.listener(lightbulb.CommandCompletionEvent)
+async def complete_command_span(event: lightbulb.CommandCompletionEvent):
+    finish_command_span(event.context)
+
+@plugin.listener(lightbulb.CommandErrorEvent)
+async def fail_command_span(event: lightbulb.CommandErrorEvent):
+    finish_command_span(event.context)
+
+def format_stats() -> str:
+    lines = [f"{'span':<36} {'count':>7} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"]
+    for name, histogram in sorted(instrumentation.histograms().items()):
+        lines.append(f"{name:<36} {histogram.count:>7} {histogram.percentile(50) * 1000:>8.1f} {histogram.percentile(95) * 1000:>8.1f} {histogram.percentile(99) * 1000:>8.1f}")
+    rate_limit_hits = instrumentation.rate_limit_hits()
+    lines.append("")
+    lines.append("429s by route:" if rate_limit_hits else "429s by route: none")
+    for route, hits in sorted(rate_limit_hits.items(), key=lambda item: -item[1]):
+        lines.append(f"  {route}: {hits}")
+    output = "\n".join(lines)
+    if len(output) > MAX_STATS_MESSAGE_LENGTH:
+        output = output[:MAX_STATS_MESSAGE_LENGTH] + "\n..."
+    return f"```\n{output}\n```"
+
+@plugin.command
+@lightbulb.add_checks(lightbulb.checks.has_guild_permissions(hikari.Permissions.MANAGE_GUILD))
+@lightbulb.command("bot-stats", "Show command and discord call latencies, and rate limit hits, since the bot started")
+@lightbulb.implements(commands.SlashCommand)
+async def bot_stats(ctx: lightbulb.SlashContext) -> None:
+    await ctx.respond(format_stats(), flags=hikari.MessageFlag.EPHEMERAL)
@@ -82,11 +82,80 @@ ALTER TABLE server_settings ADD COLUMN hunt_percentage INT NOT NULL DEFAULT 20;
 ALTER TABLE server_settings ADD COLUMN hunt_cooldown_seconds INT NOT NULL DEFAULT 60;
 """
 
+ADD_MOVEMENT_MODE_LOCATION_SETTING = """
+ALTER TABLE locations ADD COLUMN movement_mode TEXT NOT NULL DEFAULT 'rename';
+"""
+
+ADD_WEBHOOK_POOL_SERVER_SETTINGS = """
+ALTER TABLE server_settings ADD COLUMN webhook_pool_size INT NOT NULL DEFAULT 1;
+ALTER TABLE server_settings ADD COLUMN webhook_pool_strategy TEXT NOT NULL DEFAULT 'round-robin';
+"""
+
+ADD_SPECTATOR_DIGEST_LOCATION_SETTING = """
+ALTER TABLE locations ADD COLUMN spectator_digest_seconds INT NOT NULL DEFAULT 0;
+"""
+
+CREATE_PLAYER_CHANNELS_QUERY = """
+CREATE TABLE IF NOT EXISTS player_channels(
+    server_id INT NOT NULL,
+    channel_id INT NOT NULL,
+    map_name TEXT NOT NULL,
+    member_id INT NOT NULL,
+    PRIMARY KEY (channel_id)
+);
+"""
+
+CREATE_PLAYER_CHANNELS_MEMBER_INDEX_QUERY = """
+CREATE INDEX IF NOT EXISTS player_channels_by_member ON player_channels (server_id, member_id);
+"""
+
+CREATE_MIRRORED_MESSAGES_QUERY = """
+CREATE TABLE IF NOT EXISTS mirrored_messages(
+    server_id INT NOT NULL,
+    source_message_id INT NOT NULL,
+    channel_id INT NOT NULL,
+    message_id INT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (message_id)
+);
+"""
+
+CREATE_MIRRORED_MESSAGES_SOURCE_INDEX_QUERY = """
+CREATE INDEX IF NOT EXISTS mirrored_messages_by_source ON mirrored_messages (source_message_id);
+"""
+
+CREATE_MIRRORED_MESSAGES_CREATED_INDEX_QUERY = """
+CREATE INDEX IF NOT EXISTS mirrored_messages_by_created_at ON mirrored_messages (created_at);
+"""
+
+ADD_MIRRORED_MESSAGES_WEBHOOK_ID = """
+ALTER TABLE mirrored_messages ADD COLUMN webhook_id INT NOT NULL DEFAULT 0;
+"""
+
+CREATE_MIRROR_CLAIMS_QUERY = """
+CREATE TABLE IF NOT EXISTS mirror_claims(
+    source_message_id INT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (source_message_id)
+);
+"""
+
+CREATE_MIRROR_CLAIMS_CREATED_INDEX_QUERY = """
+CREATE INDEX IF NOT EXISTS mirror_claims_by_created_at ON mirror_claims (created_at);
+"""
+
 async def create_table():
     async with aiosqlite.connect(consts.SQLITE_DB) as db:
         await db.execute(CREATE_LOCATIONS_QUERY)
         await db.execute(CREATE_SETTINGS_QUERY)
         await db.execute(CREATE_ROLE_REQUIREMENTS_QUERY)
+        await db.execute(CREATE_PLAYER_CHANNELS_QUERY)
+        await db.execute(CREATE_PLAYER_CHANNELS_MEMBER_INDEX_QUERY)
+        await db.execute(CREATE_MIRRORED_MESSAGES_QUERY)
+        await db.execute(CREATE_MIRRORED_MESSAGES_SOURCE_INDEX_QUERY)
+        await db.execute(CREATE_MIRRORED_MESSAGES_CREATED_INDEX_QUERY)
+        await db.execute(CREATE_MIRROR_CLAIMS_QUERY)
+        await db.execute(CREATE_MIRROR_CLAIMS_CREATED_INDEX_QUERY)
         try:
             await db.execute(ADD_COOLDOWN_SETTINGS_QUERY)
         except Exception as e:
@@ -133,6 +202,23 @@ async def create_table():
                 await db.execute(line)
         except Exception as e:
             print(e)
+        try:
+            await db.execute(ADD_MOVEMENT_MODE_LOCATION_SETTING)
+        except Exception as e:
+            print(e)
+        try:
+            for line in ADD_WEBHOOK_POOL_SERVER_SETTINGS.split('\n'):
+                await db.execute(line)
+        except Exception as e:
+            print(e)
+        try:
+            await db.execute(ADD_SPECTATOR_DIGEST_LOCATION_SETTING)
+        except Exception as e:
+            print(e)
+        try:
+            await db.execute(ADD_MIRRORED_MESSAGES_WEBHOOK_ID)
+        except Exception as e:
+            print(e)
         await db.commit()
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
-import aiosqlite
 import asyncio
 import datetime
 
-from typing import Optional
+from typing import Collection, Optional
 
-from utils import consts
+from utils.db import connect_for_write, fetch_all
+
+# rename moves a player's one channel between locations, swap keeps a channel per location and flips which one they can write in
+RENAME_MOVEMENT = "rename"
+SWAP_MOVEMENT = "swap"
+MOVEMENT_MODES = (RENAME_MOVEMENT, SWAP_MOVEMENT)
 
 class Map:
-    def __init__(self, name: str, locations: list[str], talking_enabled: bool = True) -> None:
+    def __init__(self, name: str, locations: list[str], talking_enabled: bool = True, movement_mode: str = RENAME_MOVEMENT, spectator_digest_seconds: int = 0) -> None:
         self.name = name
         self.locations = locations
         self.cooldowns: dict[int, datetime.datetime] = {}
@@ -19,6 +23,9 @@ class Map:
         self.hunt_cooldowns: dict[int, datetime.datetime] = {}
         self.cond = asyncio.Condition()
         self.talking_enabled = talking_enabled
+        self.movement_mode = movement_mode
+        # 0 mirrors every message to spectators, otherwise they get a digest this often
+        self.spectator_digest_seconds = spectator_digest_seconds
         self.role_requirements: dict[str, set[int]] = {}
 
     def __str__(self) -> str:
@@ -53,8 +60,8 @@ class ServerAtlas:
     def __init__(self) -> None:
         self._maps: dict[str, Map] = {}
 
-    def add_map(self, map_name: str, locations: list[str], talking_enabled: bool) -> Map:
-        added_map = Map(map_name.lower(), locations, talking_enabled)
+    def add_map(self, map_name: str, locations: list[str], talking_enabled: bool, movement_mode: str, spectator_digest_seconds: int) -> Map:
+        added_map = Map(map_name.lower(), locations, talking_enabled, movement_mode, spectator_digest_seconds)
         self._maps[map_name.lower()] = added_map
         return added_map
 
@@ -70,11 +77,23 @@ class ServerAtlas:
 class Atlas:
     def __init__(self) -> None:
         self._server_atlases: dict[int, ServerAtlas] = {}
+        self._loaded_servers: set[int] = set()
+        self._fully_loaded = False
+        self._server_load_locks: dict[int, asyncio.Lock] = {}
+        # bumped whenever a server's maps change, so anything derived from them can tell it is stale
+        self._versions: dict[int, int] = {}
     
-    def _add_map(self, server_id: int, map_name: str, locations: list[str], talking_enabled: bool) -> Map:
+    def version(self, server_id: int) -> int:
+        return self._versions.get(server_id, 0)
+
+    def _bump_version(self, server_id: int) -> None:
+        self._versions[server_id] = self._versions.get(server_id, 0) + 1
+
+    def _add_map(self, server_id: int, map_name: str, locations: list[str], talking_enabled: bool, movement_mode: str = RENAME_MOVEMENT, spectator_digest_seconds: int = 0) -> Map:
         server_atlas = self._server_atlases.get(server_id, ServerAtlas())
-        added_map = server_atlas.add_map(map_name, locations, talking_enabled)
+        added_map = server_atlas.add_map(map_name, locations, talking_enabled, movement_mode, spectator_digest_seconds)
         self._server_atlases[server_id] = server_atlas
+        self._bump_version(server_id)
         return added_map
 
     def get_map(self, server_id: int, map_name: str) -> Optional[Map]:
@@ -109,6 +128,22 @@ class Atlas:
         fetched_map.talking_enabled = not fetched_map.talking_enabled
         await self._save_map(server_id, fetched_map)
         return fetched_map.talking_enabled
+
+    async def set_movement_mode(self, server_id: int, map_name: str, movement_mode: str) -> Optional[Map]:
+        if movement_mode not in MOVEMENT_MODES:
+            raise ValueError(f"Unknown movement mode: {movement_mode}")
+        if (server_atlas := self._server_atlases.get(server_id, None)) is None or (fetched_map := server_atlas.get_map(map_name.lower())) is None:
+            return None
+        fetched_map.movement_mode = movement_mode
+        await self._save_map(server_id, fetched_map)
+        return fetched_map
+
+    async def set_spectator_digest(self, server_id: int, map_name: str, seconds: int) -> Optional[Map]:
+        if (server_atlas := self._server_atlases.get(server_id, None)) is None or (fetched_map := server_atlas.get_map(map_name.lower())) is None:
+            return None
+        fetched_map.spectator_digest_seconds = seconds
+        await self._save_map(server_id, fetched_map)
+        return fetched_map
             
     def __str__(self) -> str:
         output = []
@@ -116,33 +151,56 @@ class Atlas:
             output.append(f"{server_id}: [{server_atlas}]")
         return "\n".join(output)
 
-    async def load_from_db(self) -> Atlas:
-        async with aiosqlite.connect(consts.SQLITE_DB) as db:
-            SERVER_ID = 0
-            MAP_NAME = 1
-            LOCATIONS = 2
-            TALKING_ENABLED = 3
-            async with db.execute("SELECT server_id, map_name, locations, talking_enabled FROM locations") as cursor:
-                async for row in cursor:
-                    server_id = row[SERVER_ID]
-                    map_name = row[MAP_NAME]
-                    locations = row[LOCATIONS].split(',')
-                    talking_enabled = True if row[TALKING_ENABLED] > 0 else False
-                    self._add_map(server_id, map_name, locations, talking_enabled)
-        async with aiosqlite.connect(consts.SQLITE_DB) as db:
-            SERVER_ID = 0
-            MAP_NAME = 1
-            LOCATION = 2
-            ROLE_ID = 3
-            async with db.execute("SELECT server_id, map, location, role_id FROM role_requirements") as cursor:
-                async for row in cursor:
-                    server_id = row[SERVER_ID]
-                    map_name = row[MAP_NAME]
-                    location = row[LOCATION]
-                    role_id = row[ROLE_ID]
-                    map = self.get_map(server_id, map_name)
-                    if map is not None:
-                        map.add_role_requirement(location, role_id)
+    def is_loaded(self, server_id: int) -> bool:
+        return self._fully_loaded or server_id in self._loaded_servers
+
+    async def ensure_server_loaded(self, server_id: int) -> None:
+        if self.is_loaded(server_id):
+            return
+        lock = self._server_load_locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            if not self.is_loaded(server_id):
+                await self.load_from_db([server_id])
+        self._server_load_locks.pop(server_id, None)
+
+    async def load_from_db(self, server_ids: Optional[Collection[int]] = None) -> Atlas:
+        map_rows, role_rows = await asyncio.gather(
+            fetch_all("SELECT server_id, map_name, locations, talking_enabled, movement_mode, spectator_digest_seconds FROM locations", server_ids),
+            fetch_all("SELECT server_id, map, location, role_id FROM role_requirements", server_ids),
+        )
+        # servers loaded while these reads were in flight already have live maps (with conds and cooldowns), so leave them be
+        already_loaded = set(self._loaded_servers)
+        SERVER_ID = 0
+        MAP_NAME = 1
+        LOCATIONS = 2
+        TALKING_ENABLED = 3
+        MOVEMENT_MODE = 4
+        SPECTATOR_DIGEST_SECONDS = 5
+        for row in map_rows:
+            server_id = row[SERVER_ID]
+            if server_id in already_loaded:
+                continue
+            map_name = row[MAP_NAME]
+            locations = row[LOCATIONS].split(',')
+            talking_enabled = True if row[TALKING_ENABLED] > 0 else False
+            movement_mode = row[MOVEMENT_MODE] if row[MOVEMENT_MODE] in MOVEMENT_MODES else RENAME_MOVEMENT
+            self._add_map(server_id, map_name, locations, talking_enabled, movement_mode, row[SPECTATOR_DIGEST_SECONDS])
+        SERVER_ID = 0
+        MAP_NAME = 1
+        LOCATION = 2
+        ROLE_ID = 3
+        for row in role_rows:
+            server_id = row[SERVER_ID]
+            if server_id in already_loaded:
+                continue
+            map = self.get_map(server_id, row[MAP_NAME])
+            if map is not None:
+                map.add_role_requirement(row[LOCATION], row[ROLE_ID])
+        if server_ids is None:
+            self._fully_loaded = True
+        else:
+            self._loaded_servers.update(server_ids)
+        self._loaded_servers.update(row[SERVER_ID] for row in map_rows)
         return self
 
     async def create_map(self, server_id: int, map_name: str, locations: list[str]) -> Map:
@@ -176,13 +234,14 @@ class Atlas:
         map_name = map_to_save.name.lower()
         locations = map_to_save.locations
         talking_enabled = 1 if map_to_save.talking_enabled else 0
-        async with map_to_save.cond, aiosqlite.connect(consts.SQLITE_DB) as db:
-            await db.execute(f"INSERT OR REPLACE INTO locations (server_id, map_name, locations, talking_enabled) VALUES ({server_id}, '{map_name}', '{','.join(locations)}', {talking_enabled})")
+        self._bump_version(server_id)
+        async with map_to_save.cond, connect_for_write() as db:
+            await db.execute(f"INSERT OR REPLACE INTO locations (server_id, map_name, locations, talking_enabled, movement_mode, spectator_digest_seconds) VALUES ({server_id}, '{map_name}', '{','.join(locations)}', {talking_enabled}, '{map_to_save.movement_mode}', {int(map_to_save.spectator_digest_seconds)})")
             await db.commit()
     
     async def _save_role_requirements(self, server_id, map_to_save: Map):
         map_name = map_to_save.name.lower()
-        async with map_to_save.cond, aiosqlite.connect(consts.SQLITE_DB) as db:
+        async with map_to_save.cond, connect_for_write() as db:
             for location, roles in map_to_save.role_requirements.items():
                 for role_id in roles:
                     await db.execute(f"INSERT OR REPLACE INTO role_requirements (server_id, map, location, role_id) VALUES ({server_id}, '{map_name}', '{location}', {role_id})")
@@ -191,6 +250,6 @@ class Atlas:
     async def _remove_role_requirements(self, server_id: int, map: Map, location: str):
         map_name = map.name.lower()
         location_name = location.lower()
-        async with map.cond, aiosqlite.connect(consts.SQLITE_DB) as db:
+        async with map.cond, connect_for_write() as db:
             await db.execute(f"DELETE FROM role_requirements WHERE server_id = {server_id} and map='{map_name}' and location='{location_name}'")
             await db.commit()
\ No newline at end of file
@@ -80,4 +80,31 @@ ADMIN_PERMISSIONS = (
     | Permissions.SEND_TTS_MESSAGES
 )
 
-ADMIN_DENIES = Permissions.NONE
\ No newline at end of file
+ADMIN_DENIES = Permissions.NONE
+# what a player gets on the parent channel of their location threads, they talk in the threads only
+THREAD_PARENT_PERMISSIONS = (
+    Permissions.READ_MESSAGE_HISTORY
+    | Permissions.VIEW_CHANNEL 
+    | Permissions.ATTACH_FILES
+    | Permissions.EMBED_LINKS
+    | Permissions.SEND_MESSAGES_IN_THREADS
+    | Permissions.USE_APPLICATION_COMMANDS
+    | Permissions.USE_EXTERNAL_EMOJIS
+    | Permissions.USE_EXTERNAL_STICKERS
+)
+
+THREAD_PARENT_DENIES = (
+    Permissions.MANAGE_CHANNELS
+    | Permissions.MANAGE_ROLES
+    | Permissions.MANAGE_GUILD
+    | Permissions.MANAGE_WEBHOOKS
+    | Permissions.MANAGE_THREADS
+    | Permissions.ADD_REACTIONS
+    | Permissions.CREATE_INSTANT_INVITE
+    | Permissions.CREATE_PRIVATE_THREADS
+    | Permissions.CREATE_PUBLIC_THREADS
+    | Permissions.SEND_MESSAGES
+    | Permissions.MENTION_ROLES
+    | Permissions.MANAGE_MESSAGES
+    | Permissions.SEND_TTS_MESSAGES
+)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import aiosqlite
+import contextlib
+
+from typing import Any, AsyncIterator, Collection, Optional
+
+from utils import consts
+from utils.instrumentation import instrumentation
+
+# stay under SQLite's default host parameter limit, bigger filters just read the whole table
+MAX_SERVER_ID_FILTER = 900
+
+async def fetch_all(query: str, server_ids: Optional[Collection[int]] = None) -> list[Any]:
+    params: tuple[int, ...] = ()
+    if server_ids is not None and len(server_ids) <= MAX_SERVER_ID_FILTER:
+        if not server_ids:
+            return []
+        query += f" WHERE server_id IN ({', '.join('?' * len(server_ids))})"
+        params = tuple(server_ids)
+    async with aiosqlite.connect(consts.SQLITE_DB) as db:
+        return list(await db.execute_fetchall(query, params))
+
+@contextlib.asynccontextmanager
+async def connect_for_write() -> AsyncIterator[aiosqlite.Connection]:
+    with instrumentation.span("db.write"):
+        async with aiosqlite.connect(consts.SQLITE_DB) as db:
+            yield db
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hikari
+import json
+import time
+
+from typing import Any, Optional, TextIO
+
+# option values that only steer the bot are kept so a replay takes the same paths, free text is scrubbed
+STRUCTURAL_OPTIONS = frozenset(("location", "location-name", "locations", "map-name"))
+FLUSH_EVERY_EVENTS = 64
+
+class EventRecorder:
+    def __init__(self, path: str) -> None:
+        self._file: TextIO = open(path, "a", encoding="utf-8")
+        self._start = time.monotonic()
+        self._pseudonyms: dict[int, int] = {}
+        self._unflushed = 0
+        self._write({"k": "start", "wall": time.time()})
+
+    def pseudonym(self, snowflake: Optional[int]) -> Optional[int]:
+        if snowflake is None:
+            return None
+        pseudonym = self._pseudonyms.get(snowflake)
+        if pseudonym is None:
+            pseudonym = len(self._pseudonyms) + 1
+            self._pseudonyms[snowflake] = pseudonym
+        return pseudonym
+
+    def _write(self, record: dict[str, Any]) -> None:
+        if self._file.closed:
+            return
+        record["t"] = round(time.monotonic() - self._start, 3)
+        self._file.write(json.dumps({key: value for key, value in record.items() if value is not None}, separators=(",", ":")) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_EVERY_EVENTS:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        self._unflushed = 0
+
+    def close(self) -> None:
+        self._file.close()
+
+    def scrub_options(self, options: Optional[Any]) -> Optional[dict[str, Any]]:
+        if not options:
+            return None
+        scrubbed: dict[str, Any] = {}
+        for option in options:
+            if option.options:
+                scrubbed[option.name] = self.scrub_options(option.options) or {}
+            elif option.type in (hikari.OptionType.USER, hikari.OptionType.MENTIONABLE):
+                scrubbed[option.name] = {"user": self.pseudonym(int(option.value))}
+            elif option.type in (hikari.OptionType.ROLE, hikari.OptionType.CHANNEL):
+                scrubbed[option.name] = {"id": self.pseudonym(int(option.value))}
+            elif option.name in STRUCTURAL_OPTIONS or not isinstance(option.value, str):
+                scrubbed[option.name] = option.value
+            else:
+                scrubbed[option.name] = {"len": len(option.value)}
+        return scrubbed
+
+    async def on_message_create(self, event: hikari.GuildMessageCreateEvent) -> None:
+        if event.is_webhook or event.is_bot:
+            return
+        message = event.message
+        self._write({
+            "k": "msg",
+            "g": self.pseudonym(event.guild_id),
+            "c": self.pseudonym(event.channel_id),
+            "a": self.pseudonym(event.author_id),
+            "m": self.pseudonym(message.id),
+            "len": len(message.content or ""),
+            "att": len(message.attachments) or None,
+            "stk": len(message.stickers) or None,
+            "ref": self.pseudonym(message.referenced_message.id) if message.referenced_message else None,
+        })
+
+    async def on_message_update(self, event: hikari.GuildMessageUpdateEvent) -> None:
+        if event.is_webhook or event.author_id is None or (event.author is not None and event.author.is_bot):
+            return
+        self._write({
+            "k": "edit",
+            "g": self.pseudonym(event.guild_id),
+            "c": self.pseudonym(event.channel_id),
+            "a": self.pseudonym(event.author_id),
+            "m": self.pseudonym(event.message_id),
+            "len": len(event.content or "") if event.content is not hikari.UNDEFINED else None,
+        })
+
+    async def on_interaction_create(self, event: hikari.InteractionCreateEvent) -> None:
+        interaction = event.interaction
+        if not isinstance(interaction, hikari.CommandInteraction) or interaction.guild_id is None:
+            return
+        permissions = interaction.member.permissions if interaction.member is not None else hikari.Permissions.NONE
+        self._write({
+            "k": "cmd",
+            "g": self.pseudonym(interaction.guild_id),
+            "c": self.pseudonym(interaction.channel_id),
+            "a": self.pseudonym(interaction.user.id),
+            "cmd": interaction.command_name,
+            "o": self.scrub_options(interaction.options),
+            "adm": 1 if permissions & hikari.Permissions.MANAGE_GUILD else None,
+        })
+
+    def subscribe(self, bot: hikari.GatewayBot) -> None:
+        bot.subscribe(hikari.GuildMessageCreateEvent, self.on_message_create)
+        bot.subscribe(hikari.GuildMessageUpdateEvent, self.on_message_update)
+        bot.subscribe(hikari.InteractionCreateEvent, self.on_interaction_create)
+        bot.subscribe(hikari.StoppingEvent, self.on_stopping)
+
+    async def on_stopping(self, event: hikari.StoppingEvent) -> None:
+        self.flush()
+        self.close()
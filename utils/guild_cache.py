@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import hikari
+
+from typing import Optional
+
+from utils.webhook_pool import WebhookPool
+
+CHAT_CATEGORY_MARKER = "-channels-"
+SPECTATOR_CATEGORY_SUFFIX = "-spectator"
+THREAD_CATEGORY_SUFFIX = "-threads"
+LOCATIONS_CHANNEL_SUFFIX = "-locations"
+FLINT_LOG_CHANNEL_NAME = "flint-log"
+
+class GuildChannelIndex:
+    def __init__(self, guild: hikari.Guild) -> None:
+        self.chat_category_ids: dict[str, list[int]] = {}
+        self.location_channel_ids: dict[str, list[int]] = {}
+        self.thread_category_ids: dict[str, int] = {}
+        self.thread_parent_ids: dict[str, list[int]] = {}
+        self.spectator_category_ids: dict[str, int] = {}
+        self.spectator_channel_ids: dict[tuple[str, str], int] = {}
+        self.locations_channel_ids: dict[str, int] = {}
+        self.flint_log_channel_id: Optional[int] = None
+
+        # category and thread parent ids to their map, so one channel can be placed without looking at the others
+        self._chat_category_maps: dict[int, str] = {}
+        self._spectator_category_maps: dict[int, str] = {}
+        self._thread_category_maps: dict[int, str] = {}
+        self._thread_parent_maps: dict[int, str] = {}
+
+        channels = guild.get_channels()
+        for channel_id, channel in channels.items():
+            if channel.name is None:
+                continue
+            if channel.type == hikari.ChannelType.GUILD_CATEGORY:
+                if CHAT_CATEGORY_MARKER in channel.name:
+                    map_name = channel.name.split(CHAT_CATEGORY_MARKER)[0]
+                    self.chat_category_ids.setdefault(map_name, []).append(channel_id)
+                    self._chat_category_maps[channel_id] = map_name
+                elif channel.name.endswith(SPECTATOR_CATEGORY_SUFFIX) and channel.name[:-len(SPECTATOR_CATEGORY_SUFFIX)] not in self.spectator_category_ids:
+                    map_name = channel.name[:-len(SPECTATOR_CATEGORY_SUFFIX)]
+                    self.spectator_category_ids[map_name] = channel_id
+                    self._spectator_category_maps[channel_id] = map_name
+                elif channel.name.endswith(THREAD_CATEGORY_SUFFIX) and channel.name[:-len(THREAD_CATEGORY_SUFFIX)] not in self.thread_category_ids:
+                    map_name = channel.name[:-len(THREAD_CATEGORY_SUFFIX)]
+                    self.thread_category_ids[map_name] = channel_id
+                    self._thread_category_maps[channel_id] = map_name
+            elif channel.type == hikari.ChannelType.GUILD_TEXT and channel.name == FLINT_LOG_CHANNEL_NAME and self.flint_log_channel_id is None:
+                self.flint_log_channel_id = channel_id
+
+        for channel_id, channel in channels.items():
+            self._add_channel(channel_id, channel)
+
+        # location threads are cached apart from the guild's channels
+        threads = guild.app.cache.get_threads_view_for_guild(guild.id) if isinstance(guild.app, hikari.CacheAware) else {}
+        for thread_id, thread in threads.items():
+            self._add_thread(thread_id, thread)
+
+    def _add_channel(self, channel_id: int, channel: hikari.GuildChannel) -> None:
+        if channel.parent_id is None or channel.name is None:
+            return
+        if channel.parent_id in self._chat_category_maps:
+            self.location_channel_ids.setdefault(self._chat_category_maps[channel.parent_id], []).append(channel_id)
+        elif channel.parent_id in self._spectator_category_maps and channel.type == hikari.ChannelType.GUILD_TEXT:
+            map_name = self._spectator_category_maps[channel.parent_id]
+            if channel.name == f"{map_name}{LOCATIONS_CHANNEL_SUFFIX}":
+                self.locations_channel_ids.setdefault(map_name, channel_id)
+            split_name = channel.name.split('-')
+            if len(split_name) >= 2:
+                self.spectator_channel_ids.setdefault((map_name, "-".join(split_name[1:])), channel_id)
+        elif channel.parent_id in self._thread_category_maps and channel.type == hikari.ChannelType.GUILD_TEXT:
+            self.thread_parent_ids.setdefault(self._thread_category_maps[channel.parent_id], []).append(channel_id)
+            self._thread_parent_maps[channel_id] = self._thread_category_maps[channel.parent_id]
+
+    def _add_thread(self, thread_id: int, thread: hikari.GuildThreadChannel) -> None:
+        if thread.parent_id in self._thread_parent_maps and thread.name is not None:
+            self.location_channel_ids.setdefault(self._thread_parent_maps[thread.parent_id], []).append(thread_id)
+
+    def _remove_channel(self, channel_id: int) -> None:
+        for channel_ids in list(self.location_channel_ids.values()) + list(self.thread_parent_ids.values()):
+            if channel_id in channel_ids:
+                channel_ids.remove(channel_id)
+        self._thread_parent_maps.pop(channel_id, None)
+        self.spectator_channel_ids = {key: value for key, value in self.spectator_channel_ids.items() if value != channel_id}
+        self.locations_channel_ids = {key: value for key, value in self.locations_channel_ids.items() if value != channel_id}
+
+    def update_channel(self, channel: hikari.GuildChannel) -> bool:
+        # answers False when the change reaches past the channel itself and the index has to be rebuilt
+        if channel.type == hikari.ChannelType.GUILD_CATEGORY or channel.name == FLINT_LOG_CHANNEL_NAME or channel.id == self.flint_log_channel_id:
+            return False
+        thread_parent_map = self._thread_parent_maps.get(channel.id)
+        spectator_keys = self._spectator_keys(channel.id)
+        self._remove_channel(channel.id)
+        if isinstance(channel, hikari.GuildThreadChannel):
+            self._add_thread(channel.id, channel)
+            return True
+        self._add_channel(channel.id, channel)
+        # threads are placed by their parent's map, a parent that moves to another map takes them along
+        if thread_parent_map is not None and self._thread_parent_maps.get(channel.id) != thread_parent_map:
+            return False
+        # a spectator channel giving up its location may hand it to another channel of the same name
+        return spectator_keys <= self._spectator_keys(channel.id)
+
+    def _spectator_keys(self, channel_id: int) -> set[tuple[str, str]]:
+        return {key for key, value in self.spectator_channel_ids.items() if value == channel_id}
+
+def get_channel_member_overwrite(channel: hikari.GuildChannel) -> Optional[hikari.PermissionOverwrite]:
+    if not isinstance(channel, hikari.PermissibleGuildChannel):
+        return None
+    for overwrite in channel.permission_overwrites.values():
+        if overwrite.type == hikari.PermissionOverwriteType.MEMBER:
+            return overwrite
+    return None
+
+class MapOccupancy:
+    def __init__(self) -> None:
+        self._locations: dict[str, dict[int, int]] = {}
+        self._positions: dict[int, tuple[str, int]] = {}
+        # rendered spectator names per location and speaker, only redone when the location's occupants change
+        self._headers: dict[str, dict[int, str]] = {}
+
+    def place(self, member_id: int, channel_id: int, location: str) -> None:
+        # channel events repeat positions that are already known, which must not look like a move
+        if self._positions.get(member_id) == (location, channel_id):
+            return
+        self.remove(member_id)
+        self._positions[member_id] = (location, channel_id)
+        self._locations.setdefault(location, {})[member_id] = channel_id
+        self._headers.pop(location, None)
+
+    def remove(self, member_id: int) -> None:
+        position = self._positions.pop(member_id, None)
+        if position is None:
+            return
+        self._headers.pop(position[0], None)
+        occupants = self._locations.get(position[0], {})
+        occupants.pop(member_id, None)
+        if not occupants:
+            self._locations.pop(position[0], None)
+
+    def location_of(self, member_id: int) -> Optional[str]:
+        position = self._positions.get(member_id)
+        return position[0] if position is not None else None
+
+    def channel_of(self, member_id: int) -> Optional[int]:
+        position = self._positions.get(member_id)
+        return position[1] if position is not None else None
+
+    def occupants(self, location: str) -> dict[int, int]:
+        return self._locations.get(location, {})
+
+    def header(self, location: str, speaker_id: int) -> Optional[str]:
+        return self._headers.get(location, {}).get(speaker_id)
+
+    def set_header(self, location: str, speaker_id: int, header: str) -> None:
+        self._headers.setdefault(location, {})[speaker_id] = header
+
+    def rename(self, member_id: int) -> None:
+        location = self.location_of(member_id)
+        if location is not None:
+            self._headers.pop(location, None)
+
+class MirrorRoute:
+    # only what moves do not change, the players' channels are read from the occupancy on each message
+    def __init__(self, channel_id: int, map_name: str, location: str, talking_enabled: bool, shared_channel_ids: list[int], spectator_channel_id: Optional[int]) -> None:
+        self.channel_id = channel_id
+        self.map_name = map_name
+        self.location = location
+        self.talking_enabled = talking_enabled
+        self.shared_channel_ids = shared_channel_ids
+        self.spectator_channel_id = spectator_channel_id
+
+class GuildCache:
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        self._channel_index: Optional[GuildChannelIndex] = None
+        self._role_ids: Optional[dict[str, set[int]]] = None
+        self._webhooks: dict[int, WebhookPool] = {}
+        self._occupancies: dict[str, MapOccupancy] = {}
+        # source channel id to where its messages are mirrored, None for channels that are not mirrored
+        self._mirror_routes: dict[int, Optional[MirrorRoute]] = {}
+        self._mirror_routes_atlas_version: Optional[int] = None
+
+    def channel_index(self, guild: hikari.Guild) -> GuildChannelIndex:
+        if self._channel_index is None:
+            self._channel_index = GuildChannelIndex(guild)
+        return self._channel_index
+
+    def invalidate_channels(self) -> None:
+        self._channel_index = None
+        self._mirror_routes.clear()
+
+    def update_channel(self, channel: hikari.GuildChannel, location: Optional[str]) -> None:
+        if self._channel_index is not None and not self._channel_index.update_channel(channel):
+            self.invalidate_channels()
+            return
+        # only routes from the channel, through it, or into its location can have changed
+        for source_channel_id, route in list(self._mirror_routes.items()):
+            if source_channel_id == channel.id or (route is not None and (
+                    route.location == location or channel.id in route.shared_channel_ids or route.spectator_channel_id == channel.id)):
+                del self._mirror_routes[source_channel_id]
+
+    def role_ids(self, guild: hikari.Guild) -> dict[str, set[int]]:
+        # names are not unique, every role under a name counts
+        if self._role_ids is None:
+            role_ids: dict[str, set[int]] = {}
+            for role_id, role in guild.get_roles().items():
+                role_ids.setdefault(role.name.lower(), set()).add(role_id)
+            self._role_ids = role_ids
+        return self._role_ids
+
+    def add_role(self, role: hikari.Role) -> None:
+        if self._role_ids is not None:
+            self._role_ids.setdefault(role.name.lower(), set()).add(role.id)
+
+    def invalidate_roles(self) -> None:
+        self._role_ids = None
+
+    def get_webhooks(self, channel_id: int) -> Optional[WebhookPool]:
+        return self._webhooks.get(channel_id)
+
+    def set_webhooks(self, channel_id: int, webhooks: WebhookPool) -> None:
+        self._webhooks[channel_id] = webhooks
+
+    def drop_webhooks(self, channel_id: int) -> None:
+        self._webhooks.pop(channel_id, None)
+
+    def get_occupancy(self, map_name: str) -> Optional[MapOccupancy]:
+        return self._occupancies.get(map_name)
+
+    def set_occupancy(self, map_name: str, occupancy: MapOccupancy) -> None:
+        self._occupancies[map_name] = occupancy
+        self._mirror_routes.clear()
+
+    def rename_member(self, member_id: int) -> None:
+        for occupancy in self._occupancies.values():
+            occupancy.rename(member_id)
+
+    def drop_occupancies(self) -> None:
+        self._occupancies.clear()
+        self._mirror_routes.clear()
+
+    def mirror_routes(self, atlas_version: int) -> dict[int, Optional[MirrorRoute]]:
+        if atlas_version != self._mirror_routes_atlas_version:
+            self._mirror_routes = {}
+            self._mirror_routes_atlas_version = atlas_version
+        return self._mirror_routes
+
+class GuildCaches:
+    def __init__(self) -> None:
+        self._caches: dict[int, GuildCache] = {}
+
+    def get(self, guild_id: int) -> GuildCache:
+        guild_cache = self._caches.get(guild_id)
+        if guild_cache is None:
+            guild_cache = GuildCache(guild_id)
+            self._caches[guild_id] = guild_cache
+        return guild_cache
+
+    def drop(self, guild_id: int) -> None:
+        self._caches.pop(guild_id, None)
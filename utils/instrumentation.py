@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import bisect
+import collections
+import contextlib
+import functools
+import hikari
+import http
+import time
+
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+HISTOGRAM_WINDOW = 2048
+# upper bounds for the exported histogram buckets, anything larger only lands in +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+class Histogram:
+    __slots__ = ("count", "total", "buckets", "_bucket_counts", "_samples")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.buckets = buckets
+        self._bucket_counts = [0] * (len(buckets) + 1)
+        # only the most recent samples are kept, so percentiles follow current load
+        self._samples: collections.deque[float] = collections.deque(maxlen=HISTOGRAM_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self._bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._samples.append(value)
+
+    def cumulative_bucket_counts(self) -> list[int]:
+        counts = []
+        running = 0
+        for count in self._bucket_counts:
+            running += count
+            counts.append(running)
+        return counts
+
+    def percentile(self, percent: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self._histograms: dict[str, Histogram] = {}
+        self._sizes: dict[str, Histogram] = {}
+        self._counters: dict[str, int] = {}
+        self._cache_lookups: dict[tuple[str, bool], int] = {}
+        self._rate_limit_hits: dict[str, int] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self._histograms[name] = histogram
+        histogram.observe(seconds)
+
+    def observe_size(self, name: str, size: float) -> None:
+        histogram = self._sizes.get(name)
+        if histogram is None:
+            histogram = Histogram(SIZE_BUCKETS)
+            self._sizes[name] = histogram
+        histogram.observe(size)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_cache_lookup(self, cache: str, hit: bool) -> None:
+        self._cache_lookups[(cache, hit)] = self._cache_lookups.get((cache, hit), 0) + 1
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper # type: ignore[return-value]
+        return decorator
+
+    def record_rate_limit(self, route: str) -> None:
+        self._rate_limit_hits[route] = self._rate_limit_hits.get(route, 0) + 1
+
+    def histograms(self) -> dict[str, Histogram]:
+        return dict(self._histograms)
+
+    def sizes(self) -> dict[str, Histogram]:
+        return dict(self._sizes)
+
+    def counters(self) -> dict[str, int]:
+        return dict(self._counters)
+
+    def cache_lookups(self) -> dict[tuple[str, bool], int]:
+        return dict(self._cache_lookups)
+
+    def rate_limit_hits(self) -> dict[str, int]:
+        return dict(self._rate_limit_hits)
+
+def record_rest_rate_limits(instrumentation: Instrumentation) -> None:
+    # hikari retries 429s internally and has no response hook, so every response's rate limit parsing is wrapped
+    # to count 429s by route template (global, bucket and sub-bucket ones alike). hikari is pinned, so this is stable.
+    rest_client_type = hikari.impl.RESTClientImpl
+    parse_ratelimits = rest_client_type._parse_ratelimits
+    if getattr(parse_ratelimits, "records_rate_limits", False):
+        return
+
+    @functools.wraps(parse_ratelimits)
+    async def parse_and_record_ratelimits(self: hikari.impl.RESTClientImpl, compiled_route: Any, authentication: Any, response: Any) -> Any:
+        if response.status == http.HTTPStatus.TOO_MANY_REQUESTS:
+            instrumentation.record_rate_limit(str(compiled_route.route))
+        return await parse_ratelimits(self, compiled_route, authentication, response)
+
+    parse_and_record_ratelimits.records_rate_limits = True # type: ignore[attr-defined]
+    rest_client_type._parse_ratelimits = parse_and_record_ratelimits # type: ignore[method-assign]
+
+instrumentation = Instrumentation()
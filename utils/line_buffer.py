@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class LineBuffer:
+    def __init__(self, send: Callable[[str], Awaitable[Any]], flush_seconds: float, max_chars: int, max_lines: Optional[int] = None) -> None:
+        self._send = send
+        self._flush_seconds = flush_seconds
+        self._max_chars = max_chars
+        self._max_lines = max_lines
+        self._lines: list[str] = []
+        self._chars = 0
+        self._timer: Optional[asyncio.Task[None]] = None
+        self._send_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def append(self, line: str) -> None:
+        # the pending lines are cut here rather than in the flush task, so a batch never grows past max_chars
+        if self._lines and self._chars + len(line) + 1 > self._max_chars:
+            self._spawn(self._send_batch(self._cut()))
+        self._lines.append(line)
+        self._chars += len(line) + 1
+        if self._chars >= self._max_chars or (self._max_lines is not None and len(self._lines) >= self._max_lines):
+            self._spawn(self._send_batch(self._cut()))
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_later())
+
+    def _cut(self) -> str:
+        content = "\n".join(self._lines)
+        self._lines = []
+        self._chars = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return content
+
+    async def flush(self) -> None:
+        if self._lines:
+            await self._send_batch(self._cut())
+
+    async def _send_batch(self, content: str) -> None:
+        # the lock hands out turns in order, so batches are sent in the order they were cut
+        async with self._send_lock:
+            try:
+                await self._send(content)
+            except Exception:
+                logger.exception("Failed to send buffered lines")
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._flush_seconds)
+        self._timer = None
+        await self.flush()
+
+    def _spawn(self, coroutine: Awaitable[None]) -> asyncio.Task[None]:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def __len__(self) -> int:
+        return len(self._lines)
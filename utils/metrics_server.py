@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hikari
+
+from aiohttp import web
+from typing import Optional
+
+from utils.instrumentation import Histogram, Instrumentation
+
+METRICS_PREFIX = "expedition"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_histogram(lines: list[str], metric: str, label: str, name: str, histogram: Histogram) -> None:
+    labels = f'{label}="{escape_label(name)}"'
+    counts = histogram.cumulative_bucket_counts()
+    for bound, count in zip(histogram.buckets, counts):
+        lines.append(f'{metric}_bucket{{{labels},le="{format_number(bound)}"}} {count}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {counts[-1]}')
+    lines.append(f"{metric}_sum{{{labels}}} {format_number(histogram.total)}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+def render_metrics(instrumentation: Instrumentation) -> str:
+    lines: list[str] = []
+
+    metric = f"{METRICS_PREFIX}_span_seconds"
+    lines += [f"# HELP {metric} Time spent in commands, listeners and discord calls.", f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(instrumentation.histograms().items()):
+        render_histogram(lines, metric, "span", name, histogram)
+
+    metric = f"{METRICS_PREFIX}_size"
+    lines += [f"# HELP {metric} Sizes of batches and fan-outs.", f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(instrumentation.sizes().items()):
+        render_histogram(lines, metric, "name", name, histogram)
+
+    metric = f"{METRICS_PREFIX}_events_total"
+    lines += [f"# HELP {metric} Counted events, such as mirrored messages and queued renames.", f"# TYPE {metric} counter"]
+    for name, count in sorted(instrumentation.counters().items()):
+        lines.append(f'{metric}{{event="{escape_label(name)}"}} {count}')
+
+    metric = f"{METRICS_PREFIX}_rate_limited_total"
+    lines += [f"# HELP {metric} 429s seen per discord route, such as PATCH /channels/{{channel}}.", f"# TYPE {metric} counter"]
+    for route, hits in sorted(instrumentation.rate_limit_hits().items()):
+        lines.append(f'{metric}{{route="{escape_label(route)}"}} {hits}')
+
+    cache_lookups = instrumentation.cache_lookups()
+    caches = sorted({cache for cache, _ in cache_lookups})
+    metric = f"{METRICS_PREFIX}_cache_lookups_total"
+    lines += [f"# HELP {metric} In-memory cache lookups by result.", f"# TYPE {metric} counter"]
+    for cache in caches:
+        for hit, result in ((True, "hit"), (False, "miss")):
+            lines.append(f'{metric}{{cache="{escape_label(cache)}",result="{result}"}} {cache_lookups.get((cache, hit), 0)}')
+    metric = f"{METRICS_PREFIX}_cache_hit_ratio"
+    lines += [f"# HELP {metric} Share of cache lookups that hit, since the bot started.", f"# TYPE {metric} gauge"]
+    for cache in caches:
+        hits = cache_lookups.get((cache, True), 0)
+        total = hits + cache_lookups.get((cache, False), 0)
+        lines.append(f'{metric}{{cache="{escape_label(cache)}"}} {format_number(hits / total if total else 0.0)}')
+
+    return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    def __init__(self, instrumentation: Instrumentation, host: str, port: int) -> None:
+        self._instrumentation = instrumentation
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        # rendering walks a few dozen in-memory entries, so a scrape costs about as much as a cache lookup
+        return web.Response(body=render_metrics(self._instrumentation).encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self._host, self._port).start()
+        self._runner = runner
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def on_started(self, event: hikari.StartedEvent) -> None:
+        await self.start()
+
+    async def on_stopping(self, event: hikari.StoppingEvent) -> None:
+        await self.stop()
+
+    def subscribe(self, bot: hikari.GatewayBot) -> None:
+        bot.subscribe(hikari.StartedEvent, self.on_started)
+        bot.subscribe(hikari.StoppingEvent, self.on_stopping)
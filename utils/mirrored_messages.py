@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import hikari
+import logging
+import time
+
+from typing import Collection, Iterable, Optional
+
+from utils.db import connect_for_write, fetch_all
+
+logger = logging.getLogger(__name__)
+
+class MirroredMessages:
+    def __init__(self, window_seconds: float, max_entries: int, retention_seconds: float, flush_seconds: float) -> None:
+        self._window_seconds = window_seconds
+        self._max_entries = max_entries
+        self._retention_seconds = retention_seconds
+        self._flush_seconds = flush_seconds
+        # source message id to when it was first fanned out, oldest first
+        self._seen: collections.OrderedDict[int, float] = collections.OrderedDict()
+        # copies of the messages in the window, older copies are looked up in the db
+        # a copy is its channel, its message and the webhook that sent it, only that webhook can edit it
+        self._copies: dict[int, list[tuple[int, int, int]]] = {}
+        self._unsaved: list[tuple[int, int, int, int, int, float]] = []
+        # claims are saved on their own, so a message that was mirrored nowhere is still not fanned out after a restart
+        self._unsaved_claims: list[tuple[int, float]] = []
+        # messages made up to here may have been pushed out of memory early by max_entries, their copies are in the db
+        self._evicted_until = 0.0
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+    def claim(self, source_message_id: int) -> bool:
+        now = time.time()
+        self._prune(now)
+        if source_message_id in self._seen:
+            return False
+        self._seen[source_message_id] = now
+        while len(self._seen) > self._max_entries:
+            evicted_id, evicted_seen_at = self._seen.popitem(last=False)
+            self._copies.pop(evicted_id, None)
+            self._evicted_until = max(self._evicted_until, evicted_seen_at)
+        self._unsaved_claims.append((source_message_id, now))
+        self._schedule_flush()
+        return True
+
+    def _prune(self, now: float) -> None:
+        while self._seen:
+            source_message_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at <= self._window_seconds:
+                return
+            del self._seen[source_message_id]
+            self._copies.pop(source_message_id, None)
+
+    def record(self, server_id: int, source_message_id: int, copies: Iterable[tuple[int, int, int]]) -> None:
+        # copies are written in batches, a message only costs a db write when the batch is flushed
+        seen_at = self._seen.get(source_message_id, time.time())
+        copies = list(copies)
+        if source_message_id in self._seen:
+            self._copies.setdefault(source_message_id, []).extend(copies)
+        self._unsaved.extend((server_id, source_message_id, channel_id, message_id, webhook_id, seen_at) for channel_id, message_id, webhook_id in copies)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if (self._unsaved or self._unsaved_claims) and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def copies_of(self, source_message_ids: Collection[int]) -> dict[int, list[tuple[int, int, int]]]:
+        now = time.time()
+        self._prune(now)
+        copies: dict[int, list[tuple[int, int, int]]] = {}
+        unknown_ids = []
+        for source_message_id in source_message_ids:
+            if source_message_id in self._copies:
+                copies[source_message_id] = self._copies[source_message_id]
+            elif source_message_id not in self._seen:
+                # anything newer that was never seen was not fanned out, which is most deletes, so only old or evicted ids cost a read
+                created_at = hikari.Snowflake(source_message_id).created_at.timestamp()
+                if now - created_at > self._window_seconds or created_at <= self._evicted_until:
+                    unknown_ids.append(source_message_id)
+        if unknown_ids:
+            await self.flush()
+            rows = await fetch_all(f"SELECT source_message_id, channel_id, message_id, webhook_id FROM mirrored_messages WHERE source_message_id IN ({','.join(map(str, unknown_ids))})")
+            SOURCE_MESSAGE_ID = 0
+            CHANNEL_ID = 1
+            MESSAGE_ID = 2
+            WEBHOOK_ID = 3
+            for row in rows:
+                copies.setdefault(row[SOURCE_MESSAGE_ID], []).append((row[CHANNEL_ID], row[MESSAGE_ID], row[WEBHOOK_ID]))
+        return {source_message_id: source_copies for source_message_id, source_copies in copies.items() if source_copies}
+
+    async def forget(self, source_message_ids: Collection[int], message_ids: Collection[int]) -> None:
+        # only copies that are gone are forgotten, a copy that could not be deleted can still be deleted later
+        # the sources stay claimed, so a replayed create for a deleted message is still not fanned out
+        forgotten_ids = set(message_ids)
+        if not forgotten_ids:
+            return
+        for source_message_id in source_message_ids:
+            if source_message_id not in self._copies:
+                continue
+            self._copies[source_message_id] = [copy for copy in self._copies[source_message_id] if copy[1] not in forgotten_ids]
+        self._unsaved = [row for row in self._unsaved if row[3] not in forgotten_ids]
+        try:
+            async with connect_for_write() as db:
+                await db.execute(f"DELETE FROM mirrored_messages WHERE message_id IN ({','.join(map(str, forgotten_ids))})")
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to forget mirrored messages")
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._flush_seconds)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        rows, self._unsaved = self._unsaved, []
+        claims, self._unsaved_claims = self._unsaved_claims, []
+        if not rows and not claims:
+            return
+        try:
+            async with connect_for_write() as db:
+                await db.executemany("INSERT OR IGNORE INTO mirror_claims (source_message_id, created_at) VALUES (?, ?)", claims)
+                await db.execute("DELETE FROM mirror_claims WHERE created_at < ?", (time.time() - self._window_seconds,))
+                await db.executemany(
+                    "INSERT OR REPLACE INTO mirrored_messages (server_id, source_message_id, channel_id, message_id, webhook_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to save mirrored messages")
+
+    async def load_from_db(self) -> MirroredMessages:
+        # only the dedup window is loaded, so a quick restart does not fan out replayed events again
+        now = time.time()
+        async with connect_for_write() as db:
+            await db.execute("DELETE FROM mirrored_messages WHERE created_at < ?", (now - self._retention_seconds,))
+            await db.execute("DELETE FROM mirror_claims WHERE created_at < ?", (now - self._window_seconds,))
+            await db.commit()
+        claim_rows, copy_rows = await asyncio.gather(
+            fetch_all("SELECT source_message_id, created_at FROM mirror_claims"),
+            fetch_all(f"SELECT source_message_id, channel_id, message_id, webhook_id, created_at FROM mirrored_messages WHERE created_at >= {now - self._window_seconds}"),
+        )
+        SOURCE_MESSAGE_ID = 0
+        CREATED_AT = 1
+        for row in claim_rows:
+            self._seen.setdefault(row[SOURCE_MESSAGE_ID], row[CREATED_AT])
+        SOURCE_MESSAGE_ID = 0
+        CHANNEL_ID = 1
+        MESSAGE_ID = 2
+        WEBHOOK_ID = 3
+        CREATED_AT = 4
+        for row in copy_rows:
+            seen_at = self._seen.setdefault(row[SOURCE_MESSAGE_ID], row[CREATED_AT])
+            self._seen[row[SOURCE_MESSAGE_ID]] = min(seen_at, row[CREATED_AT])
+            self._copies.setdefault(row[SOURCE_MESSAGE_ID], []).append((row[CHANNEL_ID], row[MESSAGE_ID], row[WEBHOOK_ID]))
+        self._seen = collections.OrderedDict(sorted(self._seen.items(), key=lambda entry: entry[1]))
+        return self
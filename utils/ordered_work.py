@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class OrderedWorkQueues:
+    def __init__(self) -> None:
+        self._tails: dict[Hashable, asyncio.Task[Any]] = {}
+
+    def submit(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> asyncio.Task[T]:
+        previous: Optional[asyncio.Task[Any]] = self._tails.get(key)
+
+        async def run() -> T:
+            # a failed job must not stall everything queued behind it
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            return await work()
+
+        task = asyncio.create_task(run())
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    def is_busy(self, key: Hashable) -> bool:
+        return key in self._tails
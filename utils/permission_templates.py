@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hikari
+
+from typing import Optional
+
+from utils.consts import ADMIN_DENIES, ADMIN_PERMISSIONS, READ_DENIES, READ_PERMISSIONS, THREAD_PARENT_DENIES, THREAD_PARENT_PERMISSIONS, WRITE_DENIES, WRITE_PERMISSIONS
+from utils.settings_manager import ServerSettings, SettingsManager
+
+TEMPLATE_SETTING_FIELDS = ("admin_role_id", "spectator_role_id")
+
+class GuildPermissionTemplates:
+    def __init__(self, server_settings: ServerSettings) -> None:
+        # the @everyone role always shares its id with the guild, so no role fetch is needed
+        self.private = hikari.PermissionOverwrite(
+            id=hikari.Snowflake(server_settings.server_id),
+            type=hikari.PermissionOverwriteType.ROLE,
+            deny=hikari.Permissions.VIEW_CHANNEL
+        )
+        self.admin: Optional[hikari.PermissionOverwrite] = None
+        if server_settings.admin_role_id is not None:
+            self.admin = hikari.PermissionOverwrite(
+                id=hikari.Snowflake(server_settings.admin_role_id),
+                type=hikari.PermissionOverwriteType.ROLE,
+                allow=ADMIN_PERMISSIONS,
+                deny=ADMIN_DENIES
+            )
+        self.spectator: Optional[hikari.PermissionOverwrite] = None
+        if server_settings.spectator_role_id is not None:
+            self.spectator = hikari.PermissionOverwrite(
+                id=hikari.Snowflake(server_settings.spectator_role_id),
+                type=hikari.PermissionOverwriteType.ROLE,
+                allow=READ_PERMISSIONS,
+                deny=READ_DENIES
+            )
+        self._player_read: dict[int, hikari.PermissionOverwrite] = {}
+        self._player_write: dict[int, hikari.PermissionOverwrite] = {}
+        self._player_thread_parent: dict[int, hikari.PermissionOverwrite] = {}
+
+    def player_read(self, player_id: int) -> hikari.PermissionOverwrite:
+        overwrite = self._player_read.get(player_id)
+        if overwrite is None:
+            overwrite = hikari.PermissionOverwrite(
+                id=hikari.Snowflake(player_id),
+                type=hikari.PermissionOverwriteType.MEMBER,
+                allow=READ_PERMISSIONS,
+                deny=READ_DENIES
+            )
+            self._player_read[player_id] = overwrite
+        return overwrite
+
+    def player_write(self, player_id: int) -> hikari.PermissionOverwrite:
+        overwrite = self._player_write.get(player_id)
+        if overwrite is None:
+            overwrite = hikari.PermissionOverwrite(
+                id=hikari.Snowflake(player_id),
+                type=hikari.PermissionOverwriteType.MEMBER,
+                allow=WRITE_PERMISSIONS,
+                deny=WRITE_DENIES
+            )
+            self._player_write[player_id] = overwrite
+        return overwrite
+
+    def player_thread_parent(self, player_id: int) -> hikari.PermissionOverwrite:
+        overwrite = self._player_thread_parent.get(player_id)
+        if overwrite is None:
+            overwrite = hikari.PermissionOverwrite(
+                id=hikari.Snowflake(player_id),
+                type=hikari.PermissionOverwriteType.MEMBER,
+                allow=THREAD_PARENT_PERMISSIONS,
+                deny=THREAD_PARENT_DENIES
+            )
+            self._player_thread_parent[player_id] = overwrite
+        return overwrite
+
+    def category_overwrites(self) -> list[hikari.PermissionOverwrite]:
+        return [self.private]
+
+    def location_channel_overwrites(self, player_id: int, player_in: bool) -> list[hikari.PermissionOverwrite]:
+        overwrites = [self.private, self.player_write(player_id) if player_in else self.player_read(player_id)]
+        if self.admin is not None:
+            overwrites.append(self.admin)
+        return overwrites
+
+    def thread_parent_overwrites(self) -> list[hikari.PermissionOverwrite]:
+        overwrites = [self.private]
+        if self.admin is not None:
+            overwrites.append(self.admin)
+        return overwrites
+
+    def spectator_channel_overwrites(self) -> list[hikari.PermissionOverwrite]:
+        overwrites = [self.private]
+        if self.admin is not None:
+            overwrites.append(self.admin)
+        if self.spectator is not None:
+            overwrites.append(self.spectator)
+        return overwrites
+
+class PermissionTemplates:
+    def __init__(self, settings_manager: SettingsManager) -> None:
+        self._settings_manager = settings_manager
+        self._templates: dict[int, GuildPermissionTemplates] = {}
+        settings_manager.subscribe(TEMPLATE_SETTING_FIELDS, self._on_settings_changed)
+
+    def get(self, server_id: int) -> GuildPermissionTemplates:
+        templates = self._templates.get(server_id)
+        if templates is None:
+            templates = GuildPermissionTemplates(self._settings_manager.get_settings(server_id))
+            self._templates[server_id] = templates
+        return templates
+
+    def invalidate(self, server_id: int) -> None:
+        self._templates.pop(server_id, None)
+
+    def _on_settings_changed(self, server_settings: ServerSettings, field_name: str) -> None:
+        self.invalidate(server_settings.server_id)
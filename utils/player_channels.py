@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Collection, Iterable, Optional
+
+from utils.db import connect_for_write, fetch_all
+
+class ServerPlayerChannels:
+    def __init__(self) -> None:
+        self._channels: dict[int, tuple[str, int]] = {}
+        self._players: dict[int, dict[str, list[int]]] = {}
+
+    def add(self, channel_id: int, map_name: str, member_id: int) -> None:
+        self.remove_channel(channel_id)
+        self._channels[channel_id] = (map_name, member_id)
+        self._players.setdefault(member_id, {}).setdefault(map_name, []).append(channel_id)
+
+    def remove_channel(self, channel_id: int) -> Optional[tuple[str, int]]:
+        player = self._channels.pop(channel_id, None)
+        if player is None:
+            return None
+        map_name, member_id = player
+        player_maps = self._players.get(member_id, {})
+        map_channels = player_maps.get(map_name, [])
+        if channel_id in map_channels:
+            map_channels.remove(channel_id)
+        if not map_channels:
+            player_maps.pop(map_name, None)
+        if not player_maps:
+            self._players.pop(member_id, None)
+        return player
+
+    def get_player(self, channel_id: int) -> Optional[tuple[str, int]]:
+        return self._channels.get(channel_id)
+
+    def get_maps(self, member_id: int) -> dict[str, list[int]]:
+        return self._players.get(member_id, {})
+
+    def get_channels(self, member_id: int, map_name: str) -> list[int]:
+        return self._players.get(member_id, {}).get(map_name, [])
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._channels
+
+class PlayerChannels:
+    def __init__(self) -> None:
+        self._servers: dict[int, ServerPlayerChannels] = {}
+        self._loaded_servers: set[int] = set()
+        self._fully_loaded = False
+        self._server_load_locks: dict[int, asyncio.Lock] = {}
+
+    def get(self, server_id: int) -> ServerPlayerChannels:
+        server_player_channels = self._servers.get(server_id)
+        if server_player_channels is None:
+            server_player_channels = ServerPlayerChannels()
+            self._servers[server_id] = server_player_channels
+        return server_player_channels
+
+    async def add_channels(self, server_id: int, channels: Iterable[tuple[int, str, int]]) -> None:
+        channels = list(channels)
+        if not channels:
+            return
+        server_player_channels = self.get(server_id)
+        for channel_id, map_name, member_id in channels:
+            server_player_channels.add(channel_id, map_name, member_id)
+        async with connect_for_write() as db:
+            await db.executemany(
+                "INSERT OR REPLACE INTO player_channels (server_id, channel_id, map_name, member_id) VALUES (?, ?, ?, ?)",
+                [(server_id, channel_id, map_name, member_id) for channel_id, map_name, member_id in channels])
+            await db.commit()
+
+    async def add_channel(self, server_id: int, channel_id: int, map_name: str, member_id: int) -> None:
+        await self.add_channels(server_id, [(channel_id, map_name, member_id)])
+
+    async def remove_channels(self, server_id: int, channel_ids: Iterable[int]) -> None:
+        server_player_channels = self.get(server_id)
+        removed_channel_ids = [channel_id for channel_id in channel_ids if server_player_channels.remove_channel(channel_id) is not None]
+        if not removed_channel_ids:
+            return
+        async with connect_for_write() as db:
+            await db.executemany("DELETE FROM player_channels WHERE channel_id = ?", [(channel_id,) for channel_id in removed_channel_ids])
+            await db.commit()
+
+    async def remove_channel(self, server_id: int, channel_id: int) -> None:
+        await self.remove_channels(server_id, [channel_id])
+
+    def is_loaded(self, server_id: int) -> bool:
+        return self._fully_loaded or server_id in self._loaded_servers
+
+    async def ensure_server_loaded(self, server_id: int) -> None:
+        if self.is_loaded(server_id):
+            return
+        lock = self._server_load_locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            if not self.is_loaded(server_id):
+                await self.load_from_db([server_id])
+        self._server_load_locks.pop(server_id, None)
+
+    async def load_from_db(self, server_ids: Optional[Collection[int]] = None) -> PlayerChannels:
+        rows = await fetch_all("SELECT server_id, channel_id, map_name, member_id FROM player_channels", server_ids)
+        already_loaded = set(self._loaded_servers)
+        SERVER_ID = 0
+        CHANNEL_ID = 1
+        MAP_NAME = 2
+        MEMBER_ID = 3
+        for row in rows:
+            if row[SERVER_ID] in already_loaded:
+                continue
+            self.get(row[SERVER_ID]).add(row[CHANNEL_ID], row[MAP_NAME], row[MEMBER_ID])
+        if server_ids is None:
+            self._fully_loaded = True
+        else:
+            self._loaded_servers.update(server_ids)
+        self._loaded_servers.update(row[SERVER_ID] for row in rows)
+        return self
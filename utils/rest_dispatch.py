@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import enum
+import time
+
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+from utils.instrumentation import instrumentation
+
+T = TypeVar("T")
+
+class Priority(enum.IntEnum):
+    MOVE = 0
+    MIRROR = 1
+    NOTICE = 2
+    LEDGER = 3
+    LOG = 4
+
+class RestJob:
+    def __init__(self, guild_id: int, priority: Priority, work: Callable[[], Awaitable[Any]], coalesce_key: Optional[Hashable]) -> None:
+        self.guild_id = guild_id
+        self.priority = priority
+        self.work = work
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+
+class RestDispatcher:
+    def __init__(self, max_in_flight: int, max_in_flight_per_guild: int, max_delay_seconds: float) -> None:
+        self._max_in_flight = max_in_flight
+        self._max_in_flight_per_guild = max_in_flight_per_guild
+        self._max_delay_seconds = max_delay_seconds
+        self._in_flight = 0
+        self._guild_in_flight: dict[int, int] = {}
+        # one queue per guild in each class, guilds take turns in insertion order
+        self._queues: list[dict[int, collections.deque[RestJob]]] = [{} for _ in Priority]
+        self._pending: dict[Hashable, RestJob] = {}
+        self._running: dict[Hashable, asyncio.Future[Any]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def submit(self, guild_id: int, priority: Priority, work: Callable[[], Awaitable[T]], coalesce_key: Optional[Hashable] = None) -> asyncio.Future[T]:
+        if coalesce_key is not None:
+            pending_job = self._pending.get(coalesce_key)
+            if pending_job is not None:
+                # the queued job has not started, so only the latest work for the key needs to run
+                pending_job.work = work
+                instrumentation.increment("dispatch.coalesced")
+                return pending_job.future
+        job = RestJob(guild_id, priority, work, coalesce_key)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = job
+        self._queues[priority].setdefault(guild_id, collections.deque()).append(job)
+        self._pump()
+        return job.future
+
+    async def run(self, guild_id: int, priority: Priority, work: Callable[[], Awaitable[T]], coalesce_key: Optional[Hashable] = None) -> T:
+        return await self.submit(guild_id, priority, work, coalesce_key)
+
+    def queued(self, priority: Optional[Priority] = None) -> int:
+        queues = self._queues if priority is None else [self._queues[priority]]
+        return sum(len(guild_queue) for guild_queues in queues for guild_queue in guild_queues.values())
+
+    async def drain(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _next_guild(self, guild_queues: dict[int, collections.deque[RestJob]]) -> Optional[int]:
+        # a guild whose calls are stuck behind its own rate limits must not hold every slot
+        for guild_id in guild_queues:
+            if self._guild_in_flight.get(guild_id, 0) < self._max_in_flight_per_guild:
+                return guild_id
+        return None
+
+    def _next_job(self) -> Optional[RestJob]:
+        now = time.monotonic()
+        chosen: Optional[tuple[dict[int, collections.deque[RestJob]], int]] = None
+        for guild_queues in self._queues:
+            guild_id = self._next_guild(guild_queues)
+            if guild_id is None:
+                continue
+            if chosen is None:
+                chosen = (guild_queues, guild_id)
+            # low priority work is held back under pressure, but never for longer than the max delay
+            elif now - guild_queues[guild_id][0].enqueued_at > self._max_delay_seconds:
+                chosen = (guild_queues, guild_id)
+                break
+        if chosen is None:
+            return None
+        chosen_queues, guild_id = chosen
+        guild_queue = chosen_queues.pop(guild_id)
+        job = guild_queue.popleft()
+        if guild_queue:
+            chosen_queues[guild_id] = guild_queue
+        if job.coalesce_key is not None:
+            self._pending.pop(job.coalesce_key, None)
+        return job
+
+    def _pump(self) -> None:
+        while self._in_flight < self._max_in_flight:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.future.cancelled():
+                continue
+            self._in_flight += 1
+            self._guild_in_flight[job.guild_id] = self._guild_in_flight.get(job.guild_id, 0) + 1
+            instrumentation.observe(f"dispatch.wait.{job.priority.name.lower()}", time.monotonic() - job.enqueued_at)
+            previous: Optional[asyncio.Future[Any]] = None
+            if job.coalesce_key is not None:
+                previous = self._running.get(job.coalesce_key)
+                self._running[job.coalesce_key] = job.future
+            task = asyncio.create_task(self._execute(job, previous))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: RestJob, previous: Optional[asyncio.Future[Any]]) -> None:
+        try:
+            # work for the same key is written in the order it was submitted
+            if previous is not None:
+                await asyncio.wait([previous])
+            result = await job.work()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if job.coalesce_key is not None and self._running.get(job.coalesce_key) is job.future:
+                del self._running[job.coalesce_key]
+            self._in_flight -= 1
+            self._guild_in_flight[job.guild_id] -= 1
+            if not self._guild_in_flight[job.guild_id]:
+                del self._guild_in_flight[job.guild_id]
+            self._pump()
@@ -1,19 +1,19 @@
 from __future__ import annotations
 
-import aiosqlite
+import asyncio
 
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Collection, Iterable, Optional
 
-from utils import consts
+from utils.db import connect_for_write, fetch_all
 
-@dataclass
+@dataclass(slots=True)
 class ServerSettings:
     server_id: int
     spectator_role_id: Optional[int] = None
     admin_role_id: Optional[int] = None
     should_track_roles: bool = False
-    cooldown_minutes: int = 5
+    cooldown_minutes: float = 5
     sync_commands_and_bots_to_spectators: bool = True
     yell_enabled: bool = True
     yell_cooldown_seconds: int = 0
@@ -27,199 +27,83 @@ class ServerSettings:
     hunt_enabled: bool = False
     hunt_percentage: int = 20
     hunt_cooldown_seconds: int = 60
+    webhook_pool_size: int = 1
+    webhook_pool_strategy: str = "round-robin"
+
+SETTING_COLUMNS = tuple(field.name for field in fields(ServerSettings))
+SETTING_COLUMN_IS_BOOL = tuple(field.type == "bool" for field in fields(ServerSettings))
+SETTING_FIELDS = frozenset(SETTING_COLUMNS)
+
+SettingsSubscriber = Callable[[ServerSettings, str], None]
 
-    
 class SettingsManager:
     def __init__(self) -> None:
         self._settings_dict: dict[int, ServerSettings] = {}
+        self._subscribers: dict[str, list[SettingsSubscriber]] = {}
+        self._loaded_servers: set[int] = set()
+        self._fully_loaded = False
+        self._server_load_locks: dict[int, asyncio.Lock] = {}
 
     def get_settings(self, server_id: int) -> ServerSettings:
-        return self._settings_dict.get(server_id, ServerSettings(server_id))
-
-    async def set_spectator_role_id(self, server_id: int, spectator_role_id: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.spectator_role_id = spectator_role_id
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-
-    async def set_admin_role_id(self, server_id: int, admin_role_id: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.admin_role_id = admin_role_id
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
+        server_settings = self._settings_dict.get(server_id)
+        if server_settings is None:
+            server_settings = ServerSettings(server_id)
+            self._settings_dict[server_id] = server_settings
         return server_settings
 
-    async def set_should_track_roles(self, server_id: int, should_track_roles: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.should_track_roles = should_track_roles
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
+    def subscribe(self, field_names: Iterable[str], subscriber: SettingsSubscriber) -> None:
+        for field_name in field_names:
+            if field_name not in SETTING_FIELDS:
+                raise ValueError(f"Unknown server setting: {field_name}")
+            self._subscribers.setdefault(field_name, []).append(subscriber)
 
-    async def set_cooldown_minutes(self, server_id: int, cooldown_minutes: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.cooldown_minutes = cooldown_minutes
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
+    async def set_setting(self, server_id: int, field_name: str, value: Any) -> ServerSettings:
+        if field_name not in SETTING_FIELDS or field_name == "server_id":
+            raise ValueError(f"Unknown server setting: {field_name}")
+        # the db goes first, a failed write leaves memory and subscribers on the value that is still stored
+        await self._update_setting(server_id, field_name, value)
+        server_settings = self.get_settings(server_id)
+        old_value = getattr(server_settings, field_name)
+        setattr(server_settings, field_name, value)
+        if old_value != value:
+            for subscriber in self._subscribers.get(field_name, []):
+                subscriber(server_settings, field_name)
         return server_settings
 
-    async def set_sync_commands_and_bots_to_spectators(self, server_id: int, sync_commands_and_bots_to_spectators: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.sync_commands_and_bots_to_spectators = sync_commands_and_bots_to_spectators
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_yell_enabled(self, server_id: int, yell_enabled: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.yell_enabled = yell_enabled
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-
-    async def set_yell_cooldown_seconds(self, server_id: int, yell_cooldown_seconds: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.yell_cooldown_seconds = yell_cooldown_seconds
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_whisper_enabled(self, server_id: int, whisper_enabled: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.whisper_enabled = whisper_enabled
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_whisper_percentage(self, server_id: int, whisper_percentage: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.whisper_percentage = whisper_percentage
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_whisper_cooldown_seconds(self, server_id: int, whisper_cooldown_seconds: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.whisper_cooldown_seconds = whisper_cooldown_seconds
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
+    def is_loaded(self, server_id: int) -> bool:
+        return self._fully_loaded or server_id in self._loaded_servers
 
-    async def set_peek_enabled(self, server_id: int, peek_enabled: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.peek_enabled = peek_enabled
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_peek_percentage(self, server_id: int, peek_percentage: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.peek_percentage = peek_percentage
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_peek_cooldown_seconds(self, server_id: int, peek_cooldown_seconds: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.peek_cooldown_seconds = peek_cooldown_seconds
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_hunt_enabled(self, server_id: int, hunt_enabled: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.hunt_enabled = hunt_enabled
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_hunt_percentage(self, server_id: int, hunt_percentage: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.hunt_percentage = hunt_percentage
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_hunt_cooldown_seconds(self, server_id: int, hunt_cooldown_seconds: int) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.hunt_cooldown_seconds = hunt_cooldown_seconds
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
-    
-    async def set_announce_entry(self, server_id: int, announce_entry: bool) -> ServerSettings:
-        server_settings = self._settings_dict.get(server_id, ServerSettings(server_id))
-        server_settings.announce_entry = announce_entry
-        self._settings_dict[server_id] = server_settings
-        await self._update_settings(server_settings)
-        return server_settings
+    async def ensure_server_loaded(self, server_id: int) -> None:
+        if self.is_loaded(server_id):
+            return
+        lock = self._server_load_locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            if not self.is_loaded(server_id):
+                await self.load_from_db([server_id])
+        self._server_load_locks.pop(server_id, None)
 
-    async def load_from_db(self) -> SettingsManager:
-        async with aiosqlite.connect(consts.SQLITE_DB) as db:
-            SERVER_ID = 0
-            SPECTATOR_ROLE_ID = 1
-            ADMIN_ROLE_ID = 2
-            SHOULD_TRACK_ROLES = 3
-            COOLDOWN_MINUTES = 4
-            SYNC_COMMANDS = 5
-            YELL_ENABLED = 6
-            YELL_COOLDOWN_SECONDS = 7
-            WHISPER_ENABLED = 8
-            WHISPER_PERCENTAGE = 9
-            WHISPER_COOLDOWN_SECONDS = 10
-            PEEK_ENABLED = 11
-            PEEK_PERCENTAGE = 12
-            PEEK_COOLDOWN_SECONDS = 13
-            ANNOUNCE_ENTRY = 14
-            HUNT_ENABLED = 15
-            HUNT_PERCENTAGE = 16
-            HUNT_COOLDOWN_SECONDS = 17
-            async with db.execute("SELECT server_id, spectator_role_id, admin_role_id, should_track_roles, cooldown_minutes, sync_commands_and_bots_to_spectators, yell_enabled, yell_cooldown_seconds, whisper_enabled, whisper_percentage, whisper_cooldown_seconds, peek_enabled, peek_percentage, peek_cooldown_seconds, announce_entry, hunt_enabled, hunt_percentage, hunt_cooldown_seconds FROM server_settings") as cursor:
-                async for row in cursor:
-                    server_id = row[SERVER_ID]
-                    spectator_role_id = row[SPECTATOR_ROLE_ID]
-                    admin_role_id = row[ADMIN_ROLE_ID]
-                    should_track_roles = True if row[SHOULD_TRACK_ROLES] else False
-                    cooldown_minutes = row[COOLDOWN_MINUTES]
-                    sync_commands_and_bots_to_spectators = True if row[SYNC_COMMANDS] else False
-                    yell_enabled = True if row[YELL_ENABLED] else False
-                    yell_cooldown_seconds = row[YELL_COOLDOWN_SECONDS]
-                    whisper_enabled = True if row[WHISPER_ENABLED] else False
-                    whisper_percentage = row[WHISPER_PERCENTAGE]
-                    whisper_cooldown_seconds = row[WHISPER_COOLDOWN_SECONDS]
-                    peek_enabled = True if row[PEEK_ENABLED] else False
-                    peek_percentage = row[PEEK_PERCENTAGE]
-                    peek_cooldown_seconds = row[PEEK_COOLDOWN_SECONDS]
-                    announce_entry = True if row[ANNOUNCE_ENTRY] else False
-                    hunt_enabled = True if row[HUNT_ENABLED] else False
-                    hunt_percentage = row[HUNT_PERCENTAGE]
-                    hunt_cooldown_seconds = row[HUNT_COOLDOWN_SECONDS]
-                    server_settings = ServerSettings(server_id, spectator_role_id, admin_role_id, should_track_roles, cooldown_minutes, sync_commands_and_bots_to_spectators, yell_enabled, yell_cooldown_seconds, whisper_enabled, whisper_percentage, whisper_cooldown_seconds, peek_enabled, peek_percentage, peek_cooldown_seconds, announce_entry, hunt_enabled, hunt_percentage, hunt_cooldown_seconds,)
-                    self._settings_dict[server_id] = server_settings
+    async def load_from_db(self, server_ids: Optional[Collection[int]] = None) -> SettingsManager:
+        rows = await fetch_all(f"SELECT {', '.join(SETTING_COLUMNS)} FROM server_settings", server_ids)
+        already_loaded = set(self._loaded_servers)
+        SERVER_ID = 0
+        for row in rows:
+            server_id = row[SERVER_ID]
+            if server_id in already_loaded:
+                continue
+            # update in place, anything that grabbed the defaults before loading finished keeps a live object
+            server_settings = self.get_settings(server_id)
+            for field_name, is_bool, value in zip(SETTING_COLUMNS, SETTING_COLUMN_IS_BOOL, row):
+                setattr(server_settings, field_name, (True if value else False) if is_bool else value)
+        if server_ids is None:
+            self._fully_loaded = True
+        else:
+            self._loaded_servers.update(server_ids)
+        self._loaded_servers.update(row[SERVER_ID] for row in rows)
         return self
 
-    async def _update_settings(self, server_settings: ServerSettings):
-        async with aiosqlite.connect(consts.SQLITE_DB) as db:
-            server_id = str(server_settings.server_id)
-            spectator_role_id = str(server_settings.spectator_role_id) if server_settings.spectator_role_id else "NULL"
-            admin_role_id = str(server_settings.admin_role_id) if server_settings.admin_role_id else "NULL"
-            should_track_roles = "1" if server_settings.should_track_roles else "0"
-            cooldown_minutes = str(server_settings.cooldown_minutes)
-            yell_enabled = "1" if server_settings.yell_enabled else "0"
-            yell_cooldown_seconds = str(server_settings.yell_cooldown_seconds)
-            whisper_enabled = "1" if server_settings.whisper_enabled else "0"
-            whisper_percentage = str(server_settings.whisper_percentage)
-            whisper_cooldown_seconds = str(server_settings.whisper_cooldown_seconds)
-            peek_enabled = "1" if server_settings.peek_enabled else "0"
-            peek_percentage = str(server_settings.peek_percentage)
-            peek_cooldown_seconds = str(server_settings.peek_cooldown_seconds)
-            sync_commands_and_bots_to_spectators = "1" if server_settings.sync_commands_and_bots_to_spectators else "0"
-            announce_entry = "1" if server_settings.announce_entry else "0"
-            hunt_enabled = "1" if server_settings.hunt_enabled else "0"
-            hunt_percentage = str(server_settings.hunt_percentage)
-            hunt_cooldown_seconds = str(server_settings.hunt_cooldown_seconds)
-            await db.execute(
-                f"""INSERT OR REPLACE INTO server_settings (server_id, spectator_role_id, admin_role_id, should_track_roles, cooldown_minutes, sync_commands_and_bots_to_spectators, yell_enabled, yell_cooldown_seconds, whisper_enabled, whisper_percentage, whisper_cooldown_seconds, peek_enabled, peek_percentage, peek_cooldown_seconds, announce_entry, hunt_enabled, hunt_percentage, hunt_cooldown_seconds) VALUES 
-                ({server_id}, {spectator_role_id}, {admin_role_id}, {should_track_roles}, {cooldown_minutes}, {sync_commands_and_bots_to_spectators}, {yell_enabled}, {yell_cooldown_seconds}, {whisper_enabled}, {whisper_percentage}, {whisper_cooldown_seconds}, {peek_enabled}, {peek_percentage}, {peek_cooldown_seconds}, {announce_entry}, {hunt_enabled}, {hunt_percentage}, {hunt_cooldown_seconds})""")
-            await db.commit()
\ No newline at end of file
+    async def _update_setting(self, server_id: int, field_name: str, value: Any):
+        # field_name is checked against SETTING_FIELDS by the caller, so it is safe to format into the query
+        async with connect_for_write() as db:
+            await db.execute("INSERT OR IGNORE INTO server_settings (server_id) VALUES (?)", (server_id,))
+            await db.execute(f"UPDATE server_settings SET {field_name} = ? WHERE server_id = ?", (value, server_id))
+            await db.commit()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import contextlib
+import hikari
+
+from typing import Iterator, Optional
+
+ROUND_ROBIN = "round-robin"
+LEAST_LOADED = "least-loaded"
+POOL_STRATEGIES = (ROUND_ROBIN, LEAST_LOADED)
+
+class WebhookPool:
+    def __init__(self, webhooks: list[hikari.ExecutableWebhook]) -> None:
+        self._webhooks = list(webhooks)
+        self._in_flight: dict[int, int] = {}
+        self._next = 0
+        self.growable = True
+
+    def __len__(self) -> int:
+        return len(self._webhooks)
+
+    def add(self, webhook: hikari.ExecutableWebhook) -> None:
+        self._webhooks.append(webhook)
+
+    def get(self, webhook_id: Optional[int]) -> Optional[hikari.ExecutableWebhook]:
+        for webhook in self._webhooks:
+            if webhook.id == webhook_id:
+                return webhook
+        return None
+
+    def pick(self, strategy: str, size: int) -> hikari.ExecutableWebhook:
+        # a channel can hold more webhooks than the current pool size if the setting was lowered
+        count = max(1, min(size, len(self._webhooks)))
+        index = self._next % count
+        if strategy == LEAST_LOADED:
+            # ties go to the webhook after the last one picked, so an idle pool still spreads across buckets
+            candidates = [(index + offset) % count for offset in range(count)]
+            index = min(candidates, key=lambda candidate: self._in_flight.get(self._webhooks[candidate].id, 0))
+        self._next = index + 1
+        return self._webhooks[index]
+
+    @contextlib.contextmanager
+    def use(self, strategy: str, size: int) -> Iterator[hikari.ExecutableWebhook]:
+        webhook = self.pick(strategy, size)
+        self._in_flight[webhook.id] = self._in_flight.get(webhook.id, 0) + 1
+        try:
+            yield webhook
+        finally:
+            self._in_flight[webhook.id] -= 1